@@ -19,7 +19,9 @@ from __future__ import print_function
 __license__ = "Cecill-C"
 __revision__ = "$Id$"
 
+import subprocess
 import sys
+import time
 from optparse import OptionParser
 #import threading
 from openalea.core.pkgmanager import PackageManager
@@ -293,6 +295,95 @@ def function(factory):
     return f
 
 
+def parse_import_times(text):
+    """ Return the (cumulative time, self time, module) of the imports
+    reported by python -X importtime in text (times in us) """
+    times = []
+    for line in text.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except (ValueError, IndexError):
+            # header
+            continue
+        times.append((cumulative_us, self_us, fields[2].strip()))
+    return times
+
+
+def import_times(module='openalea.core.alea'):
+    """ Return the import times of module measured in a new interpreter
+    (see parse_import_times) """
+    cmd = [sys.executable, '-X', 'importtime', '-c', 'import %s' % module]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+    return parse_import_times(proc.stderr)
+
+
+def profile_startup(limit=20, out=None):
+    """ Print the import time of the modules loaded by alea and the time
+    taken to find and register each package """
+    out = out or sys.stdout
+    times = import_times()
+    if times:
+        total = max(times)[0]
+        print("Imports: %d modules in %.1f ms" % (len(times), total / 1000.),
+              file=out)
+        print("%10s %10s  %s" % ("self (ms)", "cumul (ms)", "module"),
+              file=out)
+        for cumulative, self_us, name in sorted(
+                times, key=lambda t: t[1], reverse=True)[:limit]:
+            print("%10.1f %10.1f  %s" % (self_us / 1000.,
+                                         cumulative / 1000., name), file=out)
+
+    t0 = time.perf_counter()
+    pm = PackageManager()
+    t_create = time.perf_counter() - t0
+    pm.init(verbose=False)
+    timings = pm.timings
+
+    print("\nPackage manager: %.1f ms to create, %.1f ms to register" %
+          (t_create * 1000, timings.get('total', 0) * 1000), file=out)
+    for step in ('wralea_path', 'find_wralea', 'prepare', 'register',
+                 'rebuild_category'):
+        if step in timings:
+            print("%10.1f  %s" % (timings[step] * 1000, step), file=out)
+
+    entries = [(t, 'entry point ' + name)
+               for name, t in timings.get('entry_points', {}).items()]
+    entries += [(t, 'package ' + name)
+                for name, t in timings.get('packages', {}).items()]
+    if entries:
+        print("\n%10s  %s" % ("time (ms)", "entry point / wralea file"),
+              file=out)
+        for t, name in sorted(entries, reverse=True)[:limit]:
+            print("%10.1f  %s" % (t * 1000, name), file=out)
+    return pm
+
+
+def profile_run(component, inputs, pm=None, limit=20, prefix=None, out=None):
+    """ Run component with inputs and print the time taken by its nodes.
+
+    With prefix, the profile is also written in prefix.folded (collapsed
+    stacks for flame graphs) and prefix.csv.
+    """
+    from openalea.core.algo.profiler import Profiler
+
+    out = out or sys.stdout
+    _factory, node = get_node(component, inputs, pm)
+
+    with Profiler() as profiler:
+        node.eval()
+
+    print(_outputs(node), file=out)
+    print(profiler.summary(limit), file=out)
+    if prefix:
+        profiler.write_collapsed(prefix + '.folded')
+        profiler.write_csv(prefix + '.csv')
+    return profiler
+
+
 def _outputs(node):
     #return node.outputs
     return [node.output(i) for i in range(node.get_nb_output())]
@@ -327,6 +418,21 @@ or
                        action="store_true", default=False)
 
 
+    parser.add_option("--profile-startup", dest="profile_startup",
+                      help="Show the import time of the modules and the "
+                      "registration time of the packages.",
+                      action="store_true", default=False)
+
+    parser.add_option("--profile", dest="profile",
+                      help="Run component and show the time taken by its "
+                      "nodes.",
+                      action="store_true", default=False)
+
+    parser.add_option("--profile-output", dest="profile_output",
+                      help="With --profile, write the profile in "
+                      "PREFIX.folded (flame graph) and PREFIX.csv.",
+                      metavar="PREFIX", default=None)
+
     parser.add_option("-i", "--input",
                        action="callback", callback=get_intput_callback,
                        help="Specify inputs as KEY=VALUE, KEY=VALUE...",
@@ -339,6 +445,10 @@ or
         print("Error while parsing args:", error)
         return
 
+    if(options.profile_startup):
+        profile_startup()
+        return
+
     if(len(args) < 1):
         parser.error("Incomplete command : specify a 'package_id:node_id'")
 
@@ -349,7 +459,9 @@ or
         import openalea.core.data
         openalea.core.data.PackageData.__local__ = True
 
-    if(options.run):
+    if(options.profile):
+        profile_run(component, options.input, prefix=options.profile_output)
+    elif(options.run):
         run_and_display(component, options.input, options.gui)
     else:
         query(component, )
@@ -28,23 +28,31 @@ except ImportError: #PY3
     from time import process_time as clock
 
 import traceback as tb
+import heapq
+import itertools
+import pickle
+from timeit import default_timer
+from concurrent import futures
 from openalea.core import ScriptLibrary
 
 from openalea.core.dataflow import SubDataflow
+from openalea.core.node import Node, FuncNode
+from openalea.core.observer import AbstractListener, with_notification_policy
 from openalea.core.interface import IFunction
+from openalea.core import cache
 from six.moves import zip
 import functools
 
 
 PROVENANCE = False
 
+# Profiler of the node evaluations (see algo.profiler)
+PROFILER = None
+
 # Implement provenance in OpenAlea
+# sqlite3 and the settings are imported when the provenance is used
 db_conn = None
 
-import sqlite3
-from openalea.core.path import path
-from openalea.core import settings
-
 def db_create(cursor):
     cur = cursor
     #-prospective provenance-#
@@ -73,28 +81,30 @@ def db_create(cursor):
     cur.execute("CREATE TABLE IF NOT EXISTS Data (dataid INTEGER, createtime DATETIME,NodeExecid INTEGER, PRIMARY KEY(dataid),FOREIGN KEY(NodeExecid) references NodeExec)")
     #- Tag
     cur.execute("CREATE TABLE IF NOT EXISTS Tag (CompositeNodeExecid INTEGER, createtime DATETIME, name varchar(25),userid INTEGER,PRIMARY KEY(CompositeNodeExecid),FOREIGN KEY(userid) references User)")
+    #- node executions recorded by algo.provenance
+    cur.execute("CREATE TABLE IF NOT EXISTS NodeEvent (workflow TEXT, vid TEXT, package TEXT, factory TEXT, starttime REAL, endtime REAL, inputs TEXT, outputs TEXT)")
     return cur
 
 def get_database_name():
+    from openalea.core.path import path
+    from openalea.core import settings
     db_fn = path(settings.get_openalea_home_dir())/'provenance.sq3'
     return db_fn
 
-def db_connexion():
-    """ Return a curso on the database.
+def db_connexion(db_fn=None):
+    """ Return a cursor on the database (default to get_database_name).
 
     If the database does not exists, create it.
     """
+    import sqlite3
     global db_conn
     if db_conn is None:
-        db_fn = get_database_name()
-        if not db_fn.exists():
-            db_conn=sqlite3.connect(db_fn)
-            cur = db_conn.cursor()
-            cur = db_create(cur)
-            return cur
-    else:
-        cur = db_conn.cursor()
-        return cur
+        if db_fn is None:
+            db_fn = get_database_name()
+        db_conn = sqlite3.connect(str(db_fn))
+        db_create(db_conn.cursor())
+        db_conn.commit()
+    return db_conn.cursor()
 
 class Provenance(object):
     def __init__(self, workflow):
@@ -211,17 +221,215 @@ def cmp_posx(x, y):
     return ret
 
 
+# Traversal of the dataflow
+#
+# The evaluation of the parents of a vertex is written as a generator
+# (a traversal) which yields the traversal of each parent to evaluate and
+# receives its result. Traversals are executed either with an explicit stack,
+# without limit on the depth of the dataflow, or with recursive calls.
+# The exceptions raised by a traversal are propagated to the caller of run.
+
+def run_iterative(traversal):
+    """ Execute a traversal with an explicit stack and return its result """
+    stack = [traversal]
+    result = None
+    while stack:
+        try:
+            child = stack[-1].send(result)
+        except StopIteration as e:
+            stack.pop()
+            result = e.value
+        else:
+            stack.append(child)
+            result = None
+    return result
+
+
+def run_recursive(traversal):
+    """ Execute a traversal with recursive calls and return its result """
+    result = None
+    while True:
+        try:
+            child = traversal.send(result)
+        except StopIteration as e:
+            return e.value
+        result = run_recursive(child)
+
+
+# Evaluation plan
+
+class LayoutListener(AbstractListener):
+    """ Invalidate an evaluation plan when the position of a node changes """
+
+    def __init__(self, plan):
+        AbstractListener.__init__(self)
+        self.plan = plan
+
+    def notify(self, sender, event):
+        """ Notification """
+        if event and event[0] == "metadata_changed" and event[1] == "position":
+            self.plan.valid = False
+
+
+class EvaluationPlan(object):
+    """
+    Structure of a dataflow precomputed for its evaluation.
+
+    For each vertex, the plan stores the bindings of its connected inputs
+    with the outputs of its parents, ordered like get_parent_nodes. The
+    evaluation order needed to compute a vertex is computed once and cached.
+
+    A plan is valid until the topology of the dataflow changes or a node
+    connected to a multiple input is moved.
+    """
+
+    def __init__(self, dataflow):
+        """
+        :param dataflow: the dataflow to evaluate
+        """
+        self.version = dataflow.topology_version()
+        self.valid = True
+        self.listener = LayoutListener(self)
+
+        # vid -> actor
+        self.actors = {}
+        # vid -> [(input index, [(parent vid, parent actor, output index)])]
+        self.inputs = {}
+        # vid -> parent vids in evaluation order
+        self.parents = {}
+        # vid -> child vids
+        self.children = {}
+        # vertices without out edges
+        self.leaves = []
+        # vid -> list of vid to evaluate (postorder)
+        self._schedules = {}
+        # vid -> set of the vertices of its schedule
+        self._upstream = {}
+        # vid -> rank in a topological order of the whole dataflow
+        self._ranks = None
+
+        for vid in dataflow.vertices():
+            self.actors[vid] = dataflow.actor(vid)
+            if dataflow.nb_out_edges(vid) == 0:
+                self.leaves.append(vid)
+
+        for vid in self.actors:
+            self.children[vid] = []
+
+        for vid in self.actors:
+            bindings = []
+            parents = []
+            for pid in dataflow.in_ports(vid):
+                npids = [(npid, dataflow.vertex(npid),
+                          self.actors[dataflow.vertex(npid)])
+                         for npid in dataflow.connected_ports(pid)]
+                if not npids:
+                    continue
+                if len(npids) > 1:
+                    npids.sort(key=functools.cmp_to_key(cmp_posx))
+                    # the order of the parents depends on their position
+                    for npid, nvid, nactor in npids:
+                        try:
+                            nactor.get_ad_hoc_dict().register_listener(
+                                self.listener)
+                        except AttributeError:
+                            pass
+                bindings.append((dataflow.local_id(pid),
+                                 [(nvid, nactor, dataflow.local_id(npid))
+                                  for npid, nvid, nactor in npids]))
+                parents.extend(nvid for npid, nvid, nactor in npids)
+            self.inputs[vid] = bindings
+            self.parents[vid] = parents
+            for nvid in parents:
+                self.children[nvid].append(vid)
+
+    def is_valid(self, dataflow):
+        """ Return True if the plan can be used to evaluate dataflow """
+        return self.valid and self.version == dataflow.topology_version()
+
+    def schedule(self, vid):
+        """
+        Return the list of vertices to evaluate to compute vid, in
+        evaluation order (vid is the last one).
+        The order is the one of the recursive traversal of the parents.
+        """
+        try:
+            return self._schedules[vid]
+        except KeyError:
+            pass
+
+        order = self._postorder(vid, set([vid]))
+        self._schedules[vid] = order
+        return order
+
+    def upstream(self, vid):
+        """ Return the set of the vertices of the schedule of vid """
+        try:
+            return self._upstream[vid]
+        except KeyError:
+            pass
+        vids = self._upstream[vid] = frozenset(self.schedule(vid))
+        return vids
+
+    def ranks(self):
+        """
+        Return a dict mapping each vertex to its rank in a topological
+        order of the dataflow (the parents first).
+        """
+        if self._ranks is None:
+            order = []
+            visited = set()
+            for vid in self.actors:
+                if vid not in visited:
+                    visited.add(vid)
+                    order.extend(self._postorder(vid, visited))
+            self._ranks = dict((vid, i) for i, vid in enumerate(order))
+        return self._ranks
+
+    def _postorder(self, vid, visited):
+        """
+        Return the parents of vid not in visited and vid in postorder.
+        visited is updated.
+        """
+        parents = self.parents
+        order = []
+        stack = [(vid, iter(parents[vid]))]
+        while stack:
+            v, it = stack[-1]
+            for nvid in it:
+                if nvid not in visited:
+                    visited.add(nvid)
+                    stack.append((nvid, iter(parents[nvid])))
+                    break
+            else:
+                stack.pop()
+                order.append(v)
+        return order
+
+    def has_block(self, schedule):
+        """ Return True if one of the vertices of schedule is blocked """
+        actors = self.actors
+        for vid in schedule:
+            if getattr(actors[vid], 'block', False):
+                return True
+        return False
+
+
 # Evaluation Algoithm
 
 """ Abstract evaluation algorithm """
 
 class AbstractEvaluation(object):
 
+    # Provenance recording the node executions (see set_provenance)
+    provenance = None
+
     def __init__(self, dataflow):
         """
         :param dataflow: to be done
         """
         self._dataflow = dataflow
+        self._plan = None
         if PROVENANCE:
             self.provenance = PrintProvenance(dataflow)
 
@@ -229,24 +437,81 @@ class AbstractEvaluation(object):
         """todo"""
         raise NotImplementedError()
 
+    # Execute the traversals with an explicit stack (see run_iterative)
+    iterative = True
+
+    # Use the output caches of the nodes (see openalea.core.cache)
+    use_cache = True
+
+    # Notification policy of the evaluations run by CompositeNode
+    # (see observer.FULL, COALESCED and SILENT), None for the policy of
+    # the composite node
+    notification_policy = None
+
+    def run(self, traversal):
+        """ Execute a traversal and return its result """
+        if self.iterative:
+            return run_iterative(traversal)
+        return run_recursive(traversal)
+
+    def get_plan(self):
+        """
+        Return the evaluation plan of the dataflow.
+        The plan is computed again only if the dataflow has changed.
+        """
+        plan = self._plan
+        if plan is None or not plan.is_valid(self._dataflow):
+            plan = self._plan = EvaluationPlan(self._dataflow)
+        return plan
+
+    def set_vertex_inputs(self, vid):
+        """ Set the inputs of vid from the outputs of its parents """
+        actor = self._plan.actors[vid]
+        for input_index, parents in self._plan.inputs[vid]:
+            if len(parents) == 1:
+                nvid, nactor, output_index = parents[0]
+                actor.set_input(input_index, nactor.get_output(output_index))
+            else:
+                actor.set_input(input_index,
+                                [nactor.get_output(output_index)
+                                 for nvid, nactor, output_index in parents])
+
     def is_stopped(self, vid, actor):
         """ Return True if evaluation must be stop at this vertex. """
         return actor.block
 
-    def eval_vertex_code(self, vid):
+    def eval_vertex_code(self, vid, evaluate=None, times=None):
         """
         Evaluate the vertex vid.
         Can raise an exception if evaluation failed.
+
+        :param evaluate: function called with the node to evaluate it
+                         (default to node.eval)
+        :param times: the (wall start, wall end, cpu start, cpu end) of the
+                      evaluation of the node done in a worker process by
+                      evaluate (see _call_function)
         """
 
         node = self._dataflow.actor(vid)
 
+        profiler = PROFILER
+        if profiler is not None:
+            evaluate = profiler.wrap(self, vid, evaluate, times)
+
         try:
             t0 = clock()
-            ret = node.eval()
+            if not self.use_cache:
+                with cache.bypass():
+                    ret = node.eval() if evaluate is None else evaluate(node)
+            elif evaluate is None:
+                ret = node.eval()
+            else:
+                ret = evaluate(node)
             t1 = clock()
+            if times is not None:
+                t0, t1 = times[2:]
 
-            if PROVENANCE:
+            if self.provenance is not None:
                 self.provenance.node_exec(vid, node, t0,t1)
                 #provenance(vid, node, t0,t1)
             
@@ -324,29 +589,43 @@ class BrutEvaluation(AbstractEvaluation):
     def eval_vertex(self, vid, *args):
         """ Evaluate the vertex vid """
 
-        df = self._dataflow
-        actor = df.actor(vid)
+        plan = self.get_plan()
+        schedule = plan.schedule(vid)
+        if plan.has_block(schedule):
+            # the evaluation stops on blocked nodes
+            return self.run(self.traverse(vid))
+
+        evaluated = self._evaluated
+        for v in schedule:
+            if v in evaluated and v != vid:
+                continue
+            evaluated.add(v)
+            self.set_vertex_inputs(v)
+            self.eval_vertex_code(v)
+
+    def traverse(self, vid):
+        """ Traversal evaluating the vertex vid after its parents """
+
+        plan = self._plan
+        actor = plan.actors[vid]
 
         self._evaluated.add(vid)
 
-        # For each inputs
-        for pid in df.in_ports(vid):
+        # For each connected inputs
+        for input_index, parents in plan.inputs[vid]:
             inputs = []
 
-            cpt = 0
             # For each connected node
-            for npid, nvid, nactor in self.get_parent_nodes(pid):
+            for nvid, nactor, output_index in parents:
                 if not self.is_stopped(nvid, nactor):
-                    self.eval_vertex(nvid)
+                    yield self.traverse(nvid)
 
-                inputs.append(nactor.get_output(df.local_id(npid)))
-                cpt += 1
+                inputs.append(nactor.get_output(output_index))
 
             # set input as a list or a simple value
-            if (cpt == 1):
+            if (len(inputs) == 1):
                 inputs = inputs[0]
-            if (cpt > 0):
-                actor.set_input(df.local_id(pid), inputs)
+            actor.set_input(input_index, inputs)
 
         # Eval the node
         self.eval_vertex_code(vid)
@@ -354,13 +633,12 @@ class BrutEvaluation(AbstractEvaluation):
     def eval(self, *args):
         """ Evaluate the whole dataflow starting from leaves"""
         t0 = clock()
-        df = self._dataflow
 
         # Unvalidate all the nodes
         self._evaluated.clear()
 
         # Eval from the leaf
-        for vid in (vid for vid in df.vertices() if df.nb_out_edges(vid)==0):
+        for vid in list(self.get_plan().leaves):
             self.eval_vertex(vid)
 
         t1 = clock()
@@ -377,7 +655,6 @@ class PriorityEvaluation(BrutEvaluation):
         t0 = clock()
 
         is_subdataflow = False if not kwds else kwds.get('is_subdataflow', False)
-        df = self._dataflow
         # Unvalidate all the nodes
         if is_subdataflow:
             self._evaluated -= self._resolution_node
@@ -388,8 +665,8 @@ class PriorityEvaluation(BrutEvaluation):
             return self.eval_vertex(vtx_id, *args)
 
         # Select the leaves (list of (vid, actor))
-        leaves = [(vid, df.actor(vid))
-              for vid in df.vertices() if df.nb_out_edges(vid)==0]
+        plan = self.get_plan()
+        leaves = [(vid, plan.actors[vid]) for vid in plan.leaves]
 
         leaves.sort(key = functools.cmp_to_key(cmp_priority))
 
@@ -429,31 +706,32 @@ class GeneratorEvaluation(AbstractEvaluation):
 
     def eval_vertex(self, vid):
         """ Evaluate the vertex vid """
+        self.run(self.traverse(vid))
 
-        df = self._dataflow
-        actor = df.actor(vid)
+    def traverse(self, vid):
+        """ Traversal evaluating the vertex vid after its parents """
+
+        plan = self._plan
+        actor = plan.actors[vid]
 
         self._evaluated.add(vid)
 
-        # For each inputs
-        for pid in df.in_ports(vid):
+        # For each connected inputs
+        for input_index, parents in plan.inputs[vid]:
             inputs = []
 
-            cpt = 0
             # For each connected node
-            for npid, nvid, nactor in self.get_parent_nodes(pid):
+            for nvid, nactor, output_index in parents:
                 # Do no reevaluate the same node
                 if not self.is_stopped(nvid, nactor):
-                    self.eval_vertex(nvid)
+                    yield self.traverse(nvid)
 
-                inputs.append(nactor.get_output(df.local_id(npid)))
-                cpt += 1
+                inputs.append(nactor.get_output(output_index))
 
             # set input as a list or a simple value
-            if (cpt == 1):
+            if (len(inputs) == 1):
                 inputs = inputs[0]
-            if (cpt > 0):
-                actor.set_input(df.local_id(pid), inputs)
+            actor.set_input(input_index, inputs)
 
         # Eval the node
         ret = self.eval_vertex_code(vid)
@@ -465,15 +743,14 @@ class GeneratorEvaluation(AbstractEvaluation):
     def eval(self, vtx_id=None, step=False):
         t0 = clock()
 
-        df = self._dataflow
+        plan = self.get_plan()
 
         if (vtx_id is not None):
-            leafs = [(vtx_id, df.actor(vtx_id))]
+            leafs = [(vtx_id, plan.actors[vtx_id])]
 
         else:
             # Select the leafs (list of (vid, actor))
-            leafs = [(vid, df.actor(vid))
-                for vid in df.vertices() if df.nb_out_edges(vid)==0]
+            leafs = [(vid, plan.actors[vid]) for vid in plan.leaves]
 
         leafs.sort(key = functools.cmp_to_key(cmp_priority))
 
@@ -517,21 +794,79 @@ class LambdaEvaluation(PriorityEvaluation):
 
         """
 
-        df = self._dataflow
-        actor = df.actor(vid)
+        plan = self.get_plan()
+        actor = plan.actors[vid]
 
         # Do not evaluate a node which is blocked
         if self.is_stopped(vid, actor):
             return
 
+        if not context and not lambda_value:
+            # Not in resolution mode: the context is not used
+            schedule = plan.schedule(vid)
+            if not plan.has_block(schedule):
+                return self.replay(schedule)
+
+        return self.run(self.traverse(vid, context, lambda_value))
+
+    def replay(self, schedule):
+        """
+        Evaluate the vertices of schedule in order, without lambda
+        resolution.
+        """
+        df = self._dataflow
+        plan = self._plan
+        evaluated = self._evaluated
+
+        for vid in schedule:
+            if vid in evaluated:
+                continue
+            evaluated.add(vid)
+
+            actor = plan.actors[vid]
+            use_lambda = False
+
+            for input_index, parents in plan.inputs[vid]:
+                interface = actor.input_desc[input_index].get('interface', None)
+
+                inputs = []
+                for nvid, nactor, output_index in parents:
+                    outval = nactor.get_output(output_index)
+                    # Lambda detection
+                    if (isinstance(outval, SubDataflow)
+                       and interface is not IFunction):
+                        use_lambda = True
+                        self._resolution_node.add(vid)
+                    inputs.append(outval)
+
+                if (len(inputs) == 1):
+                    inputs = inputs[0]
+                actor.set_input(input_index, inputs)
+
+            # Eval the node
+            if (not use_lambda):
+                self.eval_vertex_code(vid)
+
+            else:
+                # set the node output with subdataflow
+                for i in range(actor.get_nb_output()):
+                    actor.set_output(i, SubDataflow(df, self, vid, i))
+
+    def traverse(self, vid, context, lambda_value):
+        """
+        Traversal evaluating the vertex vid after its parents
+        """
+        df = self._dataflow
+        plan = self._plan
+        actor = plan.actors[vid]
+
         self._evaluated.add(vid)
 
         use_lambda = False
 
-        # For each inputs
-        for pid in df.in_ports(vid):
+        # For each connected inputs
+        for input_index, parents in plan.inputs[vid]:
 
-            input_index = df.local_id(pid)
             inputs = []
 
             # Get input interface
@@ -550,13 +885,13 @@ class LambdaEvaluation(PriorityEvaluation):
             cpt = 0 # parent counter
 
             # For each connected node
-            for npid, nvid, nactor in self.get_parent_nodes(pid):
+            for nvid, nactor, output_index in parents:
 
                 # Do no reevaluate the same node
                 if not self.is_stopped(nvid, nactor):
-                    self.eval_vertex(nvid, transmit_cxt, transmit_lambda)
+                    yield self.traverse(nvid, transmit_cxt, transmit_lambda)
 
-                outval = nactor.get_output(df.local_id(npid))
+                outval = nactor.get_output(output_index)
                 # Lambda
 
                 # We must consider 3 cases
@@ -616,7 +951,7 @@ class LambdaEvaluation(PriorityEvaluation):
         :param context: list a value to assign to lambda variables
         """
         t0 = clock()
-        if PROVENANCE and (not is_subdataflow):
+        if self.provenance is not None and (not is_subdataflow):
             self.provenance.workflow_exec()
             self.provenance.start_time()
 
@@ -630,7 +965,7 @@ class LambdaEvaluation(PriorityEvaluation):
         PriorityEvaluation.eval(self, vtx_id, context, self.lambda_value, is_subdataflow=is_subdataflow)
         self.lambda_value.clear() # do not keep context in memory
         
-        if PROVENANCE:
+        if self.provenance is not None and (not is_subdataflow):
             self.provenance.end_time()
 
         t1 = clock()
@@ -803,73 +1138,398 @@ DefaultEvaluation = LambdaEvaluation
 
 
 
-# from openalea.core.threadmanager import ThreadManager
-# import thread
+def _call_function(func, inputs):
+    """ Call func with the node inputs (run in a worker process).
+    Return the outputs and the (wall start, wall end, cpu start, cpu end)
+    times of the call """
+    w0, c0 = default_timer(), clock()
+    outputs = func(*inputs)
+    return outputs, (w0, default_timer(), c0, clock())
 
-# class ParallelEvaluation(LambdaEvaluation):
-#     """ Parallel execution of a dataflow """
 
+class ParallelEvaluation(PriorityEvaluation):
+    """ Evaluation of independent branches in a thread or process pool.
 
-#     def get_output_value(self, nvid, nactor, npid):
-#             """ Return the value of a node output """
+    The vertices needed to compute the leaves (or vtx_id) are scheduled in
+    topological order: a vertex is submitted to the pool as soon as all its
+    parents have been evaluated, the ready vertices being ordered by priority.
+    Inputs are set in the main thread.
+
+    With the 'thread' backend, the whole node evaluation runs in a worker
+    thread: this is useful for nodes releasing the GIL (numpy, I/O, C
+    extensions). With the 'process' backend, only the function of picklable
+    FuncNode is sent to a worker process, the other nodes are evaluated in
+    the main process.
+
+    Lambda variables and SubDataflow are not supported by this algorithm.
+    """
+    __evaluators__.append("ParallelEvaluation")
+
+    backend = 'thread'
+    max_workers = None
+
+    def __init__(self, dataflow, backend=None, max_workers=None, executor=None):
+        """
+        :param dataflow: the dataflow to evaluate
+        :param backend: 'thread' or 'process'
+        :param max_workers: size of the pool (default from concurrent.futures)
+        :param executor: an existing concurrent.futures executor to use
+        """
+        PriorityEvaluation.__init__(self, dataflow)
+        if backend is not None:
+            self.backend = backend
+        if self.backend not in ('thread', 'process'):
+            raise ValueError("Unknown backend %r" % (self.backend,))
+        if max_workers is not None:
+            self.max_workers = max_workers
+        self.executor = executor
+        self._picklable = {}
+
+    def create_executor(self):
+        """ Return a new executor for one evaluation """
+        if self.backend == 'process':
+            return futures.ProcessPoolExecutor(max_workers=self.max_workers)
+        return futures.ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def schedule(self, vids):
+        """
+        Return the vertices to evaluate to compute vids.
+        The result is a dict mapping each vertex to the set of its parents
+        which have to be evaluated before it.
+        """
+        plan = self.get_plan()
+        parents = {}
+        stack = list(vids)
+        while stack:
+            vid = stack.pop()
+            if vid in parents:
+                continue
+            deps = parents[vid] = set()
+            for nvid in plan.parents[vid]:
+                if not self.is_stopped(nvid, plan.actors[nvid]):
+                    deps.add(nvid)
+                    stack.append(nvid)
+        return parents
+
+    def remote_function(self, node):
+        """
+        Return the function to call in a worker process to evaluate node,
+        or None if the node must be evaluated in the main process.
+        """
+        if self.backend != 'process' or not isinstance(node, FuncNode):
+            return None
+        cls = type(node)
+        if cls.eval is not Node.eval or cls.__call__ is not FuncNode.__call__:
+            return None
+        func = node.func
+        if func is None:
+            return None
+        try:
+            return func if self._picklable[func] else None
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable callable
+            return None
+        try:
+            pickle.dumps(func)
+            self._picklable[func] = True
+        except Exception:
+            self._picklable[func] = False
+        return self.remote_function(node)
+
+    def submit(self, executor, vid):
+        """
+        Submit the evaluation of vid.
+        Return a tuple (future, remote).
+        """
+        self.set_vertex_inputs(vid)
 
-#             l = self.locks[nvid]
+        node = self._dataflow.actor(vid)
+        func = self.remote_function(node)
+        if func is not None and not node.is_up_to_date():
+            node.notify_listeners(("start_eval",))
+            return executor.submit(_call_function, func, list(node.inputs)), True
 
-#             l.acquire()
-#             v = nactor.get_output(self._dataflow.local_id(npid))
-#             l.release()
+        if self.backend == 'thread':
+            return executor.submit(with_notification_policy(
+                self.eval_vertex_code), vid), False
 
-#             return v
+        # local evaluation in the main process
+        future = futures.Future()
+        try:
+            future.set_result(self.eval_vertex_code(vid))
+        except Exception as e:
+            future.set_exception(e)
+        return future, False
+
+    def collect(self, vid, future, remote):
+        """ Check the result of the evaluation of vid """
+        if remote:
+            # the error of the worker is raised by evaluate
+            times = None if future.exception() else future.result()[1]
+            self.eval_vertex_code(vid,
+                lambda node: node.update_outputs(future.result()[0]), times)
+        else:
+            future.result()
+        self._evaluated.add(vid)
 
+    def eval(self, vtx_id=None, *args, **kwds):
+        """ Evaluate the dataflow from vtx_id or from the leaves """
+        t0 = clock()
+        plan = self.get_plan()
 
-#     def eval_one_vertex (self, vid, context, lambda_value):
-#         """ Evaluate only one vertex
-#         @param vid: id of vertex to evalaute
-#         @param context: list of values to assign to variables
-#         @param lambda_value: dictionary of previous assigned values
-#         """
-#         LambdaEvaluation.eval_one_vertex(self, vid, context, lambda_value)
-#         self.locks[vid].release()
+        self._evaluated.clear()
 
+        if vtx_id is not None:
+            targets = [vtx_id]
+        else:
+            leaves = [(vid, plan.actors[vid]) for vid in plan.leaves]
+            leaves.sort(key=functools.cmp_to_key(cmp_priority))
+            targets = [vid for vid, actor in leaves]
 
+        parents = self.schedule(targets)
 
-#     def eval_vertex (self, vid, context, *args):
-#         """ Evaluate the graph starting at the vertex vid
-#         @param vid: starting vertex id
-#         @param context list of values to assign to variables
-#         """
+        executor = self.executor
+        if executor is None:
+            executor = self.create_executor()
+        try:
+            self.run_schedule(executor, parents)
+        finally:
+            if executor is not self.executor:
+                executor.shutdown(wait=True)
 
-#         lambda_value = {}
+        t1 = clock()
+        if quantify:
+            print("Evaluation time: %s" % (t1 - t0))
+
+    def run_schedule(self, executor, parents):
+        """ Evaluate the scheduled vertices with executor """
+        actors = self._plan.actors
+        priority = functools.cmp_to_key(cmp_priority)
+
+        children = dict((vid, []) for vid in parents)
+        for vid, deps in six.iteritems(parents):
+            for nvid in deps:
+                children[nvid].append(vid)
+
+        pending = dict((vid, len(deps)) for vid, deps in six.iteritems(parents))
+        ready = [vid for vid, nb in six.iteritems(pending) if nb == 0]
+        running = {}
+
+        while pending or running:
+            if not ready and not running:
+                # cycle in the dataflow: force the evaluation of one vertex
+                # with the output of its parents of the previous evaluation
+                ready = [min(pending, key=lambda v: priority((v, actors[v])))]
+
+            ready.sort(key=lambda v: priority((v, actors[v])))
+            for vid in ready:
+                del pending[vid]
+                future, remote = self.submit(executor, vid)
+                running[future] = (vid, remote)
+            ready = []
+
+            done, not_done = futures.wait(list(running),
+                                          return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                vid, remote = running.pop(future)
+                try:
+                    self.collect(vid, future, remote)
+                except Exception:
+                    for f in running:
+                        f.cancel()
+                    futures.wait(list(running))
+                    raise
+
+                for cvid in children[vid]:
+                    if cvid in pending:
+                        pending[cvid] -= 1
+                        if pending[cvid] == 0:
+                            ready.append(cvid)
+
+
+# Types whose values can be compared to detect a modification of an output.
+# Other values may be modified in place and are considered as new values.
+_immutable_types = (type(None), bool, int, float, complex,
+                    six.text_type, six.binary_type)
+
+
+def same_value(old, new):
+    """ Return True if the output value new is known to be equal to old """
+    if type(old) is not type(new) or not isinstance(new, _immutable_types):
+        return False
+    try:
+        return bool(old == new)
+    except Exception:
+        return False
 
-#         tm = ThreadManager()
-#         tm.clear()
 
-#         # Get the node order
-#         process_list = self.scan_graph(vid, context)
+class IncrementalEvaluation(AbstractEvaluation, AbstractListener):
+    """ Evaluation of the vertices affected by a modification only.
 
-#         # Synchronisation locks
-#         self.locks = {}
+    The evaluator observes the nodes of the dataflow. When an input of a node
+    is modified, the node and its descendants are marked dirty. An evaluation
+    only visits the dirty vertices, in topological order. A dirty vertex is
+    executed if it has been modified or if the version of one of the outputs
+    it reads has changed. The version of an output is incremented each time
+    its node is executed, unless it produces the same immutable value.
 
-#         for vid, context in process_list:
+    Inputs set without notification are not detected: use invalidate.
+    The vertices executed by the last evaluation are listed in executed.
+    """
+    __evaluators__.append("IncrementalEvaluation")
 
-#             if (self.locks.has_key(vid)): continue
-#             l = thread.allocate_lock()
-#             l.acquire()
-#             self.locks[vid] = l
+    def __init__(self, dataflow):
+        AbstractEvaluation.__init__(self, dataflow)
+        AbstractListener.__init__(self)
+
+        # plan of the observed actors
+        self._tracked = None
+        # vertices to visit, always contains the descendants of its elements
+        self._dirty = set()
+        # vertices to execute
+        self._modified = set()
+        # (vid, output index) -> version
+        self._versions = {}
+        # vid -> versions of the outputs read by the last execution of vid
+        self._consumed = {}
+        # values of the inputs of the composite node
+        self._inputs = None
+        self._running = False
+
+        self.executed = []
+
+    def notify(self, sender, event):
+        """ Mark the modified nodes dirty """
+        if self._running or not event or event[0] != "input_modified":
+            return
+        plan = self._tracked
+        try:
+            vid = sender.get_id()
+        except Exception:
+            return
+        if plan is not None and plan.actors.get(vid) is sender:
+            self.invalidate(vid)
 
+    def invalidate(self, vid=None):
+        """
+        Execute vid (or all the vertices if vid is None) and the descendants
+        affected at the next evaluation.
+        """
+        plan = self._tracked
+        if plan is None:
+            return
 
-#         # Eval each node
-#         scanned = set()
+        if vid is None:
+            self._modified.update(plan.actors)
+            self._dirty.update(plan.actors)
+            return
 
-#         for vid, context in process_list:
-#             if (vid not in scanned):
-#                 tm.add_task( self.eval_one_vertex, (vid, context, lambda_value))
-#             scanned.add(vid)
+        self._modified.add(vid)
+        children = plan.children
+        dirty = self._dirty
+        stack = [vid]
+        while stack:
+            v = stack.pop()
+            if v not in dirty:
+                dirty.add(v)
+                stack.extend(children[v])
+
+    def track(self, plan):
+        """ Observe the actors of plan and invalidate all the vertices """
+        if plan is self._tracked:
+            return
 
+        self._tracked = plan
+        for actor in plan.actors.values():
+            try:
+                actor.register_listener(self)
+            except AttributeError:
+                pass
+        self._consumed.clear()
+        self.invalidate()
+
+    def check_inputs(self):
+        """ Invalidate the input node of a composite node if needed """
+        vid = getattr(self._dataflow, 'id_in', None)
+        if vid is None or vid not in self._tracked.actors:
+            return
+        actor = self._tracked.actors[vid]
+        inputs = [actor.get_output(i) for i in range(actor.get_nb_output())]
+        old = self._inputs
+        if (old is None or len(old) != len(inputs) or
+            any(a is not b for a, b in zip(old, inputs))):
+            self.invalidate(vid)
+        self._inputs = inputs
+
+    def eval(self, vtx_id=None, *args, **kwds):
+        """
+        Execute the dirty vertices needed to compute vtx_id (or all the
+        dirty vertices if vtx_id is None).
+        Return the list of the executed vertices.
+        """
+        t0 = clock()
+        plan = self.get_plan()
+        self.track(plan)
+        self.check_inputs()
+
+        if vtx_id is None:
+            todo = list(self._dirty)
+        else:
+            if getattr(plan.actors[vtx_id], 'modified', False):
+                self.invalidate(vtx_id)
+            upstream = plan.upstream(vtx_id)
+            todo = [vid for vid in self._dirty if vid in upstream]
+
+        todo.sort(key=plan.ranks().__getitem__)
+
+        self.executed = []
+        self._running = True
+        try:
+            for vid in todo:
+                self.update_vertex(vid)
+                self._dirty.discard(vid)
+                self._modified.discard(vid)
+        finally:
+            self._running = False
+
+        t1 = clock()
+        if quantify:
+            print("Evaluation time: %s" % (t1 - t0))
+
+        return self.executed
+
+    def update_vertex(self, vid):
+        """ Execute vid if it is modified or if one of its inputs changed """
+        plan = self._tracked
+        versions = self._versions
+
+        consumed = tuple(versions.get((nvid, output_index), 0)
+                         for input_index, parents in plan.inputs[vid]
+                         for nvid, nactor, output_index in parents)
+        if vid not in self._modified and self._consumed.get(vid) == consumed:
+            return
+        self._consumed[vid] = consumed
+
+        actor = plan.actors[vid]
+        self.set_vertex_inputs(vid)
+
+        try:
+            if actor.is_up_to_date():
+                return
+        except AttributeError:
+            pass
+        outputs = [actor.get_output(i) for i in range(actor.get_nb_output())]
+
+        self.eval_vertex_code(vid)
+        self.executed.append(vid)
+
+        for i, old in enumerate(outputs):
+            if not same_value(old, actor.get_output(i)):
+                versions[(vid, i)] = versions.get((vid, i), 0) + 1
 
 
-# DefaultEvaluation = ParallelEvaluation
-# #DefaultEvaluation = LambdaEvaluation
 class ToScriptEvaluation(AbstractEvaluation):
     """ Basic transformation into script algorithm """
     __evaluators__.append("ToScriptEvaluation")
@@ -886,19 +1546,23 @@ class ToScriptEvaluation(AbstractEvaluation):
 
     def eval_vertex(self, vid, *args):
         """ Evaluate the vertex vid """
+        return self.run(self.traverse(vid))
 
-        df = self._dataflow
-        actor = df.actor(vid)
+    def traverse(self, vid):
+        """ Traversal returning the script of vid and its parents """
+
+        plan = self._plan
+        actor = plan.actors[vid]
 
         self._evaluated.add(vid)
 
         script = ""
-        # For each inputs
-        for pid in df.in_ports(vid):
+        # For each connected inputs
+        for input_index, parents in plan.inputs[vid]:
             # For each connected node
-            for npid, nvid, nactor in self.get_parent_nodes(pid):
+            for nvid, nactor, output_index in parents:
                 if not self.is_stopped(nvid, nactor):
-                    script += self.eval_vertex(nvid)
+                    script += yield self.traverse(nvid)
 
         # Eval the node
         script += actor.to_script()
@@ -907,7 +1571,7 @@ class ToScriptEvaluation(AbstractEvaluation):
 
     def eval(self, *args, **kwds):
         """ Evaluate the whole dataflow starting from leaves"""
-        df = self._dataflow
+        plan = self.get_plan()
 
         # Unvalidate all the nodes
         self._evaluated.clear()
@@ -915,7 +1579,7 @@ class ToScriptEvaluation(AbstractEvaluation):
 
         # Eval from the leaf
         script = ""
-        for vid in (vid for vid in df.vertices() if df.nb_out_edges(vid)==0):
+        for vid in plan.leaves:
             script += self.eval_vertex(vid)
 
         return script
@@ -926,27 +1590,47 @@ class ToScriptEvaluation(AbstractEvaluation):
 # The objective is to take
 
 class DiscreteTimeEvaluation(AbstractEvaluation):
-    """ Evaluation algorithm with generator / priority and selection"""
+    """ Discrete event simulation of a dataflow with timed nodes.
+
+    A node whose evaluation returns a delay d is a timed node: it fires
+    again d cycles later. The first cycle (0) evaluates the whole dataflow.
+    The next cycles are taken from a priority queue of the firing cycles:
+    only the firing nodes and their descendants are evaluated, in
+    topological order, and the cycles without firing node are skipped.
+
+    The simulation ends when no timed node is scheduled. It is stopped
+    when a firing node returns no delay or when the budget (max_cycles,
+    max_time in seconds) is exhausted; the timed nodes are then reset.
+    """
     __evaluators__.append("DiscreteTimeEvaluation")
 
+    # budget of a simulation (None for no limit)
+    max_cycles = 1000
+    max_time = None
+
     def __init__(self, dataflow):
 
         AbstractEvaluation.__init__(self, dataflow)
         # a property to specify if the node has already been evaluated
         self._evaluated = set()
-        self.reeval = False # Flag to force reevaluation (for generator)
-
-        # CPL
-        # At each evaluation of the dataflow, increase the current cycle of
-        # one unit.
 
         self._current_cycle = 0
-        # timed nodes are a dict with vid, time >0
-        # when time is 0, remove the node from the dict
+        # heap of (firing cycle, order, vid)
+        self._queue = []
+        self._order = itertools.count()
+        # timed nodes: vid -> firing cycle, the other entries of the queue
+        # are obsolete
         self._timed_nodes = dict()
+        # vertices needed by the simulated leaves, None before the start
+        self._upstream = None
         self._stop = False
         self._nodes_to_reset = []
 
+    @property
+    def current_cycle(self):
+        """ The cycle being or last evaluated """
+        return self._current_cycle
+
     def is_stopped(self, vid, actor):
         """ Return True if evaluation must be stop at this vertex """
         stopped = False
@@ -962,115 +1646,207 @@ class DiscreteTimeEvaluation(AbstractEvaluation):
     def clear(self):
         """ Clear evaluation variable """
         self._evaluated.clear()
-        self.reeval = False
+        self._current_cycle = 0
+        self._queue = []
+        self._timed_nodes.clear()
+        self._upstream = None
         self._stop = False
         self._nodes_to_reset = []
 
-    def next_step(self):
-        """ Update the scheduler of one step. """
-        self._current_cycle += 1
-        for vid in self._timed_nodes:
-            self._timed_nodes[vid] -= 1
+    def schedule_vertex(self, vid, delay):
+        """ Fire vid delay cycles after the current one """
+        cycle = self._current_cycle + max(1, int(delay))
+        self._timed_nodes[vid] = cycle
+        heapq.heappush(self._queue, (cycle, next(self._order), vid))
+
+    def next_cycle(self):
+        """ Return the next firing cycle, or None if no node is scheduled """
+        queue = self._queue
+        timed_nodes = self._timed_nodes
+        while queue:
+            cycle, order, vid = queue[0]
+            if timed_nodes.get(vid) == cycle:
+                return cycle
+            heapq.heappop(queue)
+        return None
+
+    def is_finished(self):
+        """ Return True if there is no more cycle to evaluate """
+        return self._stop or self.next_cycle() is None
+
+    def update_vertex(self, vid, fired=False):
+        """ Evaluate vid and schedule it if it returns a delay """
+        delay = self.eval_vertex_code(vid)
+        if delay:
+            self.schedule_vertex(vid, delay)
+        elif fired:
+            # a timed node returning no delay stops the simulation
+            self._stop = True
+            self._nodes_to_reset.append(vid)
 
     def eval_vertex(self, vid):
         """ Evaluate the vertex vid """
+        self.run(self.traverse(vid))
 
-        #print "Step ", self._current_cycle
+    def traverse(self, vid):
+        """ Traversal evaluating the vertex vid after its parents """
 
-        df = self._dataflow
-        actor = df.actor(vid)
+        plan = self._plan
+        actor = plan.actors[vid]
 
         self._evaluated.add(vid)
 
-        # For each inputs
+        # For each connected inputs
         # Compute the inputs of the node
-        for pid in df.in_ports(vid):
+        for input_index, parents in plan.inputs[vid]:
             inputs = []
 
-            cpt = 0
             # For each connected node
-            for npid, nvid, nactor in self.get_parent_nodes(pid):
+            for nvid, nactor, output_index in parents:
                 # Do no reevaluate the same node
                 if not self.is_stopped(nvid, nactor):
-                    self.eval_vertex(nvid)
+                    yield self.traverse(nvid)
 
-                inputs.append(nactor.get_output(df.local_id(npid)))
-                cpt += 1
+                inputs.append(nactor.get_output(output_index))
 
             # set input as a list or a simple value
-            if (cpt == 1):
+            if (len(inputs) == 1):
                 inputs = inputs[0]
-            if (cpt > 0):
-                actor.set_input(df.local_id(pid), inputs)
-
-        # Eval the node
-        delay = 0
-        # When a node return no delay, we stopped the simulation
-        stop_when_finished = False
-
-        if vid in self._timed_nodes:
-            delay = self._timed_nodes[vid]
-            if delay == 0:
-                del self._timed_nodes[vid]
-                stop_when_finished = True
-
-        if delay == 0:
-            delay = self.eval_vertex_code(vid)
+            actor.set_input(input_index, inputs)
 
+        self.update_vertex(vid)
 
-        # Reevaluation flag
-        # TODO: Add the node to the scheduler rather to execute
-        if (delay):
-            self._timed_nodes[vid] = int(delay)
-            self.reeval = delay
-        elif stop_when_finished:
-            self._stop = True
-            self._nodes_to_reset.append(vid)
-        elif self._current_cycle > 1000:
-            self._stop = True
-
-    def eval(self, vtx_id=None, step=False):
-        t0 = clock()
-
+    def start(self, vtx_id=None):
+        """
+        Start a simulation: evaluate the dataflow needed by vtx_id (or by
+        the leaves) at cycle 0 and schedule the timed nodes.
+        """
         self.clear()
-
-        df = self._dataflow
+        plan = self.get_plan()
 
         if (vtx_id is not None):
-            leafs = [(vtx_id, df.actor(vtx_id))]
+            leafs = [(vtx_id, plan.actors[vtx_id])]
 
         else:
             # Select the leafs (list of (vid, actor))
-            leafs = [(vid, df.actor(vid))
-                for vid in df.vertices() if df.nb_out_edges(vid)==0]
+            leafs = [(vid, plan.actors[vid]) for vid in plan.leaves]
 
         leafs.sort(key=functools.cmp_to_key(cmp_priority))
 
+        self._upstream = set()
+        for vid, actor in leafs:
+            self._upstream.update(plan.upstream(vid))
+
         # Execute
         for vid, actor in leafs:
             if not self.is_stopped(vid, actor):
-                self.reeval = True
-                if not step:
-                    while(self.reeval and not self._stop):
-                        self.clear()
-                        self.eval_vertex(vid)
-                        self.next_step()
-                elif (self.reeval and not self._stop):
-                    self.clear()
-                    self.eval_vertex(vid)
-                    self.next_step()
+                self.eval_vertex(vid)
 
-        if self._stop:
-            self._nodes_to_reset.extend(self._timed_nodes)
-            for vid in self._nodes_to_reset:
+    def step(self):
+        """
+        Evaluate the next firing cycle: the nodes firing at this cycle and
+        their descendants. Return the cycle, or None if the simulation is
+        finished.
+        """
+        if self._upstream is None:
+            self.start()
+            return self._current_cycle
+        if self.is_finished():
+            return None
+
+        cycle = self._current_cycle = self.next_cycle()
+        queue = self._queue
+        timed_nodes = self._timed_nodes
+        fired = set()
+        while self.next_cycle() == cycle:
+            vid = heapq.heappop(queue)[2]
+            del timed_nodes[vid]
+            fired.add(vid)
+
+        # descendants of the fired nodes needed by the leaves
+        plan = self._plan
+        children = plan.children
+        upstream = self._upstream
+        cone = set()
+        stack = list(fired)
+        while stack:
+            vid = stack.pop()
+            if vid not in cone and vid in upstream:
+                cone.add(vid)
+                stack.extend(children[vid])
+
+        actors = plan.actors
+        for vid in sorted(cone, key=plan.ranks().__getitem__):
+            # timed nodes waiting for a later cycle and blocked nodes keep
+            # their outputs
+            if vid in timed_nodes or getattr(actors[vid], 'block', False):
+                continue
+            self.set_vertex_inputs(vid)
+            self.update_vertex(vid, vid in fired)
+
+        return cycle
+
+    def run_cycles(self, max_cycles=None, max_time=None):
+        """
+        Evaluate the next cycles until the end of the simulation or the
+        exhaustion of the budget (default to max_cycles and max_time).
+        Return the current cycle.
+        """
+        if max_cycles is None:
+            max_cycles = self.max_cycles
+        if max_time is None:
+            max_time = self.max_time
+        if self._upstream is None:
+            self.start()
+
+        t0 = default_timer()
+        while not self._stop:
+            cycle = self.next_cycle()
+            if cycle is None or (max_cycles is not None and
+                                 cycle > max_cycles):
+                break
+            if max_time is not None and default_timer() - t0 > max_time:
+                break
+            self.step()
+        return self._current_cycle
+
+    def run_until(self, cycle, max_time=None):
+        """ Evaluate the next cycles up to cycle included """
+        self.run_cycles(max_cycles=cycle, max_time=max_time)
+        if not self._stop:
+            self._current_cycle = max(self._current_cycle, cycle)
+        return self._current_cycle
+
+    def finish(self):
+        """
+        End the simulation. The timed nodes are reset if it has been
+        stopped before its end.
+        """
+        df = self._dataflow
+        if self._stop or self.next_cycle() is not None:
+            for vid in self._nodes_to_reset + list(self._timed_nodes):
                 df.actor(vid).reset()
+        self.clear()
 
-        #print 'Run %d times the dataflow'%(self._current_cycle,)
+    def eval(self, vtx_id=None, step=False):
+        """
+        Run the simulation of the dataflow, or only its next cycle if step
+        is True (the simulation is kept between the calls).
+        """
+        t0 = clock()
 
-        # Reset the state
-        if not step:
-            self.clear()
-            self._current_cycle = 0
+        if step:
+            if self._upstream is None:
+                self.start(vtx_id)
+            else:
+                self.step()
+            if (self.is_finished() or (self.max_cycles is not None and
+                                       self.next_cycle() > self.max_cycles)):
+                self.finish()
+        else:
+            self.start(vtx_id)
+            self.run_cycles()
+            self.finish()
 
         t1 = clock()
         if quantify:
@@ -1122,7 +1898,11 @@ class SciFlowareEvaluation(AbstractEvaluation):
 
 
     def eval_vertex(self, vid):
-        """ Evaluate the vertex vid 
+        """ Evaluate the vertex vid """
+        self.run(self.traverse(vid))
+
+    def traverse(self, vid):
+        """ Traversal evaluating the vertex vid after its parents
 
         This evaluation is both a kind of compilation and real evaluation.
         Algorithm
@@ -1174,7 +1954,7 @@ class SciFlowareEvaluation(AbstractEvaluation):
                     
 
                     if not self.is_stopped(nvid, nactor):
-                        self.eval_vertex(nvid)
+                        yield self.traverse(nvid)
 
                     inputs.append(nactor.get_output(df.local_id(npid)))
                     cpt += 1
@@ -0,0 +1,240 @@
+# -*- python -*-
+#
+#       OpenAlea.Core
+#
+#       Copyright 2006-2009 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Profiler of the node evaluations.
+
+The vertices evaluated by all the evaluation algorithms in a with block
+are timed::
+
+    from openalea.core.algo.profiler import Profiler
+
+    with Profiler() as profiler:
+        compositenode.eval_as_expression()
+    print(profiler.summary())
+    profiler.write_collapsed('profile.folded') # for flamegraph.pl
+    profiler.write_csv('profile.csv')
+
+A vertex is identified by its path: the workflow, the composite nodes
+containing it and its 'vid:factory name' label. For each path, the
+profiler collects the number of calls, the wall time (with and without the
+nested vertices), the CPU time of the evaluating thread and the upstream
+wait: the longest chain of parents evaluated before the vertex. The time of
+the block not spent in the nodes is the overhead of the evaluators.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import csv
+import threading
+import time
+
+from openalea.core.algo import dataflow_evaluation
+from openalea.core.dataflow import DataFlow
+
+try:
+    from time import thread_time
+except ImportError:
+    from time import process_time as thread_time
+
+# indexes of the statistics of a path
+CALLS, WALL, SELF_WALL, CPU, SELF_CPU, UPSTREAM, COMPOSITE = range(7)
+
+CSV_FIELDS = ('path', 'calls', 'wall', 'self_wall', 'cpu', 'self_cpu',
+              'upstream', 'composite')
+
+
+def node_name(node):
+    """ Return the name of the factory of node, or the name of its class """
+    factory = getattr(node, 'factory', None)
+    name = getattr(factory, 'name', None) or type(node).__name__
+    return str(name).replace(';', ',')
+
+
+def label(vid, node):
+    """ Return the label of a vertex: 'vid:factory name' """
+    return '%s:%s' % (vid, node_name(node))
+
+
+class Profiler(object):
+    """
+    Profile of the vertices evaluated while the profiler is active (see
+    the module documentation).
+    """
+
+    def __init__(self):
+        # path -> [calls, wall, self wall, cpu, self cpu, upstream, composite]
+        self.stats = {}
+        self.total = 0.
+        self._start = None
+        self._previous = None
+        self._lock = threading.Lock()
+        # evaluation stack of each thread: [path, children wall, children cpu]
+        self._local = threading.local()
+        # (id of the algo, vid) -> (end of the last call, upstream + wall)
+        self._ends = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        """ Profile the evaluations from now """
+        self._previous = dataflow_evaluation.PROFILER
+        dataflow_evaluation.PROFILER = self
+        self._start = time.perf_counter()
+
+    def stop(self):
+        """ Stop profiling """
+        if self._start is None:
+            return
+        self.total += time.perf_counter() - self._start
+        self._start = None
+        dataflow_evaluation.PROFILER = self._previous
+        self._previous = None
+
+    def clear(self):
+        """ Forget the collected statistics """
+        with self._lock:
+            self.stats.clear()
+            self._ends.clear()
+            self.total = 0.
+            if self._start is not None:
+                self._start = time.perf_counter()
+
+    def wrap(self, algo, vid, evaluate=None, times=None):
+        """
+        Return a function evaluating a node like evaluate (default to
+        node.eval) and profiling it as the vertex vid of algo.
+
+        :param times: the (wall start, wall end, cpu start, cpu end) of an
+                      evaluation done in a worker process, recorded instead
+                      of the time of evaluate
+        """
+        def profiled(node):
+            return self.call(algo, vid, node, evaluate, times)
+        return profiled
+
+    def call(self, algo, vid, node, evaluate=None, times=None):
+        """ Evaluate node and profile it as the vertex vid of algo
+        (see wrap) """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        if stack:
+            parent = stack[-1][0]
+        else:
+            dataflow = getattr(algo, '_dataflow', None)
+            parent = (node_name(dataflow),)
+        frame = [parent + (label(vid, node),), 0., 0.]
+        stack.append(frame)
+
+        w0 = time.perf_counter()
+        c0 = thread_time()
+        try:
+            return node.eval() if evaluate is None else evaluate(node)
+        finally:
+            w1 = time.perf_counter()
+            cpu = thread_time() - c0
+            if times is not None:
+                w0, w1, c0, c1 = times
+                cpu = c1 - c0
+            wall = w1 - w0
+            stack.pop()
+            if stack:
+                stack[-1][1] += wall
+                stack[-1][2] += cpu
+            self.record(algo, vid, frame, wall, cpu, w1,
+                        isinstance(node, DataFlow))
+
+    def record(self, algo, vid, frame, wall, cpu, end, composite):
+        path, children_wall, children_cpu = frame
+        plan = getattr(algo, '_plan', None)
+        key = (id(algo), vid)
+        with self._lock:
+            ends = self._ends
+            last = ends.get(key)
+            since = last[0] if last is not None else None
+            upstream = 0.
+            if plan is not None:
+                for nvid in plan.parents.get(vid, ()):
+                    parent = ends.get((key[0], nvid))
+                    if (parent is not None and
+                            (since is None or parent[0] > since)):
+                        upstream = max(upstream, parent[1])
+            ends[key] = (end, upstream + wall)
+
+            stats = self.stats.get(path)
+            if stats is None:
+                stats = self.stats[path] = [0, 0., 0., 0., 0., 0., composite]
+            stats[CALLS] += 1
+            stats[WALL] += wall
+            stats[SELF_WALL] += wall - children_wall
+            stats[CPU] += cpu
+            stats[SELF_CPU] += cpu - children_cpu
+            stats[UPSTREAM] += upstream
+
+    def get_total(self):
+        """ Return the wall time during which the profiler was active """
+        if self._start is None:
+            return self.total
+        return self.total + time.perf_counter() - self._start
+
+    def node_time(self):
+        """ Return the wall time spent in the code of the nodes (the
+        composite nodes excluded) """
+        return sum(s[SELF_WALL] for s in self.stats.values()
+                   if not s[COMPOSITE])
+
+    def rows(self):
+        """ Return the (path, stats) sorted by decreasing self wall time """
+        return sorted(self.stats.items(), key=lambda item: -item[1][SELF_WALL])
+
+    def summary(self, limit=20):
+        """ Return a table of the vertices taking the most time """
+        total = self.get_total()
+        nodes = self.node_time()
+        overhead = max(total - nodes, 0.)
+        share = lambda t: 100. * t / total if total else 0.
+        lines = ["Total %.1f ms: nodes %.1f ms (%.0f%%), evaluator overhead "
+                 "%.1f ms (%.0f%%)" % (total * 1000, nodes * 1000, share(nodes),
+                                       overhead * 1000, share(overhead)),
+                 "%8s %10s %10s %10s %10s %6s  %s" % (
+                     "calls", "wall (ms)", "self (ms)", "cpu (ms)",
+                     "upstr (ms)", "%self", "vertex")]
+        for path, s in self.rows()[:limit]:
+            lines.append("%8d %10.2f %10.2f %10.2f %10.2f %6.1f  %s" % (
+                s[CALLS], s[WALL] * 1000, s[SELF_WALL] * 1000,
+                s[SELF_CPU] * 1000, s[UPSTREAM] * 1000, share(s[SELF_WALL]),
+                '/'.join(path)))
+        return '\n'.join(lines)
+
+    def write_collapsed(self, filename):
+        """ Write the self wall times (us) as collapsed stacks, the input of
+        flame graph tools """
+        with open(filename, 'w') as f:
+            for path, s in sorted(self.stats.items()):
+                us = int(round(s[SELF_WALL] * 1e6))
+                if us > 0:
+                    f.write('%s %d\n' % (';'.join(path), us))
+
+    def write_csv(self, filename):
+        """ Write the statistics of the vertices (times in s) in a CSV file """
+        with open(filename, 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_FIELDS)
+            for path, s in self.rows():
+                writer.writerow(['/'.join(path)] + list(s))
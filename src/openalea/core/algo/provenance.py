@@ -0,0 +1,245 @@
+# -*- python -*-
+#
+#       OpenAlea.Core
+#
+#       Copyright 2006-2009 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Provenance of the node executions written in the background.
+
+The executions are recorded in a bounded ring buffer by the evaluation and
+written by batches in a thread, in a sqlite database or in a JSON lines
+file::
+
+    from openalea.core.algo.provenance import AsyncProvenance, SQLiteWriter
+
+    algo = compositenode.get_eval_algo()
+    algo.set_provenance(AsyncProvenance(compositenode,
+                                        SQLiteWriter('provenance.sq3')))
+    compositenode.eval_as_expression()
+    algo.provenance.close()
+    print(algo.provenance.stats())
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import json
+import threading
+from collections import deque
+from timeit import default_timer
+
+from openalea.core import logger
+from openalea.core.cache import factory_id, fingerprint
+from openalea.core.algo.dataflow_evaluation import Provenance, db_create
+
+# fields of a node execution record
+FIELDS = ('workflow', 'vid', 'package', 'factory', 'start', 'end',
+          'inputs', 'outputs')
+
+
+def value_fingerprint(value):
+    """
+    Return the fingerprint of the content of value (see cache.fingerprint),
+    or the name of its type if it can not be digested.
+    """
+    return fingerprint((value,)) or type(value).__name__
+
+
+class JSONLinesWriter(object):
+    """ Write the records as JSON objects, one per line """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = None
+
+    def open(self):
+        self._file = open(self.filename, 'a')
+
+    def write(self, records):
+        self._file.write(''.join(json.dumps(dict(zip(FIELDS, r))) + '\n'
+                                 for r in records))
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SQLiteWriter(object):
+    """ Write the records in the NodeEvent table of a sqlite database
+    (see dataflow_evaluation.db_create) """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._conn = None
+
+    def open(self):
+        import sqlite3
+        # the connection is used by the writer thread only
+        self._conn = sqlite3.connect(str(self.filename))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        db_create(self._conn.cursor())
+        self._conn.commit()
+
+    def write(self, records):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO NodeEvent VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(w, str(vid), pkg, name, t0, t1, json.dumps(ins),
+                  json.dumps(outs))
+                 for w, vid, pkg, name, t0, t1, ins, outs in records])
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class AsyncProvenance(Provenance):
+    """
+    Provenance recording the node executions in a ring buffer, written by
+    batches by a writer (JSONLinesWriter, SQLiteWriter) in a thread.
+
+    The evaluation never waits for the writer: when the buffer is full, the
+    oldest records are dropped and counted. The time spent in node_exec is
+    measured (see stats).
+    """
+
+    def __init__(self, workflow, writer, capacity=100000, batch_size=10000,
+                 interval=0.5, fingerprints=True):
+        """
+        :param workflow: the evaluated dataflow
+        :param writer: object with open(), write(records) and close()
+        :param capacity: maximum number of records waiting to be written
+        :param batch_size: maximum number of records written at once
+        :param interval: maximum delay (s) before writing the records
+        :param fingerprints: record the fingerprints of the inputs and
+            outputs of the nodes
+        """
+        Provenance.__init__(self, workflow)
+        self.writer = writer
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.interval = interval
+        self.fingerprints = fingerprints
+
+        factory = getattr(workflow, 'factory', None)
+        self.workflow_name = getattr(factory, 'name', None)
+
+        self.buffer = deque(maxlen=capacity)
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.overhead = 0.
+        self.write_time = 0.
+
+        self._wakeup = threading.Event()
+        self._done = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run,
+                                        name="provenance writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def node_exec(self, vid, node, start_time, end_time, *args):
+        t0 = default_timer()
+        if self.fingerprints:
+            ins = [value_fingerprint(v) for v in node.inputs]
+            outs = [value_fingerprint(v) for v in node.outputs]
+        else:
+            ins = outs = None
+        pkg, name = factory_id(node) or (None, type(node).__name__)
+        record = (self.workflow_name, vid, pkg, name, start_time, end_time,
+                  ins, outs)
+        # node_exec is called by the workers of ParallelEvaluation
+        with self._done:
+            buffer = self.buffer
+            if len(buffer) == self.capacity:
+                self.dropped += 1
+            buffer.append(record)
+            self.recorded += 1
+            if len(buffer) >= self.batch_size:
+                self._wakeup.set()
+            self.overhead += default_timer() - t0
+
+    def _run(self):
+        try:
+            self.writer.open()
+        except Exception as e:
+            logger.error("Provenance writer can not be opened: %s" % e)
+            self.errors += 1
+            self.writer = None
+        try:
+            while not self._closed:
+                self._wakeup.wait(self.interval)
+                self._wakeup.clear()
+                self._write()
+            self._write()
+        finally:
+            if self.writer is not None:
+                self.writer.close()
+
+    def _write(self):
+        buffer = self.buffer
+        while buffer:
+            batch = []
+            try:
+                for i in range(self.batch_size):
+                    batch.append(buffer.popleft())
+            except IndexError:
+                pass
+            t0 = default_timer()
+            try:
+                if self.writer is None:
+                    raise IOError("no writer")
+                self.writer.write(batch)
+                written = len(batch)
+            except Exception as e:
+                written = 0
+                logger.error("Provenance records not written: %s" % e)
+            # the counters are also updated by the evaluation threads
+            with self._done:
+                self.written += written
+                if written < len(batch):
+                    self.errors += 1
+                    self.dropped += len(batch)
+            self.write_time += default_timer() - t0
+            self.batches += 1
+        with self._done:
+            self._done.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Wait until the records are written.
+        Return False if the timeout (s) expired.
+        """
+        recorded = self.recorded
+        with self._done:
+            self._wakeup.set()
+            return self._done.wait_for(
+                lambda: (self.written + self.dropped >= recorded or
+                         not self._thread.is_alive()), timeout)
+
+    def close(self):
+        """ Write the remaining records and stop the writer thread """
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+
+    def stats(self):
+        """ Return the counters of the provenance """
+        return dict(recorded=self.recorded, written=self.written,
+                    dropped=self.dropped, pending=len(self.buffer),
+                    batches=self.batches, errors=self.errors,
+                    overhead=self.overhead, write_time=self.write_time)
@@ -0,0 +1,479 @@
+# -*- python -*-
+#
+#       OpenAlea.Core
+#
+#       Copyright 2006-2009 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Memoization of the outputs of pure nodes.
+
+The outputs of a node are stored in a cache, keyed by its function and by
+a fingerprint of its input values. The cache is enabled per factory:
+
+    >>> Factory(name='smooth', ..., cache=True)
+    >>> Factory(name='simulate', ..., cache='disk')
+
+    >>> @factory(cache=True)
+    ... def smooth(points, radius):
+    ...     ...
+
+True uses an in-memory LRUCache shared by all the nodes, 'disk' a DiskCache
+shared by the sessions in the openalea home directory.
+
+Only nodes without side effects and whose outputs only depend on their
+inputs must be cached. The cached outputs are shared by all the nodes
+getting them: they must not be modified in place.
+
+The caches are bypassed in a `bypass()` block or by an evaluator whose
+use_cache attribute is False.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from weakref import WeakKeyDictionary
+
+from .change_detection import digest
+
+_missing = object()
+_state = threading.local()
+
+
+def fingerprint(values):
+    """
+    Return a stable fingerprint (hexadecimal string) of the values, or None
+    if one of them can not be digested.
+    """
+    h = hashlib.sha1()
+    for value in values:
+        d = digest(value)
+        if d is None:
+            return None
+        h.update(d)
+    return h.hexdigest()
+
+
+def factory_id(node):
+    """
+    Return (package id, factory id) of the factory of node, or None if the
+    node has no factory.
+    """
+    factory = getattr(node, 'factory', None)
+    if factory is None:
+        return None
+    pkg = factory.get_pkg()
+    return (pkg.get_id() if pkg else '', factory.get_id())
+
+
+def approximate_size(value, depth=3):
+    """ Return the approximate size in bytes of value """
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(value, numpy.ndarray):
+        return sys.getsizeof(value, 0) + value.nbytes
+    size = sys.getsizeof(value, 64)
+    if depth > 0:
+        if isinstance(value, (list, tuple, set, frozenset)):
+            size += sum(approximate_size(v, depth - 1) for v in value)
+        elif isinstance(value, dict):
+            size += sum(approximate_size(k, depth - 1) +
+                        approximate_size(v, depth - 1)
+                        for k, v in value.items())
+    return size
+
+
+def _source_token(factory):
+    """ Return the source cache and the module file state of factory """
+    path = getattr(factory, 'nodemodule_path', None)
+    try:
+        mtime = os.stat(path).st_mtime if path else None
+    except OSError:
+        mtime = None
+    return getattr(factory, 'src_cache', None), path, mtime
+
+
+class LRUCache(object):
+    """
+    In memory cache of the node outputs bounded by a number of entries and
+    an approximate size in bytes. The least recently used entries are
+    evicted first.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=256 * 2 ** 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.clear()
+
+    def __reduce__(self):
+        # the content is not pickled with the nodes
+        return (self.__class__, (self.max_entries, self.max_bytes))
+
+    def clear(self):
+        """ Remove all the entries and reset the statistics """
+        with self._lock:
+            self._entries = OrderedDict()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.skipped = 0
+            self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """ Return the value of key and mark it as recently used """
+        with self._lock:
+            try:
+                value, size = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """ Store value for key and evict the least recently used entries """
+        size = approximate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            while (len(self._entries) > self.max_entries or
+                   self.nbytes > self.max_bytes):
+                _, (_, removed) = self._entries.popitem(last=False)
+                self.nbytes -= removed
+                self.evictions += 1
+
+    def key(self, node):
+        """ Return the cache key of the node evaluation or None """
+        process = getattr(node, 'func', None)
+        if process is None:
+            # the outputs of a node class may depend on its factory
+            process = factory_id(node)
+            if process is None:
+                return None
+        try:
+            hash(process)
+        except TypeError:
+            return None
+        inputs = fingerprint(node.inputs)
+        if inputs is None:
+            return None
+        return (process, inputs)
+
+    def call(self, node):
+        """ Return the outputs of node.__call__, computed or cached """
+        key = self.key(node)
+        if key is None:
+            with self._lock:
+                self.skipped += 1
+            return node(node.inputs)
+
+        outlist = self.get(key, _missing)
+        if outlist is _missing:
+            outlist = node(node.inputs)
+            self.put(key, outlist)
+        return outlist
+
+    def stats(self):
+        """ Return the statistics of the cache as a dict """
+        with self._lock:
+            calls = self.hits + self.misses
+            return dict(hits=self.hits,
+                        misses=self.misses,
+                        skipped=self.skipped,
+                        evictions=self.evictions,
+                        entries=len(self._entries),
+                        nbytes=self.nbytes,
+                        hit_rate=float(self.hits) / calls if calls else 0.,
+                        )
+
+    def __repr__(self):
+        return '%s(max_entries=%d, max_bytes=%d)' % (
+            self.__class__.__name__, self.max_entries, self.max_bytes)
+
+
+class DiskCache(LRUCache):
+    """
+    Persistent cache of the node outputs, shared by the sessions and the
+    processes.
+
+    An entry is a pickle file named by a digest of the factory id, the
+    factory source and the input fingerprint. Files are written atomically
+    (temporary file then rename), so several processes may use the same
+    directory. The modification time of a file is the creation time of the
+    entry, and its access time the last time it was used. The least recently
+    used entries are evicted when the directory exceeds max_bytes, and
+    entries older than ttl seconds are ignored.
+    """
+
+    suffix = '.pkl'
+
+    def __init__(self, path=None, max_bytes=2 ** 30, ttl=None):
+        self._path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # factory -> (source token, source digest)
+        self._sources = WeakKeyDictionary()
+        self.reset_stats()
+
+    def __reduce__(self):
+        return (self.__class__, (self._path, self.max_bytes, self.ttl))
+
+    @property
+    def path(self):
+        """ Directory of the cache (default: cache in the openalea home) """
+        if self._path is None:
+            from openalea.core.settings import get_openalea_home_dir
+            self._path = os.path.join(get_openalea_home_dir(), 'cache')
+        if not os.path.isdir(self._path):
+            os.makedirs(self._path, exist_ok=True)
+        return self._path
+
+    def reset_stats(self):
+        """ Reset the statistics """
+        with self._lock:
+            self.nbytes = None
+            self.hits = 0
+            self.misses = 0
+            self.skipped = 0
+            self.evictions = 0
+
+    def clear(self):
+        """ Remove all the entries and reset the statistics """
+        self.reset_stats()
+        if self._path is not None and os.path.isdir(self._path):
+            for filename, st in self.entries():
+                self._remove(filename)
+
+    def entries(self):
+        """ Iterate on the (filename, stat) of the entries """
+        for sub in os.scandir(self.path):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(self.suffix):
+                    try:
+                        yield entry.path, entry.stat()
+                    except OSError:
+                        pass
+
+    def __len__(self):
+        return sum(1 for entry in self.entries())
+
+    def filename(self, key):
+        return os.path.join(self.path, key[:2], key + self.suffix)
+
+    def __contains__(self, key):
+        return os.path.exists(self.filename(key))
+
+    def _remove(self, filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+    def get(self, key, default=None):
+        """ Return the value of key and mark it as recently used """
+        filename = self.filename(key)
+        value = default
+        try:
+            with open(filename, 'rb') as f:
+                created, data = pickle.load(f)
+        except Exception:
+            pass
+        else:
+            if self.ttl is not None and time.time() - created > self.ttl:
+                self._remove(filename)
+            else:
+                value = data
+                try:
+                    # mark as used, keeping the creation time
+                    os.utime(filename, (time.time(), created))
+                except OSError:
+                    pass
+
+        with self._lock:
+            if value is default:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """ Store value for key and evict the least recently used entries """
+        filename = self.filename(key)
+        dirname = os.path.dirname(filename)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname, exist_ok=True)
+        created = time.time()
+        try:
+            data = pickle.dumps((created, value), pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        if len(data) > self.max_bytes:
+            return
+
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.utime(tmp, (created, created))
+            os.replace(tmp, filename)
+        except OSError:
+            self._remove(tmp)
+            return
+
+        with self._lock:
+            if self.nbytes is not None:
+                self.nbytes += len(data)
+        if self.nbytes is None or self.nbytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove the expired entries and the least recently used ones until
+        the size of the cache is below max_bytes.
+        """
+        now = time.time()
+        entries = []
+        nbytes = 0
+        for filename, st in self.entries():
+            if self.ttl is not None and now - st.st_mtime > self.ttl:
+                self._remove(filename)
+                continue
+            entries.append((st.st_atime, st.st_size, filename))
+            nbytes += st.st_size
+
+        evictions = 0
+        if nbytes > self.max_bytes:
+            # remove a bit more to not scan the directory at each put
+            limit = 0.9 * self.max_bytes
+            entries.sort()
+            for atime, size, filename in entries:
+                if nbytes <= limit:
+                    break
+                self._remove(filename)
+                nbytes -= size
+                evictions += 1
+
+        with self._lock:
+            self.nbytes = nbytes
+            self.evictions += evictions
+
+    def key(self, node):
+        """
+        Return the digest of the factory id, the factory source and the
+        inputs of the node, or None.
+        """
+        factory = getattr(node, 'factory', None)
+        if factory is None:
+            return None
+        src = self.source_digest(factory)
+        if src is None:
+            return None
+        inputs = fingerprint(node.inputs)
+        if inputs is None:
+            return None
+
+        h = hashlib.sha1()
+        for part in factory_id(node) + (src, inputs):
+            h.update(part.encode('utf-8'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def source_digest(self, factory):
+        """
+        Return a digest of the source of factory, or None. The digest is
+        computed again when the source or the module file change.
+        """
+        memo = self._sources.get(factory)
+        if memo is not None and memo[0] == _source_token(factory):
+            return memo[1]
+
+        try:
+            src = factory.get_node_src()
+        except Exception:
+            src = None
+        sha = hashlib.sha1(src.encode('utf-8')).hexdigest() if src else None
+        # the module path is known once the source has been read
+        self._sources[factory] = (_source_token(factory), sha)
+        return sha
+
+    def stats(self):
+        """ Return the statistics of the cache as a dict """
+        if self.nbytes is None:
+            self.evict()
+        with self._lock:
+            calls = self.hits + self.misses
+            return dict(hits=self.hits,
+                        misses=self.misses,
+                        skipped=self.skipped,
+                        evictions=self.evictions,
+                        nbytes=self.nbytes,
+                        hit_rate=float(self.hits) / calls if calls else 0.,
+                        )
+
+    def __repr__(self):
+        return '%s(%r, max_bytes=%d, ttl=%r)' % (
+            self.__class__.__name__, self._path, self.max_bytes, self.ttl)
+
+
+# Cache shared by the nodes created with cache=True
+output_cache = LRUCache()
+# Cache shared by the nodes created with cache='disk' (created on demand)
+disk_cache = None
+
+
+@contextmanager
+def bypass():
+    """ Evaluate the nodes of the current thread without cache """
+    previous = getattr(_state, 'bypass', False)
+    _state.bypass = True
+    try:
+        yield
+    finally:
+        _state.bypass = previous
+
+
+def get_output_cache(cache):
+    """
+    Return the cache to use for the cache option of a factory or a node:
+    None or False (no cache), True (shared cache), 'disk' (shared disk
+    cache) or a cache instance.
+    """
+    global disk_cache
+    if cache is None or cache is False or getattr(_state, 'bypass', False):
+        return None
+    elif cache is True:
+        return output_cache
+    elif cache == 'disk':
+        if disk_cache is None:
+            disk_cache = DiskCache()
+        return disk_cache
+    return cache
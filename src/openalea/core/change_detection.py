@@ -0,0 +1,228 @@
+# -*- python -*-
+#
+#       OpenAlea.Core
+#
+#       Copyright 2006-2009 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Change detection strategies for the inputs of lazy nodes.
+
+A lazy node is evaluated again only when one of its inputs has changed.
+The strategy deciding whether a new value is a change is chosen for each
+input port, in this order:
+
+    - the 'change_detection' key of the port description,
+    - the __change_detection__ attribute of the port interface,
+    - the change_detection of the node (given to the NodeFactory),
+    - the default comparison.
+
+A strategy is the name of a registered strategy ('default', 'identity',
+'version', 'hash' or 'array'), a ChangeDetection class or instance.
+
+    >>> NodeFactory(..., change_detection='hash')
+    >>> inputs = (dict(name='points', change_detection='array'),)
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import copy
+import hashlib
+import pickle
+import sys
+
+
+class ChangeDetection(object):
+    """
+    Default strategy: the values are compared with < and >.
+
+    Values which can not be compared are always considered as changed.
+    """
+
+    def changed(self, old, new):
+        """ Return True if new must replace old as input value """
+        if old is None or new is None:
+            return True
+        try:
+            return bool((old > new) - (old < new) != 0)
+        except Exception:
+            return True
+
+    def reset(self):
+        """ Forget the values seen so far """
+        pass
+
+    def copy(self):
+        """ Return a new detector with the same settings """
+        other = copy.copy(self)
+        other.reset()
+        return other
+
+    def __repr__(self):
+        return self.__class__.__name__ + '()'
+
+
+class Identity(ChangeDetection):
+    """
+    A value is changed if it is another object.
+
+    Objects modified in place are not detected.
+    """
+
+    def changed(self, old, new):
+        return old is not new
+
+
+class Version(ChangeDetection):
+    """
+    A value is changed if it is another object or if its version counter
+    has changed since it was set.
+
+    The counter is read on the attribute `attribute` of the values (it is
+    called if it is a method). Values without counter are compared by
+    identity.
+    """
+
+    def __init__(self, attribute='version'):
+        self.attribute = attribute
+        self.reset()
+
+    def reset(self):
+        self._value = None
+        self._version = None
+
+    def version(self, value):
+        """ Return the version counter of value or None """
+        version = getattr(value, self.attribute, None)
+        if callable(version):
+            version = version()
+        return version
+
+    def changed(self, old, new):
+        version = self.version(new)
+        changed = (old is not new or old is not self._value or
+                   version != self._version)
+        self._value, self._version = new, version
+        return changed
+
+    def __getstate__(self):
+        return dict(attribute=self.attribute)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.reset()
+
+    def __repr__(self):
+        return 'Version(%r)' % self.attribute
+
+
+def digest(value):
+    """
+    Return a digest of the content of value, or None if it can not be
+    computed.
+    """
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(value, numpy.ndarray):
+        if not value.dtype.hasobject:
+            h = hashlib.sha1(repr((value.dtype.str, value.shape)).encode())
+            h.update(numpy.ascontiguousarray(value).tobytes())
+            return h.digest()
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        return hashlib.sha1(value).digest()
+    try:
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return None
+    return hashlib.sha1(data).digest()
+
+
+class Hash(ChangeDetection):
+    """
+    A value is changed if its content digest differs.
+
+    The digest of the current value is kept, so each new value is hashed
+    only once. Values which can not be hashed are always changed.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._value = None
+        self._digest = None
+
+    def changed(self, old, new):
+        if old is self._value:
+            old_digest = self._digest
+        else:
+            old_digest = digest(old)
+        new_digest = digest(new)
+        self._value, self._digest = new, new_digest
+        return new_digest is None or new_digest != old_digest
+
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self, state):
+        self.reset()
+
+
+class ArrayComparison(ChangeDetection):
+    """
+    Compare numpy arrays by shape, dtype and then by content.
+
+    Other values are compared with the default strategy.
+    """
+
+    def changed(self, old, new):
+        numpy = sys.modules.get('numpy')
+        if numpy is None or not (isinstance(old, numpy.ndarray) or
+                                 isinstance(new, numpy.ndarray)):
+            return ChangeDetection.changed(self, old, new)
+        if not (isinstance(old, numpy.ndarray) and
+                isinstance(new, numpy.ndarray)):
+            return True
+        if old is new:
+            # may have been modified in place
+            return True
+        if old.shape != new.shape or old.dtype != new.dtype:
+            return True
+        try:
+            return not numpy.array_equal(old, new)
+        except Exception:
+            return True
+
+
+strategies = {'default': ChangeDetection,
+              'identity': Identity,
+              'version': Version,
+              'hash': Hash,
+              'array': ArrayComparison,
+              }
+
+
+def get_change_detection(strategy=None):
+    """
+    Return a new ChangeDetection for strategy.
+
+    :param strategy: None (default strategy), a registered name, a
+        ChangeDetection class or instance.
+    """
+    if strategy is None:
+        return ChangeDetection()
+    elif isinstance(strategy, str):
+        try:
+            return strategies[strategy]()
+        except KeyError:
+            raise ValueError("Unknown change detection strategy %r (%s)"
+                             % (strategy, ', '.join(sorted(strategies))))
+    elif isinstance(strategy, ChangeDetection):
+        return strategy.copy()
+    else:
+        return strategy()
@@ -24,18 +24,22 @@ from __future__ import print_function
 __license__ = "Cecill-C"
 __revision__ = " $Id$ "
 
+import ast
 import string
 import pprint
 import copy
+import functools
 import importlib 
 
 from openalea.core.node import AbstractFactory, AbstractPort, Node
 from openalea.core.node import RecursionError
 from openalea.core.pkgmanager import PackageManager, protected, UnknownPackageError
 from openalea.core.package import UnknownNodeError
-from openalea.core.dataflow import DataFlow, InvalidEdge, PortError
-from openalea.core.settings import Settings
+from openalea.core.dataflow import DataFlow, CompactDataFlow
+from openalea.core.dataflow import InvalidEdge, PortError
 from openalea.core.metadatadict import MetaDataDict
+from openalea.core.observer import (notification_policy, COALESCED, SILENT,
+                                    batch)
 from . import logger
 
 quantify = False
@@ -54,6 +58,11 @@ class CompositeNodeFactory(AbstractFactory):
     Each node has an unique id : the element id (elt_id)
     """
 
+    # CompositeNodeTemplate used by instantiate_many (see template)
+    _template = None
+    # version of the elements, increased by the modifications (see modified)
+    elt_version = 0
+
     def __init__(self, *args, **kargs):
         """
         CompositeNodeFactory accept more optional parameters:
@@ -65,6 +74,7 @@ class CompositeNodeFactory(AbstractFactory):
         - elt_connections: map of ( dst_id , input_port ):(src_id,output_port)
         - elt_data: Dictionary containing associated data
         - elt_value: Dictionary containing Lists of 2-uples (port, value)
+          where value is the representation of the value or a StoredValue
         """
         # Init parent (name, description, category, doc, node, widget=None)
         AbstractFactory.__init__(self, *args, **kargs)
@@ -85,6 +95,8 @@ class CompositeNodeFactory(AbstractFactory):
         self.elt_ad_hoc = kargs.get("elt_ad_hoc", {})
         from openalea.core.algo.dataflow_evaluation import DefaultEvaluation
         self.eval_algo = kargs.get("eval_algo", DefaultEvaluation.__name__)
+        # instantiate CompactCompositeNode
+        self.compact = kargs.get("compact", False)
 
         # Documentation
         self.doc = kargs.get('doc', "")
@@ -96,12 +108,51 @@ class CompositeNodeFactory(AbstractFactory):
     def get_documentation(self):
         return self.__doc__
 
+    def __getstate__(self):
+        """ Pickle function : the template is not saved """
+        odict = AbstractFactory.__getstate__(self)
+        odict['_template'] = None
+        return odict
+
+    def serialized_values(self):
+        """ Return elt_value with the representation of the values """
+        return dict((vid, [_serialized(vs) for vs in values])
+                    for vid, values in self.elt_value.items())
+
     def clear(self):
         """todo"""
         self.elt_factory.clear()
         self.connections.clear()
         self.elt_data.clear()
         self.elt_value.clear()
+        self.modified()
+
+    def modified(self):
+        """ Increase the version of the elements of the factory: call it
+        after modifying the elt_* dictionaries in place """
+        self.elt_version += 1
+
+    def template(self):
+        """
+        Return the CompositeNodeTemplate of the factory.
+
+        It is kept until the package manager, the packages of the nodes or
+        the version of the elements of the factory (see modified) change.
+        """
+        template = self._template
+        if template is None or not template.is_valid():
+            template = self._template = CompositeNodeTemplate(self)
+        return template
+
+    def invalidate_template(self):
+        """ Forget the template of the factory """
+        self._template = None
+
+    def instantiate_many(self, n, compact=None):
+        """ Return a list of n CompositeNode instances created from the
+        template of the factory (see CompositeNodeTemplate) """
+        template = self.template()
+        return [template.instantiate(compact=compact) for i in range(n)]
 
     def copy(self, **args):
         """
@@ -133,76 +184,74 @@ class CompositeNodeFactory(AbstractFactory):
 
         return PyCNFactoryWriter(self)
 
-    def instantiate(self, call_stack=None):
+    def instantiate(self, call_stack=None, compact=None):
         """ Create a CompositeNode instance and allocate all elements
         This function overide default implementation of NodeFactory
 
         :param call_stack: the list of NodeFactory id already in recursion stack (in order to avoid infinite loop)
+        :param compact: create CompactCompositeNode instances, for this
+            composite and the nested ones (default to the compact attribute
+            of the factory)
 
         """
-
-        # Test for infinite loop
+        if compact is None:
+            compact = getattr(self, 'compact', False)
         if (not call_stack):
             call_stack = []
-        if (self.get_id() in call_stack):
-            raise RecursionError()
-
-        call_stack.append(self.get_id())
-
-        new_df = CompositeNode(self.inputs, self.outputs)
-        new_df.factory = self
-        new_df.__doc__ = self.doc
-        new_df.set_caption(self.get_id())
-        new_df.eval_algo = self.eval_algo
+        new_df = self.start_instance(call_stack, compact)
 
         cont_eval = set() # continuous evaluated nodes
 
         # Instantiate the node with each factory
         for vid in self.elt_factory:
             try:
-                node = self.instantiate_node(vid, call_stack)
-
-                # Manage continuous eval
-                if(node.user_application):
-                    cont_eval.add(vid)
-
+                node = self.instantiate_node(vid, call_stack, compact)
             except (UnknownNodeError, UnknownPackageError):
+                self.add_missing_node(new_df, vid)
+                continue
 
-                print("WARNING : The graph is not fully operational ")
-                (pkg, fact) = self.elt_factory[vid]
-                print("-> Cannot find '%s:%s'" % (pkg, fact))
-                node = self.create_fake_node(vid)
-                node.raise_exception = True
-                node.notify_listeners(('data_modified', None, None ))
+            # Manage continuous eval
+            if(node.user_application):
+                cont_eval.add(vid)
 
             new_df.add_node(node, vid, False)
 
         # Set IO internal data
-        try:
-            self.load_ad_hoc_data(new_df.node(new_df.id_in),
-                                  copy.deepcopy(self.elt_data["__in__"]),
-                                  copy.deepcopy(self.elt_ad_hoc.get("__in__", None)))
-            self.load_ad_hoc_data(new_df.node(new_df.id_out),
-                                  copy.deepcopy(self.elt_data["__out__"]),
-                                  copy.deepcopy(self.elt_ad_hoc.get("__out__", None)))
-        except:
-            pass
+        self.load_io_data(new_df, [
+            (io, copy.deepcopy(data), copy.deepcopy(ad_hoc))
+            for io, data, ad_hoc in self.io_items()])
 
-        # Create the connections
-        for eid, link in list(self.connections.items()):
-            (source_vid, source_port, target_vid, target_port) = link
+        self.connect_elements(new_df, self.connections.values())
+        self.finish_instance(new_df, call_stack, cont_eval)
+        return new_df
 
-            # Replace id for in and out nodes
-            if(source_vid == '__in__'):
-                source_vid = new_df.id_in
-            if(target_vid == '__out__'):
-                target_vid = new_df.id_out
+    def start_instance(self, call_stack, compact):
+        """
+        Return an empty CompositeNode with the properties of the factory
+        and push the factory on call_stack (see instantiate)
+        """
+        # Test for infinite loop
+        if (self.get_id() in call_stack):
+            raise RecursionError()
 
-            new_df.connect(source_vid, source_port, target_vid, target_port)
+        call_stack.append(self.get_id())
+
+        if compact:
+            new_df = CompactCompositeNode(self.inputs, self.outputs)
+        else:
+            new_df = CompositeNode(self.inputs, self.outputs)
+        new_df.factory = self
+        new_df.__doc__ = self.doc
+        new_df.set_caption(self.get_id())
+        new_df.eval_algo = self.eval_algo
+        return new_df
 
+    def finish_instance(self, new_df, call_stack, cont_eval):
+        """ Set the continuous evaluation of the cont_eval vertices and the
+        properties of new_df, and pop the factory from call_stack """
         # Set continuous evaluation
         for vid in cont_eval:
-             new_df.set_continuous_eval(vid, True)
+            new_df.set_continuous_eval(vid, True)
 
         # Set call stack to its original state
         call_stack.pop()
@@ -211,7 +260,47 @@ class CompositeNodeFactory(AbstractFactory):
         new_df.lazy = self.lazy
         new_df.graph_modified = False # Graph is not modifyied
 
-        return new_df
+    def add_missing_node(self, new_df, vid):
+        """ Add a fake node for the element vid whose factory is missing """
+        print("WARNING : The graph is not fully operational ")
+        (pkg, fact) = self.elt_factory[vid]
+        print("-> Cannot find '%s:%s'" % (pkg, fact))
+        node = self.create_fake_node(vid)
+        node.raise_exception = True
+        node.notify_listeners(('data_modified', None, None ))
+        new_df.add_node(node, vid, False)
+
+    def io_items(self):
+        """ Return the (in or out, data, ad hoc data) of the io nodes,
+        until a missing data """
+        items = []
+        for io in ("__in__", "__out__"):
+            if io not in self.elt_data:
+                break
+            items.append((io, self.elt_data[io],
+                          self.elt_ad_hoc.get(io, None)))
+        return items
+
+    def load_io_data(self, new_df, items):
+        """ Set the data of the io nodes of new_df from the (in or out,
+        data, ad hoc data) items """
+        try:
+            for io, data, ad_hoc in items:
+                vid = new_df.id_in if io == "__in__" else new_df.id_out
+                self.load_ad_hoc_data(new_df.node(vid), data, ad_hoc)
+        except:
+            pass
+
+    def connect_elements(self, new_df, connections):
+        """ Create the connections between the nodes of new_df """
+        for (source_vid, source_port, target_vid, target_port) in connections:
+            # Replace id for in and out nodes
+            if(source_vid == '__in__'):
+                source_vid = new_df.id_in
+            if(target_vid == '__out__'):
+                target_vid = new_df.id_out
+
+            new_df.connect(source_vid, source_port, target_vid, target_port)
 
     def create_fake_node(self, vid):
         """ Return an empty node with the correct number of inputs
@@ -235,8 +324,8 @@ class CompositeNodeFactory(AbstractFactory):
         ad_hoc     = copy.deepcopy(self.elt_ad_hoc.get(vid, None))
         self.load_ad_hoc_data(node, attributes, ad_hoc)
 
-        # copy node input data if any
-        values = copy.deepcopy(self.elt_value.get(vid, ()))
+        # node input data if any
+        values = self.elt_value.get(vid, ())
 
         for p in range(ins+1):
             port = node.add_input(name="In"+str(p))
@@ -251,7 +340,7 @@ class CompositeNodeFactory(AbstractFactory):
                 #beyond that are extensions added by gengraph:
                 #the ad_hoc_dict representation is third.
                 port, v = vs[:2]
-                node.set_input(port, eval(v))
+                node.set_input(port, stored_value(v).get())
                 if(len(vs)>2):
                     d = MetaDataDict(vs[2])
                     node.input_desc[port].get_ad_hoc_dict().update(d)
@@ -277,35 +366,37 @@ class CompositeNodeFactory(AbstractFactory):
         # map to convert id
         idmap = {}
 
-        # Instantiate the node with each factory
-        for vid in self.elt_factory:
-            n = self.instantiate_node(vid, call_stack)
-
-            # Apply modifiers (if callable)
-            for (key, func) in data_modifiers:
-                try:
-                    if(callable(func)):
-                        if(meta):
-                            func(n)
+        # the events of cnode are sent at the end
+        with batch(cnode):
+            # Instantiate the node with each factory
+            for vid in self.elt_factory:
+                n = self.instantiate_node(vid, call_stack)
+
+                # Apply modifiers (if callable)
+                for (key, func) in data_modifiers:
+                    try:
+                        if(callable(func)):
+                            if(meta):
+                                func(n)
+                            else:
+                                n.internal_data[key] = func(n.internal_data[key])
                         else:
-                            n.internal_data[key] = func(n.internal_data[key])
-                    else:
-                        n.internal_data[key] = func
-                except:
-                    pass
+                            n.internal_data[key] = func
+                    except:
+                        pass
 
-            newid = cnode.add_node(n, None)
-            idmap[vid] = newid
+                newid = cnode.add_node(n, None)
+                idmap[vid] = newid
 
-        # Create the connections
-        for eid, link in list(self.connections.items()):
-            (source_vid, source_port, target_vid, target_port) = link
+            # Create the connections
+            for eid, link in list(self.connections.items()):
+                (source_vid, source_port, target_vid, target_port) = link
 
-            # convert id
-            source_vid = idmap[source_vid]
-            target_vid = idmap[target_vid]
+                # convert id
+                source_vid = idmap[source_vid]
+                target_vid = idmap[target_vid]
 
-            cnode.connect(source_vid, source_port, target_vid, target_port)
+                cnode.connect(source_vid, source_port, target_vid, target_port)
 
         return list(idmap.values())
 
@@ -337,13 +428,8 @@ class CompositeNodeFactory(AbstractFactory):
         node._init_internal_data(elt_data)
 #        node.internal_data.update(elt_data)
 
-    def instantiate_node(self, vid, call_stack=None):
-        """ Partial instantiation
-
-        instantiate only elt_id in CompositeNode
-
-        :param call_stack: a list of parent id (to avoid infinite recursion)
-        """
+    def get_node_factory(self, vid):
+        """ Return the factory of the element vid """
         (package_id, factory_id) = self.elt_factory[vid]
         pkgmanager = PackageManager()
         pkg = pkgmanager[package_id]
@@ -353,31 +439,57 @@ class CompositeNodeFactory(AbstractFactory):
             # Bug when both package_id and protected(package_id) exist
             pkg = pkgmanager[protected(package_id)]
             factory = pkg.get_factory(factory_id)
+        return factory
 
+    def instantiate_node(self, vid, call_stack=None, compact=False):
+        """ Partial instantiation
 
-        node = factory.instantiate(call_stack)
+        instantiate only elt_id in CompositeNode
 
-        attributes = copy.deepcopy(self.elt_data[vid])
-        ad_hoc     = copy.deepcopy(self.elt_ad_hoc.get(vid, None))
-        self.load_ad_hoc_data(node, attributes, ad_hoc)
+        :param call_stack: a list of parent id (to avoid infinite recursion)
+        :param compact: instantiate nested composite nodes as
+            CompactCompositeNode
+        """
+        factory = self.get_node_factory(vid)
 
-        # copy node input data if any
-        values = copy.deepcopy(self.elt_value.get(vid, ()))
+        if compact and factory.is_composite_node():
+            node = factory.instantiate(call_stack, compact=True)
+        else:
+            node = factory.instantiate(call_stack)
 
-        for vs in values:
+        self.set_node_data(node, copy.deepcopy(self.elt_data[vid]),
+                           copy.deepcopy(self.elt_ad_hoc.get(vid, None)),
+                           self.stored_inputs(vid))
+        return node
+
+    def stored_inputs(self, vid):
+        """ Return the (port, function returning the value) of the input
+        values stored for the element vid """
+        inputs = []
+        for vs in self.elt_value.get(vid, ()):
             try:
                 #the two first elements are the historical
                 #values : port Id and port value
                 #the values beyond are not used.
                 port, v = vs[:2]
-                node.set_input(port, eval(v))
+                inputs.append((port, stored_value(v).get))
+            except:
+                continue
+        return inputs
+
+    def set_node_data(self, node, data, ad_hoc, inputs):
+        """ Set the data, the ad hoc data and the stored_inputs of a node """
+        self.load_ad_hoc_data(node, data, ad_hoc)
+
+        # node input data if any
+        for port, value in inputs:
+            try:
+                node.set_input(port, value())
                 node.input_desc[port].get_ad_hoc_dict().set_metadata("hide",
                                                                      node.is_port_hidden(port))
             except:
                 continue
 
-        return node
-
     #########################################################
     # This shouldn't be here, it is related to visual stuff #
     #########################################################
@@ -401,6 +513,257 @@ class CompositeNodeFactory(AbstractFactory):
         return DisplayGraphWidget(node, parent, autonomous)
 
 
+_IMMUTABLE = (int, float, complex, bool, str, bytes, type(None))
+
+
+def _is_immutable(value):
+    if type(value) in _IMMUTABLE:
+        return True
+    if type(value) in (tuple, frozenset):
+        return all(_is_immutable(v) for v in value)
+    return False
+
+
+def _is_flat(value):
+    """ Return True if value is a list, set or dict of immutable values """
+    if type(value) is dict:
+        return (all(_is_immutable(k) for k in value) and
+                all(_is_immutable(v) for v in value.values()))
+    if type(value) in (list, set):
+        return all(_is_immutable(v) for v in value)
+    return False
+
+
+def _copy_dict(items):
+    return dict((k, v if immutable else type(v)(v))
+                for k, v, immutable in items)
+
+
+def _copier(value):
+    """ Return a function returning a deep copy of value, without
+    copy.deepcopy for the immutable and the usual internal data """
+    if _is_immutable(value):
+        return functools.partial(_identity, value)
+    if _is_flat(value):
+        return functools.partial(type(value), value)
+    if (type(value) is dict and all(_is_immutable(k) for k in value) and
+            all(_is_immutable(v) or _is_flat(v) for v in value.values())):
+        items = [(k, v, _is_immutable(v)) for k, v in value.items()]
+        return functools.partial(_copy_dict, items)
+    return functools.partial(copy.deepcopy, value)
+
+
+def _identity(value):
+    return value
+
+
+_LITERAL = (bool, int, str, bytes, type(None))
+
+
+def _is_literal(value, depth=0):
+    """ Return True if value is rebuilt by ast.literal_eval(repr(value)) """
+    if depth > 20:
+        return False
+    t = type(value)
+    if t is float:
+        return value - value == 0
+    if t is complex:
+        return _is_literal(value.real) and _is_literal(value.imag)
+    if t in _LITERAL:
+        return True
+    if t in (list, tuple, set):
+        return all(_is_literal(v, depth + 1) for v in value)
+    if t is dict:
+        return all(_is_literal(k, depth + 1) and _is_literal(v, depth + 1)
+                   for k, v in value.items())
+    return False
+
+
+class StoredValue(object):
+    """
+    Port value stored in the elt_value of a CompositeNodeFactory.
+
+    The value is parsed once and a copy is returned by get for each
+    instance. The representation of a value given by
+    CompositeNode.to_factory is computed when the factory is written.
+    """
+    __slots__ = ('_repr', 'get')
+
+    def __init__(self, value, text=None):
+        self._repr = text
+        self.get = _copier(value)
+
+    @classmethod
+    def from_value(cls, value):
+        """ Return a StoredValue of a literal value, or its representation
+        otherwise """
+        if _is_literal(value):
+            return cls(copy.deepcopy(value))
+        if "pyqt" in repr(value).lower():
+            value = str(value)
+        return repr(value)
+
+    def __str__(self):
+        if self._repr is None:
+            self._repr = repr(self.get())
+        return self._repr
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, str(self))
+
+    def __eq__(self, other):
+        if isinstance(other, (StoredValue, str)):
+            return str(self) == str(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __reduce__(self):
+        # saved as its representation, like the values read from a file
+        return (str, (str(self),))
+
+
+class StoredCode(StoredValue):
+    """ Value stored as a python expression, compiled once and evaluated
+    for each instance """
+    __slots__ = ()
+
+    def __init__(self, text):
+        self._repr = text
+        self.get = functools.partial(eval, compile(text, '<value>', 'eval'),
+                                     globals())
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_value(text):
+    """ Return the StoredValue of the representation of a value """
+    try:
+        value = ast.literal_eval(text)
+    except Exception:
+        return StoredCode(text)
+    return StoredValue(value, text)
+
+
+def stored_value(v):
+    """ Return the StoredValue of an element of elt_value """
+    if isinstance(v, StoredValue):
+        return v
+    return parse_value(v)
+
+
+def _serialized(vs):
+    """ Return the (port, value, ...) entry vs with the representation of
+    the value """
+    if len(vs) < 2 or not isinstance(vs[1], StoredValue):
+        return vs
+    return vs.__class__([vs[0], str(vs[1])] + list(vs[2:]))
+
+
+class CompositeNodeTemplate(object):
+    """
+    Prepared instantiation of a CompositeNodeFactory, to create many
+    instances of the same factory.
+
+    The factories of the nodes are resolved, the stored input values are
+    parsed and the copies of the node data prepared once. The instances
+    are then built with the SILENT notification policy.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.key = self.get_key()
+
+        pkgmanager = PackageManager()
+        packages = {}
+        # (vid, node factory or None, data copier, ad hoc copier, inputs)
+        self.nodes = []
+        for vid in factory.elt_factory:
+            try:
+                node_factory = factory.get_node_factory(vid)
+                package = node_factory.package
+            except (UnknownNodeError, UnknownPackageError):
+                node_factory = None
+                try:
+                    package = pkgmanager[factory.elt_factory[vid][0]]
+                except UnknownPackageError:
+                    package = None
+            if package is not None:
+                packages[id(package)] = package
+
+            self.nodes.append((vid, node_factory,
+                               _copier(factory.elt_data[vid]),
+                               _copier(factory.elt_ad_hoc.get(vid, None)),
+                               factory.stored_inputs(vid)))
+
+        self.packages = [(p, getattr(p, 'version', 0))
+                         for p in packages.values()]
+
+        # (in or out, data copier, ad hoc copier)
+        self.io = [(io, _copier(data), _copier(ad_hoc))
+                   for io, data, ad_hoc in factory.io_items()]
+
+        self.connections = list(factory.connections.values())
+
+    def get_key(self):
+        factory = self.factory
+        pkgs = PackageManager().pkgs
+        return ((id(pkgs), pkgs.version, factory.elt_version) +
+                tuple(id(d) for d in (
+                    factory.elt_factory, factory.connections,
+                    factory.elt_data, factory.elt_value, factory.elt_ad_hoc)))
+
+    def is_valid(self):
+        """ Return True if the template still describes its factory """
+        return (self.key == self.get_key() and
+                all(getattr(p, 'version', 0) == version
+                    for p, version in self.packages))
+
+    def instantiate(self, call_stack=None, compact=None):
+        """ Create a CompositeNode instance (see
+        CompositeNodeFactory.instantiate) """
+        factory = self.factory
+        if compact is None:
+            compact = getattr(factory, 'compact', False)
+        if (not call_stack):
+            call_stack = []
+
+        with notification_policy(SILENT):
+            new_df = factory.start_instance(call_stack, compact)
+
+            cont_eval = set() # continuous evaluated nodes
+
+            for vid, node_factory, data, ad_hoc, inputs in self.nodes:
+                if node_factory is None:
+                    factory.add_missing_node(new_df, vid)
+                    continue
+
+                if node_factory.is_composite_node():
+                    node = node_factory.template().instantiate(
+                        call_stack, True if compact else None)
+                else:
+                    node = node_factory.instantiate(call_stack)
+                factory.set_node_data(node, data(), ad_hoc(), inputs)
+
+                # Manage continuous eval
+                if(node.user_application):
+                    cont_eval.add(vid)
+
+                new_df.add_node(node, vid, False)
+
+            # Set IO internal data
+            factory.load_io_data(new_df, [(io, data(), ad_hoc())
+                                          for io, data, ad_hoc in self.io])
+
+            factory.connect_elements(new_df, self.connections)
+            factory.finish_instance(new_df, call_stack, cont_eval)
+        return new_df
+
+
 class CompositeNode(Node, DataFlow):
     """
     The CompositeNode is a container that interconnect
@@ -409,6 +772,11 @@ class CompositeNode(Node, DataFlow):
 
     mimetype = "openalea/compositenode"
 
+    # notification policy of the evaluations (see observer.FULL, COALESCED
+    # and SILENT), None to keep the policy of the caller.
+    # The policy of the evaluation algo has precedence.
+    notification_policy = None
+
     def __init__(self, inputs=(), outputs=()):
         """ Inputs and outputs are list of
         dict(name='', interface='', value='') """
@@ -422,6 +790,14 @@ class CompositeNode(Node, DataFlow):
         self.graph_modified = False
         self.evaluating = False
         self.eval_algo = None
+        # (eval_algo, evaluator) reused between evaluations
+        self._evaluator = None
+
+    def __getstate__(self):
+        """ Pickle function : the evaluator is not saved """
+        odict = Node.__getstate__(self)
+        odict['_evaluator'] = None
+        return odict
 
     def copy_to(self, other):
         raise NotImplementedError
@@ -457,30 +833,32 @@ class CompositeNode(Node, DataFlow):
         Inputs and outputs are list of dict(name='', interface='', value='')
         """
 
-        # I/O ports
-        # Remove node if nb of input has changed
-        if(self.id_in is not None
-           and len(inputs) != self.node(self.id_in).get_nb_output()):
-            self.remove_node(self.id_in)
-            self.id_in = None
-
-        if(self.id_out is not None
-           and len(outputs) != self.node(self.id_out).get_nb_input()):
-            self.remove_node(self.id_out)
-            self.id_out = None
-
-        # Create new io node if necessary
-        if(self.id_in is None):
-            self.id_in = self.add_node(CompositeNodeInput(inputs))
-        else:
-            self.node(self.id_in).set_io((), inputs)
+        # the events are sent at the end
+        with batch(self):
+            # I/O ports
+            # Remove node if nb of input has changed
+            if(self.id_in is not None
+               and len(inputs) != self.node(self.id_in).get_nb_output()):
+                self.remove_node(self.id_in)
+                self.id_in = None
+
+            if(self.id_out is not None
+               and len(outputs) != self.node(self.id_out).get_nb_input()):
+                self.remove_node(self.id_out)
+                self.id_out = None
+
+            # Create new io node if necessary
+            if(self.id_in is None):
+                self.id_in = self.add_node(CompositeNodeInput(inputs))
+            else:
+                self.node(self.id_in).set_io((), inputs)
 
-        if(self.id_out is None):
-            self.id_out = self.add_node(CompositeNodeOutput(outputs))
-        else:
-            self.node(self.id_out).set_io(outputs, ())
+            if(self.id_out is None):
+                self.id_out = self.add_node(CompositeNodeOutput(outputs))
+            else:
+                self.node(self.id_out).set_io(outputs, ())
 
-        Node.set_io(self, inputs, outputs)
+            Node.set_io(self, inputs, outputs)
 
     def set_input(self, index_key, val=None, *args):
         """ Copy val into input node output ports """
@@ -501,7 +879,22 @@ class CompositeNode(Node, DataFlow):
         return self.node(self.id_out).set_output(index_key, val)
 
     def get_eval_algo(self):
-        """ Return the evaluation algo instance """
+        """
+        Return the evaluation algo instance.
+
+        The instance is kept while eval_algo is not modified, so that the
+        evaluation plan it computes is reused between evaluations.
+        """
+        evaluator = self.__dict__.get('_evaluator')
+        if evaluator is not None and evaluator[0] == self.eval_algo:
+            return evaluator[1]
+
+        algo = self.create_eval_algo()
+        self._evaluator = (self.eval_algo, algo)
+        return algo
+
+    def create_eval_algo(self):
+        """ Return a new instance of the evaluation algo """
         try:
             algo_str = self.eval_algo
 
@@ -535,16 +928,35 @@ class CompositeNode(Node, DataFlow):
         if(vtx_id != None):
             self.node(vtx_id).modified = True
         algo = self.get_eval_algo()
+        policy = (getattr(algo, 'notification_policy', None) or
+                  self.notification_policy)
+        skipped = None
 
         try:
             self.evaluating = True
-            algo.eval(vtx_id,step=step)
+            if policy is None:
+                algo.eval(vtx_id,step=step)
+            else:
+                with notification_policy(policy) as skipped:
+                    algo.eval(vtx_id,step=step)
         finally:
             self.evaluating = False
+            if policy == COALESCED and skipped is not None:
+                self.notify_evaluation_summary(skipped)
         t1 = time.time()
         if quantify:
             logger.info('Evaluation time: %s'%(t1-t0))
             print('Evaluation time: %s'%(t1-t0))
+
+    def notify_evaluation_summary(self, skipped):
+        """
+        Send the event ("evaluation_summary", vids) with the vertices whose
+        events were skipped by a COALESCED evaluation.
+        """
+        vids = [vid for vid in self.vertices()
+                if id(self.actor(vid)) in skipped]
+        self.notify_listeners(("evaluation_summary", vids))
+
     # Functions used by the node evaluator
 
     def eval(self, *args, **kwds):
@@ -837,11 +1249,10 @@ class CompositeNode(Node, DataFlow):
             sgfactory.elt_value[vid] = []
             for port in range(node.get_nb_input()):
                 if node.input_states[port] != "connected":
-                    val = node.get_input(port)
-                    if "pyqt" in repr(val).lower():
-                        val = str(val)
-                    sgfactory.elt_value[vid].append((port, repr(val)))
+                    val = StoredValue.from_value(node.get_input(port))
+                    sgfactory.elt_value[vid].append((port, val))
 
+        sgfactory.modified()
         self.graph_modified = False
 
         # Set node factory if all node have been exported
@@ -911,12 +1322,23 @@ class CompositeNode(Node, DataFlow):
         node = self.node(vtx_id)
         if vtx_id == self.id_in : self.id_in = None
         elif vtx_id == self.id_out : self.id_out = None
-        self.remove_vertex(vtx_id)
-        node.close()
-        self.notify_vertex_removal(node)
-        self.notify_listeners(("graph_modified", ))
+        # the events of the removed edges are sent with the node ones
+        with batch(self):
+            self.remove_vertex(vtx_id)
+            node.close()
+            self.notify_vertex_removal(node)
+            self.notify_listeners(("graph_modified", ))
         self.graph_modified = True
 
+    def remove_nodes(self, vtx_ids):
+        """
+        remove several nodes from the graph, sending the events at the end
+        :param vtx_ids: element ids
+        """
+        with batch(self):
+            for vid in list(vtx_ids):
+                self.remove_node(vid)
+
     def remove_edge(self, eid):
         # target = self.target(eid)
         target_port = self._edge_property['_target_port'][eid]
@@ -1079,6 +1501,14 @@ class CompositeNode(Node, DataFlow):
                 listeners = dst_node.continuous_eval.listeners
                 src_node.continuous_eval.listeners.update(listeners)
 
+class CompactCompositeNode(CompositeNode, CompactDataFlow):
+    """
+    CompositeNode whose graph is stored in flat arrays (see
+    graph.compact_graph), to keep many large composite nodes in memory.
+    """
+    pass
+
+
 from openalea.core.observer import AbstractListener
 
 
@@ -1201,7 +1631,7 @@ $NAME = CompositeNodeFactory(name=$PNAME,
                                       ELT_FACTORY=self.pprint_repr(f.elt_factory),
                                       ELT_CONNECTIONS=self.pprint_repr(f.connections),
                                       ELT_DATA=self.pprint_repr(f.elt_data),
-                                      ELT_VALUE=self.pprint_repr(f.elt_value),
+                                      ELT_VALUE=self.pprint_repr(f.serialized_values()),
                                       ELT_AD_HOC=self.pprint_repr(f.elt_ad_hoc),
                                       LAZY=self.pprint_repr(f.lazy),
                                       EVALALGO=self.pprint_repr(f.eval_algo),
@@ -1233,7 +1663,7 @@ class JSONCNFactoryWriter(PyCNFactoryWriter):
                  #elt_factory=f.elt_factory,
                  elt_connections=list(f.connections.values()),
                  #elt_data=f.elt_data,
-                 #elt_value=f.elt_value,
+                 #elt_value=f.serialized_values(),
                  elt_ad_hoc=f.elt_ad_hoc,
                  lazy=f.lazy,
                  eval_algo=f.eval_algo,
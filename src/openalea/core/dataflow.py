@@ -23,6 +23,7 @@ __revision__ = " $Id$ "
 from openalea.core.graph.property_graph import PropertyGraph, InvalidVertex
 from openalea.core.graph.property_graph import InvalidEdge
 from openalea.core.graph.id_generator import IdGenerator
+from openalea.core.graph.compact_graph import CompactPropertyGraph
 from collections import deque
 
 
@@ -36,12 +37,24 @@ class Port (object):
     a port is an entry point to a vertex
     """
 
+    __slots__ = ('_vid', '_local_pid', '_is_out_port')
+
     def __init__(self, vid, local_pid, is_out_port):
         #internal data to access from dataflow
         self._vid = vid
         self._local_pid = local_pid
         self._is_out_port = is_out_port
 
+    def __getstate__(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            # (dict, slots) state
+            state = dict(state[0] or {}, **(state[1] or {}))
+        for name, value in state.items():
+            setattr(self, name, value)
+
 
 class DataFlow(PropertyGraph):
     """
@@ -51,9 +64,15 @@ class DataFlow(PropertyGraph):
     """
 
     def __init__(self):
-        PropertyGraph.__init__(self)
+        super(DataFlow, self).__init__()
         self._ports = {}
         self._pid_generator = IdGenerator()
+        # indexes of the ports
+        # pid -> eid of the edge connected to the port, or {eid: None}
+        # (ordered set) if several edges are connected
+        self._port_edges = {}
+        # (vid, local_pid, is_out_port) -> pid
+        self._local_ports = {}
 
         self.add_edge_property("_source_port")
         self.add_edge_property("_target_port")
@@ -61,6 +80,23 @@ class DataFlow(PropertyGraph):
         self.add_vertex_property("_ports")
         self.add_vertex_property("_actor")
 
+        # incremented each time the structure of the dataflow changes
+        self._topology_version = 0
+
+    def topology_version(self):
+        """
+        Return a counter incremented each time vertices, ports, edges
+        or actors are added or removed.
+        """
+        return self._topology_version
+
+    def topology_modified(self):
+        """
+        Signal a modification of the structure of the dataflow
+        (invalidate the evaluation plans computed on it).
+        """
+        self._topology_version += 1
+
     ####################################################
     #
     #        edge port view
@@ -180,15 +216,12 @@ class DataFlow(PropertyGraph):
         to this port
         :rtype: iter of eid
         """
-        vid = self.vertex(pid)
-        if self.is_out_port(pid):
-            for eid in self.out_edges(vid):
-                if self.source_port(eid)==pid:
-                    yield eid
-        else:
-            for eid in self.in_edges(vid):
-                if self.target_port(eid)==pid:
-                    yield eid
+        if pid not in self._ports:
+            raise KeyError(pid)
+        edges = self._port_edges.get(pid, ())
+        if type(edges) is not dict and edges != ():
+            return iter((edges,))
+        return iter(tuple(edges))
 
     def nb_connections(self, pid):
         """ Compute number of edges connected to a given port.
@@ -199,7 +232,10 @@ class DataFlow(PropertyGraph):
         return:
             - int
         """
-        return len(tuple(self.connected_edges(pid)))
+        edges = self._port_edges.get(pid, ())
+        if type(edges) is not dict and edges != ():
+            return 1
+        return len(edges)
 
     ####################################################
     #
@@ -231,20 +267,20 @@ class DataFlow(PropertyGraph):
         global port id of a given port
         :rtype: pid
         """
-        for pid in self.out_ports(vid):
-            if self._ports[pid]._local_pid == local_pid:
-                return pid
-        raise PortError("Local pid '%s' does not exist" % str(local_pid))
+        try:
+            return self._local_ports[(vid, local_pid, True)]
+        except (KeyError, TypeError):
+            raise PortError("Local pid '%s' does not exist" % str(local_pid))
 
     def in_port(self, vid, local_pid):
         """
         global port id of a given port
         :rtype: pid
         """
-        for pid in self.in_ports(vid):
-            if self._ports[pid]._local_pid == local_pid:
-                return pid
-        raise PortError("local pid '%s' does not exist for vertex %d" % (str(local_pid),vid) )
+        try:
+            return self._local_ports[(vid, local_pid, False)]
+        except (KeyError, TypeError):
+            raise PortError("local pid '%s' does not exist for vertex %d" % (str(local_pid),vid) )
 
     #####################################################
     #
@@ -259,6 +295,7 @@ class DataFlow(PropertyGraph):
         try : actor.set_id(vid)
         except Exception as e: print(e)
         self.vertex_property("_actor")[vid] = actor
+        self._topology_version += 1
 
     def actor(self, vid):
         """
@@ -301,6 +338,8 @@ class DataFlow(PropertyGraph):
         pid = self._pid_generator.get_id(pid)
         self._ports[pid] = Port(vid, local_pid, False)
         self.vertex_property("_ports")[vid].add(pid)
+        self._index_port(pid, vid, local_pid, False)
+        self._topology_version += 1
         return pid
 
     def add_out_port(self, vid, local_pid, pid=None):
@@ -316,8 +355,36 @@ class DataFlow(PropertyGraph):
         pid = self._pid_generator.get_id(pid)
         self._ports[pid] = Port(vid, local_pid, True)
         self.vertex_property("_ports")[vid].add(pid)
+        self._index_port(pid, vid, local_pid, True)
+        self._topology_version += 1
         return pid
 
+    def _index_port(self, pid, vid, local_pid, is_out_port):
+        """ Add a new port to the indexes """
+        try:
+            self._local_ports.setdefault((vid, local_pid, is_out_port), pid)
+        except TypeError:
+            # unhashable local pid, only found by its global pid
+            pass
+
+    def _link_port(self, pid, eid):
+        """ Add eid to the edges connected to pid """
+        edges = self._port_edges.get(pid)
+        if edges is None:
+            self._port_edges[pid] = eid
+        elif type(edges) is dict:
+            edges[eid] = None
+        else:
+            self._port_edges[pid] = {edges: None, eid: None}
+
+    def _unlink_port(self, pid, eid):
+        """ Remove eid from the edges connected to pid """
+        edges = self._port_edges.get(pid)
+        if type(edges) is dict:
+            edges.pop(eid, None)
+        elif edges == eid:
+            del self._port_edges[pid]
+
     def remove_port(self, pid):
         """
         remove the specified port
@@ -325,9 +392,25 @@ class DataFlow(PropertyGraph):
         """
         for eid in list(self.connected_edges(pid)):
             self.remove_edge(eid)
-        self.vertex_property("_ports")[self.vertex(pid)].remove(pid)
+        port = self._ports[pid]
+        self.vertex_property("_ports")[port._vid].remove(pid)
         self._pid_generator.release_id(pid)
         del self._ports[pid]
+        self._port_edges.pop(pid, None)
+        key = (port._vid, port._local_pid, port._is_out_port)
+        try:
+            if self._local_ports.get(key) == pid:
+                del self._local_ports[key]
+                # another port with the same local pid
+                for other in self.ports(port._vid):
+                    p = self._ports[other]
+                    if (p._local_pid == port._local_pid and
+                            p._is_out_port == port._is_out_port):
+                        self._local_ports[key] = other
+                        break
+        except TypeError:
+            pass
+        self._topology_version += 1
 
     def connect(self, source_pid, target_pid, eid=None):
         """
@@ -351,13 +434,52 @@ class DataFlow(PropertyGraph):
             self.vertex(target_pid)), eid)
         self.edge_property("_source_port")[eid] = source_pid
         self.edge_property("_target_port")[eid] = target_pid
+        self._link_port(source_pid, eid)
+        self._link_port(target_pid, eid)
+        self._topology_version += 1
 
         return eid
 
+    def remove_edge(self, eid):
+        """todo"""
+        source_pid = self.edge_property("_source_port").get(eid)
+        target_pid = self.edge_property("_target_port").get(eid)
+        super(DataFlow, self).remove_edge(eid)
+        for pid in (source_pid, target_pid):
+            if pid is not None:
+                self._unlink_port(pid, eid)
+        self._topology_version += 1
+
+    remove_edge.__doc__ = PropertyGraph.remove_edge.__doc__
+
+    def clear_edges(self):
+        """todo"""
+        super(DataFlow, self).clear_edges()
+        self._port_edges.clear()
+        self._topology_version += 1
+
+    clear_edges.__doc__ = PropertyGraph.clear_edges.__doc__
+
+    def extend(self, graph):
+        """todo"""
+        trans_vid, trans_eid = super(DataFlow, self).extend(graph)
+        # the edges are added without connect: index their ports
+        for name in ("_source_port", "_target_port"):
+            prop = self.edge_property(name)
+            for eid in trans_eid.values():
+                pid = prop.get(eid)
+                if pid is not None:
+                    self._link_port(pid, eid)
+        self._topology_version += 1
+        return trans_vid, trans_eid
+
+    extend.__doc__ = PropertyGraph.extend.__doc__
+
     def add_vertex(self, vid=None):
         """todo"""
-        vid = PropertyGraph.add_vertex(self, vid)
+        vid = super(DataFlow, self).add_vertex(vid)
         self.vertex_property("_ports")[vid] = set()
+        self._topology_version += 1
         return vid
 
     add_vertex.__doc__ = PropertyGraph.add_vertex.__doc__
@@ -369,15 +491,19 @@ class DataFlow(PropertyGraph):
                 self.remove_port(pid)
             except:
                 pass
-        PropertyGraph.remove_vertex(self, vid)
+        super(DataFlow, self).remove_vertex(vid)
+        self._topology_version += 1
 
     remove_vertex.__doc__ = PropertyGraph.remove_vertex.__doc__
 
     def clear(self):
         """todo"""
         self._ports.clear()
+        self._port_edges.clear()
+        self._local_ports.clear()
         self._pid_generator = IdGenerator()
-        PropertyGraph.clear(self)
+        super(DataFlow, self).clear()
+        self._topology_version += 1
 
     clear.__doc__ = PropertyGraph.clear.__doc__
 
@@ -409,6 +535,15 @@ class DataFlow(PropertyGraph):
                         scan_list.append(nvid)
 
 
+class CompactDataFlow(DataFlow, CompactPropertyGraph):
+    """
+    DataFlow stored in flat arrays (see graph.compact_graph), for large or
+    numerous dataflows kept in memory.
+    """
+
+    property_typecodes = {"_source_port": 'l', "_target_port": 'l'}
+
+
 class SubDataflow(object):
     """ Represents a part of a dataflow for a partial evaluation
     A SubDataflow is a callable and absracts a part of a dataflow as a funtion
@@ -440,5 +575,3 @@ class SubDataflow(object):
         self.algo.eval(self.node_id, list(args),is_subdataflow=True )
         ret = self.dataflow.actor(self.node_id).get_output(self.port_index)
         return ret
-
-
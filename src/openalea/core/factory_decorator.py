@@ -5,11 +5,22 @@ Decorators to attach signature information to functions
 import sys
 
 
-def factory(f):
+def factory(f=None, cache=False):
     '''
     Flag the given function `f` as an openalea factory.
+
+    :param cache: memoize the outputs of the nodes (pure function)
+
+    Example:
+       >>> @factory(cache=True)
+       ... def fct(x):
+       ...     return 2 * x
     '''
+    if f is None:
+        return lambda f: factory(f, cache=cache)
     f.__factory__ = True
+    if cache:
+        f.__cache__ = cache
     mod = sys.modules[f.__module__]
     if not hasattr(mod, '__factories__'):
         mod.__factories__ = [f]
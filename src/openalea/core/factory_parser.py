@@ -80,7 +80,8 @@ def add_factory(pkg, fct, base_dir=None):
     base_dir = [base_dir] if base_dir else None
     
     fac = Factory(s.name, description=s.get_doc(), inputs=s.parameters, outputs=None,
-                  nodemodule=fct.__module__, nodeclass=s.name, search_path=base_dir, authors=pkg.metainfo.get('authors',None))
+                  nodemodule=fct.__module__, nodeclass=s.name, search_path=base_dir, authors=pkg.metainfo.get('authors',None),
+                  cache=getattr(fct, '__cache__', False))
         ##, category='', widgetmodule=None, widgetclass=None, **kargs
 
     pkg[s.name] = fac
@@ -0,0 +1,356 @@
+# -*- python -*-
+#
+#       OpenAlea.Core
+#
+#       Copyright 2006-2009 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Compact implementation of the graph interfaces for large graphs.
+
+Vertices and edges are indexed by their ids in flat arrays instead of
+dictionaries of tuples and sets:
+
+    - the source and target of the edges are two integer arrays,
+    - the in and out edges of the vertices are computed on demand in a
+      compressed (CSR) adjacency, rebuilt after edges have been added,
+    - the properties are columns indexed by the ids (typed arrays for
+      integer properties).
+
+Adding edges is O(1), the first adjacency query after a modification is
+O(V + E). Removing edges keeps the adjacency valid.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from array import array
+from collections.abc import MutableMapping
+
+from .interface.graph import InvalidEdge, InvalidVertex
+from .graph import Graph
+from .property_graph import PropertyGraph
+from .id_generator import IdGenerator
+
+# id of the source and target of removed edges
+_NONE = -1
+
+
+def _grow(size, index):
+    """ New size of an array to store index (over allocated) """
+    return max(index + 1, size + (size >> 3) + 16)
+
+
+class Column(MutableMapping):
+    """
+    Mapping from element ids (non negative integers) to property values.
+
+    Values are stored in a list or, if typecode is given, in a typed
+    array (see the array module).
+    """
+
+    def __init__(self, typecode=None, values=()):
+        self.typecode = typecode
+        self._values = array(typecode) if typecode else []
+        self._present = bytearray()
+        self._len = 0
+        self.update(values)
+
+    def _index(self, key):
+        if not isinstance(key, int):
+            raise KeyError(key)
+        if key < 0 or key >= len(self._present) or not self._present[key]:
+            raise KeyError(key)
+        return key
+
+    def __getitem__(self, key):
+        return self._values[self._index(key)]
+
+    def __setitem__(self, key, value):
+        if not isinstance(key, int) or key < 0:
+            raise TypeError("ids must be non negative integers: %r" % (key,))
+        size = len(self._present)
+        if key >= size:
+            grow = _grow(size, key) - size
+            self._present.extend(bytes(grow))
+            if self.typecode:
+                self._values.extend(array(self.typecode, bytes(
+                    grow * self._values.itemsize)))
+            else:
+                self._values.extend([None] * grow)
+        self._values[key] = value
+        if not self._present[key]:
+            self._present[key] = 1
+            self._len += 1
+
+    def __delitem__(self, key):
+        key = self._index(key)
+        self._present[key] = 0
+        if not self.typecode:
+            self._values[key] = None
+        self._len -= 1
+
+    def __iter__(self):
+        present = self._present
+        return (i for i in range(len(present)) if present[i])
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, key):
+        try:
+            self._index(key)
+        except KeyError:
+            return False
+        return True
+
+    def clear(self):
+        self._values = array(self.typecode) if self.typecode else []
+        self._present = bytearray()
+        self._len = 0
+
+    def copy(self):
+        return Column(self.typecode, self.items())
+
+    def __repr__(self):
+        return 'Column(%r, %r)' % (self.typecode, dict(self.items()))
+
+
+class CompactGraph(Graph):
+    """
+    Directed graph with multiple links stored in flat arrays.
+
+    Same interface and id semantics as Graph.
+    """
+
+    def __init__(self, graph=None):
+        self._alive = bytearray()
+        self._nb_vertices = 0
+        self._source = array('l')
+        self._target = array('l')
+        self._nb_edges = 0
+        self._adjacency = None
+        self._vid_generator = IdGenerator()
+        self._eid_generator = IdGenerator()
+        if graph is not None:
+            self.extend(graph)
+
+    # Adjacency
+
+    def _build_adjacency(self):
+        """
+        Compute for the in and out edges an array of offsets indexed by the
+        vertex ids and the array of the edge ids ordered by vertex.
+        """
+        nb = len(self._alive)
+        adjacency = []
+        for column in (self._target, self._source):
+            offsets = array('l', bytes((nb + 1) * array('l').itemsize))
+            for vid in column:
+                if vid != _NONE:
+                    offsets[vid + 1] += 1
+            for i in range(nb):
+                offsets[i + 1] += offsets[i]
+            eids = array('l', bytes(offsets[nb] * array('l').itemsize))
+            pos = array('l', offsets)
+            for eid, vid in enumerate(column):
+                if vid != _NONE:
+                    eids[pos[vid]] = eid
+                    pos[vid] += 1
+            adjacency.append((offsets, eids))
+        self._adjacency = adjacency
+        return adjacency
+
+    def _adjacent_edges(self, vid, out):
+        """ Return the list of the in (or out) edges of vid """
+        if not self.has_vertex(vid):
+            raise InvalidVertex(vid)
+        adjacency = self._adjacency or self._build_adjacency()
+        offsets, eids = adjacency[1 if out else 0]
+        if vid + 1 >= len(offsets):
+            return []
+        column = self._source if out else self._target
+        return [eid for eid in eids[offsets[vid]:offsets[vid + 1]]
+                if column[eid] == vid]
+
+    # Graph concept
+
+    def source(self, eid):
+        if not self.has_edge(eid):
+            raise InvalidEdge(eid)
+        return self._source[eid]
+
+    def target(self, eid):
+        if not self.has_edge(eid):
+            raise InvalidEdge(eid)
+        return self._target[eid]
+
+    def has_vertex(self, vid):
+        try:
+            return 0 <= vid < len(self._alive) and self._alive[vid] == 1
+        except TypeError:
+            return False
+
+    def has_edge(self, eid):
+        try:
+            return 0 <= eid < len(self._source) and self._source[eid] != _NONE
+        except TypeError:
+            return False
+
+    # Vertex List Graph concept
+
+    def vertices(self):
+        alive = self._alive
+        return (vid for vid in range(len(alive)) if alive[vid])
+
+    def __iter__(self):
+        return self.vertices()
+
+    def nb_vertices(self):
+        return self._nb_vertices
+
+    def in_neighbors(self, vid):
+        source = self._source
+        return iter(set(source[eid] for eid in self._adjacent_edges(vid, False)))
+
+    def out_neighbors(self, vid):
+        target = self._target
+        return iter(set(target[eid] for eid in self._adjacent_edges(vid, True)))
+
+    # Edge List Graph concept
+
+    def _iteredges(self, vid):
+        for eid in self._adjacent_edges(vid, False):
+            yield eid
+        for eid in self._adjacent_edges(vid, True):
+            yield eid
+
+    def edges(self, vid=None):
+        if vid is None:
+            source = self._source
+            return (eid for eid in range(len(source)) if source[eid] != _NONE)
+        if vid not in self:
+            raise InvalidVertex(vid)
+        return self._iteredges(vid)
+
+    def nb_edges(self, vid=None):
+        if vid is None:
+            return self._nb_edges
+        return (len(self._adjacent_edges(vid, False)) +
+                len(self._adjacent_edges(vid, True)))
+
+    def in_edges(self, vid):
+        for eid in self._adjacent_edges(vid, False):
+            yield eid
+
+    def out_edges(self, vid):
+        for eid in self._adjacent_edges(vid, True):
+            yield eid
+
+    def nb_in_edges(self, vid):
+        return len(self._adjacent_edges(vid, False))
+
+    def nb_out_edges(self, vid):
+        return len(self._adjacent_edges(vid, True))
+
+    # Mutable Vertex Graph concept
+
+    def add_vertex(self, vid=None):
+        vid = self._vid_generator.get_id(vid)
+        size = len(self._alive)
+        if vid >= size:
+            self._alive.extend(bytes(_grow(size, vid) - size))
+        self._alive[vid] = 1
+        self._nb_vertices += 1
+        return vid
+
+    def remove_vertex(self, vid):
+        if vid not in self:
+            raise InvalidVertex(vid)
+        for eid in self._adjacent_edges(vid, False):
+            self.remove_edge(eid)
+        for eid in self._adjacent_edges(vid, True):
+            if self.has_edge(eid):
+                self.remove_edge(eid)
+        self._alive[vid] = 0
+        self._nb_vertices -= 1
+        self._vid_generator.release_id(vid)
+
+    def clear(self):
+        self._alive = bytearray()
+        self._nb_vertices = 0
+        self._vid_generator = IdGenerator()
+        self.clear_edges()
+
+    # Mutable Edge Graph concept
+
+    def add_edge(self, edge=(None, None), eid=None):
+        vs, vt = edge
+        if vs not in self:
+            raise InvalidVertex(vs)
+        if vt not in self:
+            raise InvalidVertex(vt)
+        eid = self._eid_generator.get_id(eid)
+        size = len(self._source)
+        if eid >= size:
+            empty = array('l', [_NONE]) * (_grow(size, eid) - size)
+            self._source.extend(empty)
+            self._target.extend(empty)
+        self._source[eid] = vs
+        self._target[eid] = vt
+        self._nb_edges += 1
+        self._adjacency = None
+        return eid
+
+    def remove_edge(self, eid):
+        if not self.has_edge(eid):
+            raise InvalidEdge(eid)
+        # the adjacency stays valid: removed edges are filtered
+        self._source[eid] = _NONE
+        self._target[eid] = _NONE
+        self._nb_edges -= 1
+        self._eid_generator.release_id(eid)
+
+    def clear_edges(self):
+        self._source = array('l')
+        self._target = array('l')
+        self._nb_edges = 0
+        self._adjacency = None
+        self._eid_generator = IdGenerator()
+
+    def __getstate__(self):
+        odict = self.__dict__.copy()
+        odict['_adjacency'] = None
+        return odict
+
+
+class CompactPropertyGraph(PropertyGraph, CompactGraph):
+    """
+    PropertyGraph whose properties are Column mappings.
+
+    Properties listed in property_typecodes are stored in typed arrays.
+    """
+
+    # property name -> typecode of the array module
+    property_typecodes = {}
+
+    def add_vertex_property(self, property_name, typecode=None):
+        """todo"""
+        PropertyGraph.add_vertex_property(self, property_name)
+        if typecode is None:
+            typecode = self.property_typecodes.get(property_name)
+        self._vertex_property[property_name] = Column(typecode)
+    add_vertex_property.__doc__ = PropertyGraph.add_vertex_property.__doc__
+
+    def add_edge_property(self, property_name, typecode=None):
+        """todo"""
+        PropertyGraph.add_edge_property(self, property_name)
+        if typecode is None:
+            typecode = self.property_typecodes.get(property_name)
+        self._edge_property[property_name] = Column(typecode)
+    add_edge_property.__doc__ = PropertyGraph.add_edge_property.__doc__
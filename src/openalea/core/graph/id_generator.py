@@ -25,36 +25,69 @@ __revision__=" $Id$ "
 
 
 class IdGenerator(object):
+    """
+    Generate unique ids and reuse the released ones (last released first).
+
+    The free ids are kept in a set and in a stack giving their order of
+    reuse. An id taken explicitly is only removed from the set: its stale
+    entry in the stack is skipped later. All the operations are O(1)
+    (amortized), except the creation of the free ids below an explicit id
+    larger than all the ids already generated.
+    """
 
     def __init__(self):
-        self._id_max=0
-        self._id_list=[]
+        self._id_max = 0
+        self._id_list = []
+        self._id_set = set()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if '_id_set' not in state:
+            self._id_set = set(self._id_list)
+
+    def _compact(self):
+        """ Remove the stale entries of the stack """
+        free = self._id_set
+        seen = set()
+        stack = []
+        for id in reversed(self._id_list):
+            if id in free and id not in seen:
+                seen.add(id)
+                stack.append(id)
+        stack.reverse()
+        self._id_list = stack
 
     def get_id(self, id=None):
         if id is None:
-            if len(self._id_list)==0:
-                ret=self._id_max
-                self._id_max+=1
-                return ret
-            else:
-                return self._id_list.pop()
+            free = self._id_set
+            while self._id_list:
+                ret = self._id_list.pop()
+                if ret in free:
+                    free.remove(ret)
+                    return ret
+            ret = self._id_max
+            self._id_max += 1
+            return ret
         else:
-            if id>=self._id_max:
-                self._id_list.extend(list(range(self._id_max, id)))
-                self._id_max=id+1
+            if id >= self._id_max:
+                self._id_list.extend(range(self._id_max, id))
+                self._id_set.update(range(self._id_max, id))
+                self._id_max = id + 1
                 return id
             else:
                 try:
-                    ind=self._id_list.index(id)
-                    del self._id_list[ind]
-                    return id
-                except ValueError:
+                    self._id_set.remove(id)
+                except KeyError:
                     raise IndexError("id %d already used" % id)
+                if len(self._id_list) > 2 * len(self._id_set) + 64:
+                    self._compact()
+                return id
 
     def release_id(self, id):
-        if id>self._id_max:
+        if id > self._id_max:
             raise IndexError("id out of range")
-        elif id in self._id_list:
+        elif id in self._id_set:
             raise IndexError("id already not used")
         else:
+            self._id_set.add(id)
             self._id_list.append(id)
@@ -123,6 +123,8 @@ class IInterface(six.with_metaclass(IInterfaceMetaClass, object)):
     """ Abstract base class for all interfaces """
     __pytype__ = None
     __color__ = None
+    # strategy used by lazy nodes to detect input changes
+    __change_detection__ = None
 
     @classmethod
     def default(cls):
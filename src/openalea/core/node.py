@@ -40,10 +40,12 @@ from weakref import ref, proxy
 # from signature import get_parameters
 from importlib import util, machinery
 from . import signature as sgn
-from .observer import Observed, AbstractListener
+from .observer import Observed, AbstractListener, Batched, skip_notification
 from .actor import IActor
 from .metadatadict import MetaDataDict, HasAdHoc
 from .interface import TypeNameInterfaceMap
+from .change_detection import get_change_detection
+from .cache import get_output_cache
 
 from six.moves import range
 try:
@@ -78,7 +80,7 @@ class InstantiationError(Exception):
 ########################
 # Node related classes #
 ########################
-class AbstractNode(Observed, HasAdHoc):
+class AbstractNode(Observed, Batched, HasAdHoc):
     """
     An AbstractNode is the atomic entity in a dataflow.
 
@@ -247,9 +249,52 @@ class AbstractPort(dict, Observed, HasAdHoc):
 class InputPort(AbstractPort):
     """ The class describing the input ports """
 
+    _change_detection = None
+
     def __init__(self, node):
         AbstractPort.__init__(self, node)
 
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        if key in ('change_detection', 'interface'):
+            self._change_detection = None
+
+    def get_change_strategy(self):
+        """
+        Return the change detection strategy of the input: the one of the
+        port, of its interface or of the node (see change_detection).
+        """
+        strategy = self.get('change_detection')
+        if strategy is None:
+            try:
+                interface = self.get_interface()
+            except KeyError:
+                interface = None
+            strategy = getattr(interface, '__change_detection__', None)
+        if strategy is None:
+            strategy = getattr(self.vertex(), 'change_detection', None)
+        return strategy
+
+    def get_change_detection(self):
+        """ Return the ChangeDetection used by the lazy node """
+        detection = self._change_detection
+        if detection is None:
+            detection = get_change_detection(self.get_change_strategy())
+            self._change_detection = detection
+        return detection
+
+    def set_change_detection(self, strategy):
+        """ Set the change detection strategy of the input """
+        self['change_detection'] = strategy
+
+    def reset_change_detection(self):
+        """ The strategy will be resolved again """
+        self._change_detection = None
+
+    def input_changed(self, old, new):
+        """ Return True if new is a change of the input value old """
+        return self.get_change_detection().changed(old, new)
+
     def get_label(self):
         """Gets default label"""
         return self.get("label", self["name"])
@@ -280,6 +325,11 @@ class Node(AbstractNode):
     Inputs and Outpus are indexed by their position or by a name (str)
     """
 
+    # default change detection strategy of the lazy inputs
+    change_detection = None
+    # memoize the outputs (see cache module)
+    cache = False
+
     @staticmethod
     def is_deprecated_event(event):
         evLen = len(event)
@@ -331,6 +381,12 @@ class Node(AbstractNode):
         self.continuous_eval = Observed()
 
     def notify_listeners(self, event):
+        if skip_notification(self):
+            return
+        if self._event_batch is not None:
+            # sent at the end of the batch
+            self._event_batch.add(event)
+            return
         txt, trevent = Node.is_deprecated_event(event)
         if txt:
             Observed.notify_listeners(self, trevent)
@@ -484,7 +540,7 @@ class Node(AbstractNode):
         """
         self.modified = True
         index = self.map_index_in[index_key]
-        if(notify):
+        if(notify and not skip_notification(self)):
             self.notify_listeners(("input_modified", index))
             self.continuous_eval.notify_listeners(("node_modified",))
 
@@ -603,7 +659,8 @@ class Node(AbstractNode):
         if(self.lazy):
             # Test if the inputs has changed
             try:
-                changed = (cmp(self.inputs[index], val) != 0)
+                changed = self.input_desc[index].input_changed(
+                    self.inputs[index], val)
             except:
                 pass
 
@@ -637,6 +694,15 @@ class Node(AbstractNode):
         index = self.map_index_in[index_key]
         return self.input_states[index]
 
+    def set_change_detection(self, strategy):
+        """
+        Set the default change detection strategy of the inputs
+        (see change_detection)
+        """
+        self.change_detection = strategy
+        for port in self.input_desc:
+            port.reset_change_detection()
+
     def set_input_state(self, index_key, state):
         """ Set the state of the input index/key (state is a string) """
 
@@ -654,6 +720,15 @@ class Node(AbstractNode):
 
     # Functions used by the node evaluator
 
+    def is_up_to_date(self):
+        """
+        Return True if the evaluation of the node can be skipped
+        (blocked node with outputs or lazy node without modification).
+        """
+        if self.block and self.get_nb_output() != 0 and self.output(0) is not None:
+            return True
+        return (self.delay == 0 and self.lazy) and not self.modified
+
     def eval(self):
         """
         Evaluate the node by calling __call__
@@ -661,15 +736,26 @@ class Node(AbstractNode):
         and a timed delay if the node needs a reevaluation at a later time.
         """
         # lazy evaluation
-        if self.block and self.get_nb_output() != 0 and self.output(0) is not None:
-            return False
-        if (self.delay == 0 and self.lazy) and not self.modified:
+        if self.is_up_to_date():
             return False
 
         self.notify_listeners(("start_eval",))
 
         # Run the node
-        outlist = self.__call__(self.inputs)
+        cache = get_output_cache(self.cache)
+        if cache is None:
+            outlist = self.__call__(self.inputs)
+        else:
+            outlist = cache.call(self)
+
+        return self.update_outputs(outlist)
+
+    def update_outputs(self, outlist):
+        """
+        Copy the result of __call__ into the outputs and validate the node.
+        Return the reevaluation delay like eval.
+        """
+        notify = not skip_notification(self)
 
         # Copy outputs
         # only one output
@@ -682,7 +768,8 @@ class Node(AbstractNode):
             except TypeError:
                 self.outputs[0] = outlist
 
-            self.output_desc[0].notify_listeners(("tooltip_modified",))
+            if notify:
+                self.output_desc[0].notify_listeners(("tooltip_modified",))
 
         else: # multi output
             if(not isinstance(outlist, tuple) and
@@ -690,7 +777,8 @@ class Node(AbstractNode):
                 outlist = (outlist,)
 
             for i in range(min(len(outlist), len(self.outputs))):
-                self.output_desc[i].notify_listeners(("tooltip_modified",))
+                if notify:
+                    self.output_desc[i].notify_listeners(("tooltip_modified",))
                 self.outputs[i] = outlist[i]
 
         # Set State
@@ -841,6 +929,8 @@ class AbstractFactory(Observed):
                  view=None,
                  alias=None,
                  authors=None,
+                 change_detection=None,
+                 cache=False,
                  **kargs):
         """
         Create a factory.
@@ -854,6 +944,10 @@ class AbstractFactory(Observed):
         :param view: custom view (default = None)
         :param alias: list of alias name
         :param authors: authors of the node. If Node, it should be replaced by the package authors.
+        :param change_detection: default strategy used by lazy nodes to
+            detect input changes (see change_detection module)
+        :param cache: memoize the outputs of the nodes, True or a
+            cache.LRUCache (default = False, see cache module)
 
         .. note:: inputs and outputs parameters are list of dictionnary such
 
@@ -878,6 +972,8 @@ class AbstractFactory(Observed):
         self.delay = delay
         self.alias = alias
         self.authors = authors
+        self.change_detection = change_detection
+        self.cache = cache
     # Package property
 
     def set_pkg(self, port):
@@ -1196,6 +1292,11 @@ class NodeFactory(AbstractFactory):
                 node.set_caption(self.name)
 
             node.delay = self.delay
+
+            change_detection = getattr(self, 'change_detection', None)
+            if change_detection is not None:
+                node.set_change_detection(change_detection)
+            node.cache = getattr(self, 'cache', False)
         except:
             pass
 
@@ -20,14 +20,36 @@ from __future__ import print_function
 __license__ = "Cecill-C"
 __revision__ = " $Id$ "
 
-try:
-    import openalea.grapheditor
-    graphobserver = True
-except ImportError as e:
-    graphobserver = False
+import os
+import threading
+from contextlib import contextmanager
+
+# OA_NO_GRAPHEDITOR: do not probe openalea.grapheditor (and Qt) on import
+graphobserver = False
+if 'OA_NO_GRAPHEDITOR' not in os.environ:
+    try:
+        import openalea.grapheditor
+        graphobserver = True
+    except ImportError as e:
+        pass
 
 ###############################################################################
 
+
+class Batched(object):
+    """ Mixin of the observed objects whose events can be queued by a batch
+    (see observer.batch): notify_listeners must add the events to the
+    _event_batch if it is not None """
+
+    # EventBatch queuing the events in a batch
+    _event_batch = None
+
+    def batch(self):
+        """ Return a context manager queuing the events until its end
+        (see observer.batch) """
+        return batch(self)
+
+
 if graphobserver:
     from openalea.grapheditor.observer import *
 else:
@@ -35,7 +57,7 @@ else:
    from collections import deque
 
 
-   class Observed(object):
+   class Observed(Batched):
        """ Observed Object """
 
        def __init__(self):
@@ -104,6 +126,12 @@ else:
 
            :param event: an object to pass to the notify function
            """
+           if self._event_batch is not None:
+               self._event_batch.add(event)
+               return
+           if (not self.listeners and self.__exclusive is None and
+                   not self.__postNotifs):
+               return
 
            self.__isNotifying = True
 
@@ -139,6 +167,7 @@ else:
            """ Pickle function """
            odict = self.__dict__.copy()
            odict['listeners'] = set()
+           odict.pop('_event_batch', None)
            return odict
 
    class AbstractListener(object):
@@ -223,3 +252,143 @@ else:
 
        return wrapped
 
+
+###############################################################################
+# Notification policy of the evaluations
+
+# every event is sent
+FULL = 'full'
+# the events are not sent, one summary event is sent after the evaluation
+COALESCED = 'coalesced'
+# the events are not sent
+SILENT = 'silent'
+
+NOTIFICATION_POLICIES = (FULL, COALESCED, SILENT)
+
+# policy (None for FULL) and observed objects whose events were skipped,
+# for the current thread
+_notification = threading.local()
+
+
+def get_notification_policy():
+    """ Return the notification policy of the current thread """
+    return getattr(_notification, 'policy', None) or FULL
+
+
+def skip_notification(observed):
+    """
+    Return True if the events of observed must not be sent with the
+    notification policy of the current thread.
+    The observed object is recorded by the COALESCED policy.
+    """
+    policy = getattr(_notification, 'policy', None)
+    if policy is None:
+        return False
+    if policy is COALESCED:
+        _notification.skipped[id(observed)] = observed
+    return True
+
+
+@contextmanager
+def notification_policy(policy):
+    """
+    Set the notification policy of the current thread in a with block.
+
+    Yield a dict mapping id to the observed objects whose events were
+    skipped (filled by the COALESCED policy only).
+    """
+    if policy not in NOTIFICATION_POLICIES:
+        raise ValueError("Unknown notification policy %r" % (policy,))
+    old = (getattr(_notification, 'policy', None),
+           getattr(_notification, 'skipped', None))
+    skipped = {}
+    _notification.policy = None if policy == FULL else policy
+    _notification.skipped = skipped
+    try:
+        yield skipped
+    finally:
+        _notification.policy, _notification.skipped = old
+
+
+def with_notification_policy(func):
+    """
+    Return a function calling func with the notification policy of the
+    current thread, to run func in a worker thread.
+    """
+    policy = getattr(_notification, 'policy', None)
+    if policy is None:
+        return func
+    skipped = _notification.skipped
+
+    def wrapped(*args, **kwargs):
+        old = (getattr(_notification, 'policy', None),
+               getattr(_notification, 'skipped', None))
+        _notification.policy, _notification.skipped = policy, skipped
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _notification.policy, _notification.skipped = old
+
+    return wrapped
+
+
+###############################################################################
+# Batch of notifications
+
+# events sent once by a batch
+IDEMPOTENT_EVENTS = frozenset(('input_modified', 'data_modified',
+                               'connection_modified', 'graph_modified'))
+
+
+def _idempotent_key(event):
+    """ Return event if it is an idempotent hashable event, None otherwise """
+    if type(event) is tuple and event and event[0] in IDEMPOTENT_EVENTS:
+        try:
+            hash(event)
+        except TypeError:
+            return None
+        return event
+    return None
+
+
+class EventBatch(object):
+    """ Events queued by a batch, the idempotent ones only once """
+
+    def __init__(self):
+        self.events = []
+        self._sent = set()
+
+    def add(self, event):
+        key = _idempotent_key(event)
+        if key is not None:
+            if key in self._sent:
+                return
+            self._sent.add(key)
+        self.events.append(event)
+
+
+@contextmanager
+def batch(observed):
+    """
+    Queue the events of observed in a with block and send them at the end
+    of the block, the idempotent events (IDEMPOTENT_EVENTS) only once.
+
+    The events are dropped if observed has no listener. A nested batch of
+    the same object is merged with the enclosing one.
+
+    Only the Batched objects queue their events, the others send them
+    immediately.
+    """
+    if getattr(observed, '_event_batch', None) is not None:
+        # enclosing batch
+        yield observed
+        return
+
+    events = observed._event_batch = EventBatch()
+    try:
+        yield observed
+    finally:
+        del observed._event_batch
+        if getattr(observed, 'listeners', True):
+            for event in events.events:
+                observed.notify_listeners(event)
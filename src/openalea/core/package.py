@@ -43,6 +43,7 @@ from openalea.core.pkgdict import PackageDict, protected
 from openalea.core.path import path as _path
 from openalea.core.vlab import vlab_object
 from openalea.core.node import NodeFactory
+from openalea.core import logger
 
 # Exceptions
 
@@ -283,6 +284,11 @@ class Package(PackageDict):
 
         return factory
 
+    def iter_factories(self):
+        """ Iterate through the factories used in the listings and the
+        categories (stubs for the lazy packages) """
+        return iter(list(self.values()))
+
 
 ################################################################################
 
@@ -516,6 +522,106 @@ def %s(%s):
         #self.write()
 
 
+################################################################################
+
+class FactoryStub(object):
+    """
+    Description of a factory of a LazyPackage which has not been loaded.
+
+    The stub has the name, category and description of the factory. Other
+    attributes are read from the factory (the package is loaded).
+    """
+
+    def __init__(self, package, name, category='', description=''):
+        self.package = package
+        self.name = name
+        self.category = category
+        self.description = description
+
+    def get_factory(self):
+        """ Return the factory (load the package) """
+        return self.package.get_factory(self.name)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.get_factory(), name)
+
+    def __repr__(self):
+        return "<FactoryStub %s.%s>" % (self.package.name, self.name)
+
+
+def _loading(method):
+    """ Load the package before calling method """
+
+    def wrapped(self, *args, **kwds):
+        if self._loader is not None:
+            self.load()
+        return method(self, *args, **kwds)
+    wrapped.__name__ = method.__name__
+    wrapped.__doc__ = method.__doc__
+    return wrapped
+
+
+class LazyPackage(Package):
+    """
+    Package whose factories are created on first access.
+
+    loader is a function returning the factories of the package. Until the
+    package is loaded, the listings and the categories use stubs
+    describing the factories: a list of (name, category, description).
+    """
+
+    def __init__(self, name, metainfo, path=None, loader=None, stubs=()):
+        Package.__init__(self, name, metainfo, path)
+        self._loader = loader
+        self.stubs = [FactoryStub(self, *stub) for stub in stubs]
+
+    def is_loaded(self):
+        """ Return True if the factories have been created """
+        return self._loader is None
+
+    def load(self):
+        """ Create the factories of the package """
+        loader, self._loader = self._loader, None
+        if loader is None:
+            return
+        for factory in loader():
+            try:
+                self.add_factory(factory)
+            except Exception as e:
+                logger.error("%s: %s" % (self.name, e))
+
+    def iter_factories(self):
+        if self._loader is not None:
+            return iter(self.stubs)
+        return Package.iter_factories(self)
+    iter_factories.__doc__ = Package.iter_factories.__doc__
+
+    __getitem__ = _loading(PackageDict.__getitem__)
+    __setitem__ = _loading(PackageDict.__setitem__)
+    __delitem__ = _loading(PackageDict.__delitem__)
+    __contains__ = _loading(PackageDict.__contains__)
+    __iter__ = _loading(dict.__iter__)
+    __len__ = _loading(dict.__len__)
+    has_key = _loading(PackageDict.has_key)
+    get = _loading(PackageDict.get)
+    keys = _loading(dict.keys)
+    values = _loading(dict.values)
+    items = _loading(dict.items)
+    pop = _loading(PackageDict.pop)
+    popitem = _loading(PackageDict.popitem)
+    setdefault = _loading(PackageDict.setdefault)
+    update = _loading(PackageDict.update)
+    clear = _loading(PackageDict.clear)
+    iter_public_values = _loading(PackageDict.iter_public_values)
+    nb_public_values = _loading(PackageDict.nb_public_values)
+
+
+class LazyUserPackage(LazyPackage, UserPackage):
+    """ UserPackage whose factories are created on first access """
+
+
 ################################################################################
 
 class AbstractPackageReader(object):
@@ -541,6 +647,10 @@ class PyPackageReader(AbstractPackageReader):
     Use 'register_package' function
     """
 
+    # module spec and compiled code of the wralea file (see prepare)
+    _spec = None
+    _code = None
+
     def filename_to_module(self, filename):
         """ Transform the filename ending with .py to the module name """
         start_index = 0
@@ -571,24 +681,13 @@ class PyPackageReader(AbstractPackageReader):
 
         pkg = None
 
-        basename = os.path.basename(self.filename)
         basedir = os.path.abspath(os.path.dirname(self.filename))
 
-        modulename = self.get_pkg_name()
-        base_modulename = self.filename_to_module(basename)
-
         # Adapt sys.path
         sys.path.append(basedir)
 
-        if (modulename in sys.modules):
-            del sys.modules[modulename]
-
-        # (file, pathname, desc) = imp.find_module(base_modulename, [basedir])
-        spec = machinery.PathFinder.find_spec(base_modulename, [basedir])
-        module = util.module_from_spec(spec)
         try:
-            # wraleamodule = imp.load_module(modulename, file, pathname, desc)
-            spec.loader.exec_module(module)
+            module = self.load_module()
             pkg = self.build_package(module, pkgmanager)
 
         except Exception as e:
@@ -609,6 +708,38 @@ class PyPackageReader(AbstractPackageReader):
 
         return pkg
 
+    def prepare(self):
+        """ Find and compile the wralea file without executing it.
+        May be called concurrently for different readers """
+
+        if self._code is not None:
+            return
+        basename = os.path.basename(self.filename)
+        basedir = os.path.abspath(os.path.dirname(self.filename))
+        base_modulename = self.filename_to_module(basename)
+
+        # (file, pathname, desc) = imp.find_module(base_modulename, [basedir])
+        spec = machinery.PathFinder.find_spec(base_modulename, [basedir])
+        if spec is None:
+            raise ImportError("Cannot find %s" % (self.filename, ))
+        self._code = spec.loader.get_code(spec.name)
+        self._spec = spec
+
+    def load_module(self):
+        """ Execute the wralea file and return the module.
+        The directory of the file has to be in sys.path """
+
+        modulename = self.get_pkg_name()
+        if (modulename in sys.modules):
+            del sys.modules[modulename]
+
+        self.prepare()
+        code, self._code = self._code, None
+        module = util.module_from_spec(self._spec)
+        # wraleamodule = imp.load_module(modulename, file, pathname, desc)
+        exec(code, module.__dict__)
+        return module
+
     def build_package(self, wraleamodule, pkgmanager):
         """ Build package and update pkgmanager """
 
@@ -618,7 +749,7 @@ class PyPackageReader(AbstractPackageReader):
         except AttributeError:
             # compatibility issue between two types of reader
             reader = PyPackageReaderWralea(self.filename)
-            reader.build_package(wraleamodule, pkgmanager)
+            return reader.build_package(wraleamodule, pkgmanager)
 
 
 class PyPackageReaderWralea(PyPackageReader):
@@ -628,7 +759,15 @@ class PyPackageReaderWralea(PyPackageReader):
     """
 
     def build_package(self, wraleamodule, pkgmanager):
-        """ Build package and update pkgmanager """
+        """ Build package, update pkgmanager and return the package """
+
+        p = self.create_package(wraleamodule, pkgmanager.log)
+        self.register_package(p, pkgmanager)
+        return p
+
+    def create_package(self, wraleamodule, log=None):
+        """ Return the package defined in wraleamodule.
+        Errors on the factories are added to log """
 
         name = wraleamodule.__dict__.get('__name__', None)
         edit = wraleamodule.__dict__.get('__editable__', False)
@@ -677,12 +816,19 @@ class PyPackageReaderWralea(PyPackageReader):
                         f.search_path += [_search_path]
                     p.add_factory(f)
             except Exception as e:
-                pkgmanager.log.add(str(e))
+                if log is not None:
+                    log.add(str(e))
+                else:
+                    logger.error(str(e))
+
+        return p
 
+    def register_package(self, p, pkgmanager):
+        """ Add the package p and its aliases in pkgmanager """
         pkgmanager.add_package(p)
 
         # Add Package Aliases
-        palias = wraleamodule.__dict__.get('__alias__', [])
+        palias = p.metainfo.get('alias', [])
         for name in palias:
             if protected(name) in pkgmanager:
                 alias_pkg = pkgmanager[protected(name)]
@@ -0,0 +1,309 @@
+# -*- python -*-
+#
+#       OpenAlea.Core
+#
+#       Copyright 2006-2009 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Persistent index of the packages found by the package manager.
+
+The index stores, for each __wralea__.py file, the package metainfo and
+the state of its factories. A package whose wralea file, wralea
+directory and entry point distributions are unchanged is registered from
+the index without executing its wralea module. The package can be
+registered as a LazyPackage: its factories are created on first access.
+
+The index is saved in the openalea home directory.
+
+The same description of the packages is used by the snapshots of the
+package manager, to rebuild its packages in worker processes without
+searching the wralea files again (see PackageManager.snapshot).
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import functools
+import os
+import pickle
+import sys
+import tempfile
+
+from openalea.core import logger
+from openalea.core.package import (Package, UserPackage, LazyPackage,
+                                   LazyUserPackage, PyPackageReaderWralea)
+
+# change it when the format of the index changes
+INDEX_VERSION = 2
+
+
+def entry_point_versions(group="wralea"):
+    """ Return the sorted (name, version) of the distributions of the entry
+    points of group """
+    from importlib.metadata import entry_points
+    versions = set()
+    for epoint in entry_points(group=group):
+        dist = getattr(epoint, 'dist', None)
+        if dist is not None:
+            versions.add((dist.metadata['Name'], dist.version))
+    return sorted(versions)
+
+
+def file_signature(filename):
+    """ Return the signature of a wralea file (changes if the file or its
+    directory change) or None if the file does not exist """
+    try:
+        st = os.stat(filename)
+        dst = os.stat(os.path.dirname(os.path.abspath(filename)))
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, dst.st_mtime_ns)
+
+
+def package_state(package):
+    """
+    Return the pickled description of package:
+
+        - (class, name, metainfo, wralea path, stubs) where stubs are the
+          (name, category, description) of the factories,
+        - the list of (class, state) of the factories
+
+    or None if it can not be pickled.
+    The factories of a LazyPackage which is not loaded are not created.
+    """
+    if isinstance(package, LazyPackage) and not package.is_loaded():
+        state = lazy_package_state(package)
+        if state is not None:
+            return state
+
+    factories = []
+    stubs = []
+    seen = set()
+    for factory in package.values():
+        # aliases are created again by add_factory
+        if id(factory) in seen:
+            continue
+        seen.add(id(factory))
+        state = dict(factory.__getstate__())
+        if 'listeners' in state:
+            state['listeners'] = set()
+        factories.append((factory.__class__, state))
+        stubs.append((factory.name, factory.category, factory.description))
+
+    header = (base_class(package), package.name, package.metainfo,
+              package.wralea_path, stubs)
+    try:
+        return (pickle.dumps(header, pickle.HIGHEST_PROTOCOL),
+                pickle.dumps(factories, pickle.HIGHEST_PROTOCOL))
+    except Exception as e:
+        logger.debug("Package %s is not indexed: %s" % (package.name, e))
+        return None
+
+
+def lazy_package_state(package):
+    """ Return the pickled description of a LazyPackage created by
+    load_package, without loading it, or None """
+    loader = package._loader
+    if getattr(loader, 'func', None) is not factory_loader:
+        return None
+    stubs = [(s.name, s.category, s.description) for s in package.stubs]
+    header = (base_class(package), package.name, package.metainfo, package.wralea_path,
+              stubs)
+    try:
+        return pickle.dumps(header, pickle.HIGHEST_PROTOCOL), loader.args[0]
+    except Exception:
+        return None
+
+
+def load_factories(data):
+    """ Create the factories described by data """
+    factories = []
+    for cls, state in pickle.loads(data):
+        # __setstate__ is bypassed: it looks for the package in the manager
+        factory = cls.__new__(cls)
+        factory.__dict__.update(state)
+        factories.append(factory)
+    return factories
+
+
+def execute_wralea(filename):
+    """ Return the factories defined in the wralea file """
+    reader = PyPackageReaderWralea(filename)
+    sys.path.append(os.path.dirname(filename))
+    try:
+        package = reader.create_package(reader.load_module())
+    finally:
+        sys.path.pop()
+    factories = []
+    for factory in package.values():
+        if factory not in factories:
+            factories.append(factory)
+    return factories
+
+
+def factory_loader(data, filename):
+    """ Loader of a LazyPackage: create the factories from the index or
+    execute the wralea file if the index is not valid anymore """
+    try:
+        return load_factories(data)
+    except Exception as e:
+        logger.warning("Cannot load %s from the index: %s" % (filename, e))
+        return execute_wralea(filename)
+
+
+# class of the packages -> class of the lazy packages
+lazy_classes = {Package: LazyPackage, UserPackage: LazyUserPackage}
+
+
+def base_class(package):
+    """ Return the class of package, or the class it is the lazy version
+    of """
+    for cls, lazy_cls in lazy_classes.items():
+        if lazy_cls is package.__class__:
+            return cls
+    return package.__class__
+
+
+def load_package(header, factories, filename=None, lazy=False):
+    """
+    Create the package described by header and the factories data.
+
+    If lazy is True, return a LazyPackage (if the package class has a lazy
+    version) whose factories are created on first access.
+    """
+    cls, name, metainfo, path, stubs = pickle.loads(header)
+    if lazy and cls in lazy_classes:
+        loader = functools.partial(factory_loader, factories,
+                                   filename or path)
+        return lazy_classes[cls](name, metainfo, path, loader, stubs)
+
+    package = cls(name, metainfo, path)
+    for factory in load_factories(factories):
+        package.add_factory(factory)
+    return package
+
+
+class PackageIndex(object):
+    """
+    Index of the packages built from wralea files.
+
+    entries: wralea filename -> (file signature, pickled package header,
+                                 pickled factories)
+    """
+
+    def __init__(self, filename=None):
+        if filename is None:
+            from openalea.core.settings import get_openalea_home_dir
+            filename = os.path.join(get_openalea_home_dir(),
+                                    'package_index.pkl')
+        self.filename = filename
+        self.entries = {}
+        self.modified = False
+        self._checked = {}
+
+    def header(self):
+        """ Global validity of the index """
+        from openalea.core import version
+        return (INDEX_VERSION, tuple(sys.version_info[:2]),
+                version.__version__, entry_point_versions())
+
+    def load(self):
+        """ Load the index file if it is still valid """
+        try:
+            with open(self.filename, 'rb') as f:
+                header, entries = pickle.load(f)
+        except Exception:
+            return False
+        if header != self.header():
+            return False
+        self.entries = entries
+        self._checked = {}
+        return True
+
+    def save(self):
+        """ Write the index atomically if it has been modified """
+        if not self.modified:
+            return
+        dirname = os.path.dirname(self.filename)
+        try:
+            fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((self.header(), self.entries), f,
+                            pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.filename)
+        except Exception as e:
+            logger.warning("Cannot save the package index: %s" % e)
+        else:
+            self.modified = False
+
+    def clear(self):
+        self.entries = {}
+        self._checked = {}
+        self.modified = True
+
+    def check(self, filename):
+        """ Return True if the entry of filename is up to date.
+        The result is kept until the entry is updated """
+        valid = self._checked.get(filename)
+        if valid is None:
+            entry = self.entries.get(filename)
+            valid = (entry is not None and
+                     entry[0] == file_signature(filename))
+            self._checked[filename] = valid
+        return valid
+
+    def get(self, filename):
+        """ Return the pickled package of filename if it is up to date """
+        if not self.check(filename):
+            return None
+        return self.entries[filename][1:]
+
+    def register(self, reader, pkgmanager, lazy=False):
+        """
+        Register the package of reader from the index.
+        Return the package or None if it is not in the index.
+
+        If lazy is True, the factories are created on first access.
+        """
+        filename = os.path.abspath(reader.filename)
+        data = self.get(filename)
+        if data is None:
+            return None
+        try:
+            package = load_package(data[0], data[1], filename, lazy)
+        except Exception as e:
+            logger.debug("Cannot load %s from the index: %s" % (filename, e))
+            del self.entries[filename]
+            self._checked.pop(filename, None)
+            self.modified = True
+            return None
+        reader.register_package(package, pkgmanager)
+        return package
+
+    def update(self, reader, package):
+        """ Store the package built by reader """
+        filename = os.path.abspath(reader.filename)
+        self._checked.pop(filename, None)
+        signature = file_signature(filename)
+        data = package_state(package) if package is not None else None
+        if signature is None or data is None:
+            if self.entries.pop(filename, None) is not None:
+                self.modified = True
+            return
+        self.entries[filename] = (signature,) + data
+        self.modified = True
+
+    def prune(self, filenames):
+        """ Remove the entries of the files which are not in filenames """
+        filenames = set(os.path.abspath(f) for f in filenames)
+        for filename in list(self.entries):
+            if filename not in filenames:
+                del self.entries[filename]
+                self._checked.pop(filename, None)
+                self.modified = True
@@ -0,0 +1,275 @@
+# -*- python -*-
+#
+#       OpenAlea.Core
+#
+#       Copyright 2006-2009 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Dependency graph of the composite node factories of the package manager.
+
+The vertices are the factories, the edges go from a composite node
+factory to the factories of its nodes (elt_factory). The edges, the
+transitive closures and the reverse dependencies are computed once and
+kept until a package is modified (see PackageDict.version) or
+invalidated.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from openalea.core.pkgdict import is_protected, lower
+
+
+class DependencyGraph(object):
+    """
+    Dependencies of the composite node factories of a package manager.
+    """
+
+    def __init__(self, pkgmanager):
+        self.pkgmanager = pkgmanager
+        self.clear()
+
+    def clear(self):
+        """ Remove all the cached dependencies """
+        # composite factory -> (package keys, factories, missing (pkg, name))
+        self._edges = {}
+        # package key -> composite factories referencing it
+        self._referenced = {}
+        # factory -> frozenset of the factories it depends on
+        self._reach = {}
+        # factory -> frozenset of its missing (pkg, name)
+        self._missing = {}
+        # factory name -> list of (package name, composite name)
+        self._users = None
+        # package key -> (package, version)
+        self._packages = {}
+        self._pkgs = None
+        self._version = None
+
+    # Invalidation
+
+    def invalidate(self, package=None):
+        """ Forget the dependencies of the composite node factories of
+        package (all the packages if None) and of the factories using
+        them """
+        if package is None:
+            self.clear()
+            return
+        keys = [key for key, (pkg, version) in self._packages.items()
+                if pkg is package]
+        self._invalidate_keys(keys)
+        for key in keys:
+            del self._packages[key]
+
+    def _invalidate_keys(self, keys):
+        """ Forget the edges of the composites of the packages registered
+        with keys or referencing them """
+        stale = set()
+        packages = set()
+        for key in keys:
+            stale.update(self._referenced.pop(key, ()))
+            # pkgmanager[name] also returns the package of the alias #name
+            if is_protected(key):
+                stale.update(self._referenced.pop(key[1:], ()))
+            entry = self._packages.get(key)
+            if entry is not None:
+                packages.add(id(entry[0]))
+        if packages:
+            stale.update(f for f in self._edges
+                         if id(getattr(f, 'package', None)) in packages)
+        if not stale:
+            return
+
+        # the closures of the users of the stale factories are stale too
+        users = self.reverse_edges()
+        todo = list(stale)
+        while todo:
+            f = todo.pop()
+            for user in users.get(f, ()):
+                if user not in stale:
+                    stale.add(user)
+                    todo.append(user)
+        for f in stale:
+            self._reach.pop(f, None)
+            self._missing.pop(f, None)
+            if f in self._edges:
+                for key in self._edges.pop(f)[0]:
+                    refs = self._referenced.get(key)
+                    if refs is not None:
+                        refs.discard(f)
+        self._users = None
+
+    def update(self):
+        """ Invalidate the dependencies of the packages modified since the
+        last update """
+        pkgs = self.pkgmanager.pkgs
+        version = getattr(pkgs, 'version', None)
+        changed = []
+        if pkgs is not self._pkgs or version != self._version:
+            self._pkgs = pkgs
+            self._version = version
+            for key in list(self._packages):
+                if not dict.__contains__(pkgs, key):
+                    changed.append(key)
+        for key in pkgs.keys():
+            package = pkgs[key]
+            entry = self._packages.get(key)
+            if (entry is None or entry[0] is not package or
+                    entry[1] != getattr(package, 'version', 0)):
+                changed.append(key)
+        if not changed:
+            return
+
+        self._invalidate_keys(changed)
+        for key in changed:
+            package = dict.get(pkgs, key)
+            if package is None:
+                self._packages.pop(key, None)
+            else:
+                self._packages[key] = (package,
+                                       getattr(package, 'version', 0))
+
+    # Graph
+
+    def edges(self, factory):
+        """
+        Return the package keys, the factories and the missing (package,
+        name) referenced by the nodes of a composite node factory.
+        """
+        edges = self._edges.get(factory)
+        if edges is not None:
+            return edges
+
+        keys, factories, missing = set(), [], []
+        if factory.is_composite_node():
+            pkgmanager = self.pkgmanager
+            for p, n in factory.elt_factory.values():
+                if is_protected(p) or is_protected(n):
+                    continue
+                keys.add(lower(p))
+                try:
+                    factories.append(pkgmanager[p][n])
+                except:
+                    missing.append((p, n))
+
+        edges = self._edges[factory] = (keys, factories, missing)
+        for key in keys:
+            self._referenced.setdefault(key, set()).add(factory)
+        return edges
+
+    def reverse_edges(self):
+        """ Return a dict factory -> composite factories using it """
+        users = {}
+        for f, (keys, factories, missing) in self._edges.items():
+            for dep in factories:
+                users.setdefault(dep, set()).add(f)
+        return users
+
+    def _compute(self, factory):
+        """ Compute the transitive dependencies of factory and of the
+        factories it depends on (iterative Tarjan algorithm on the
+        strongly connected components) """
+        reach = self._reach
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+
+        index[factory] = low[factory] = 0
+        stack.append(factory)
+        on_stack.add(factory)
+        work = [(factory, iter(self.edges(factory)[1]))]
+        while work:
+            v, children = work[-1]
+            for w in children:
+                if w in reach:
+                    continue
+                if w not in index:
+                    index[w] = low[w] = len(index)
+                    stack.append(w)
+                    on_stack.add(w)
+                    work.append((w, iter(self.edges(w)[1])))
+                    break
+                elif w in on_stack:
+                    low[v] = min(low[v], index[w])
+            else:
+                work.pop()
+                if work:
+                    u = work[-1][0]
+                    low[u] = min(low[u], low[v])
+                if low[v] != index[v]:
+                    continue
+
+                # v is the root of a strongly connected component
+                component = []
+                while True:
+                    w = stack.pop()
+                    on_stack.discard(w)
+                    component.append(w)
+                    if w is v:
+                        break
+                members = set(component)
+                result = set()
+                cyclic = len(component) > 1
+                for w in component:
+                    for dep in self.edges(w)[1]:
+                        if dep in members:
+                            cyclic = True
+                        else:
+                            result.add(dep)
+                            result.update(reach[dep])
+                if cyclic:
+                    result.update(members)
+                result = frozenset(result)
+                for w in component:
+                    reach[w] = result
+
+    def _dependencies(self, factory):
+        reach = self._reach.get(factory)
+        if reach is None:
+            self._compute(factory)
+            reach = self._reach[factory]
+        return reach
+
+    def dependencies(self, factory):
+        """ Return the set of the factories factory depends on """
+        self.update()
+        return self._dependencies(factory)
+
+    def missing(self, factory):
+        """ Return the set of the (package, name) referenced by factory or
+        its dependencies which are not in the package manager """
+        reach = self.dependencies(factory)
+        missing = self._missing.get(factory)
+        if missing is None:
+            missing = set(self.edges(factory)[2])
+            for f in reach:
+                missing.update(self.edges(f)[2])
+            missing = self._missing[factory] = frozenset(missing)
+        return missing
+
+    def users(self, factory_name):
+        """ Return the (package name, composite name) of the composite
+        factories using a factory named factory_name, once for each
+        package containing such a factory """
+        self.update()
+        if self._users is None:
+            users = {}
+            pkgmanager = self.pkgmanager
+            for pkg in pkgmanager.get_packages():
+                for cn in pkg.values():
+                    if not cn.is_composite_node():
+                        continue
+                    names = set((f.package.name, f.name)
+                                for f in self._dependencies(cn))
+                    for pname, name in sorted(names):
+                        users.setdefault(name, []).append((pkg.name,
+                                                           cn.name))
+            self._users = users
+        return list(self._users.get(factory_name, ()))
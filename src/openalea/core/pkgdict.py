@@ -21,9 +21,10 @@ __revision__ = " $Id$ "
 
 
 def lower(item):
+    """ Return the normalized key of item """
     try:
-        item = item.lower()
-    finally:
+        return item.lower()
+    except Exception:
         return item
 
 
@@ -41,52 +42,118 @@ def protected(item):
     return "#" + item
 
 
+_get = dict.get
+_missing = object()
+
+
 class PackageDict(dict):
     """
     Dictionnary with case insensitive key
     This object is able to handle protected entry begining with an '#'
+
+    The keys are stored normalized. The protected keys are indexed by
+    their unprotected name and the number of public keys is kept up to
+    date, so that a lookup is one or two dict accesses and counting the
+    public values is free.
+
+    version is incremented each time an entry is set or removed.
     """
 
+    version = 0
+
+    def __new__(cls, *args, **kwds):
+        self = dict.__new__(cls)
+        # unprotected name -> protected key
+        self._protected = {}
+        self.nb_public = 0
+        return self
+
     def __init__(self, *args):
-        self.nb_public = None
-        dict.__init__(self, *args)
+        dict.__init__(self)
+        if args:
+            self.update(*args)
+
+    def __getstate__(self):
+        # the indexes are rebuilt when the items are restored
+        state = dict(self.__dict__)
+        state.pop('_protected', None)
+        state.pop('nb_public', None)
+        return state
 
     def __getitem__(self, item):
-        item = lower(item)
+        key = lower(item)
 
-        try:
-            return dict.__getitem__(self, item)
-        except KeyError:
+        value = _get(self, key, _missing)
+        if value is _missing:
             # Try to return protected entry
-            return dict.__getitem__(self, protected(item))
+            alias = self._protected.get(key)
+            if alias is None:
+                raise KeyError(item)
+            value = _get(self, alias)
+        return value
 
     def __setitem__(self, item, y):
-
-        # Update nb public key
-        if (self.nb_public and
-           not self.has_key(item) and
-           not is_protected(item)):
+        key = lower(item)
+        if not dict.__contains__(self, key):
+            self._add_key(key)
+        self.version += 1
+        dict.__setitem__(self, key, y)
+
+    def _add_key(self, key):
+        # Update the index of the protected keys or nb public key
+        if is_protected(key):
+            self._protected[key[1:]] = key
+        else:
             self.nb_public += 1
 
-        return dict.__setitem__(self, lower(item), y)
+    def _remove_key(self, key):
+        if is_protected(key):
+            self._protected.pop(key[1:], None)
+        else:
+            self.nb_public -= 1
 
     def __contains__(self, key):
         return self.has_key(key)
 
     def has_key(self, key):
         key = lower(key)
-        if dict.__contains__(self, key):
-            return True
-        else:
-            return dict.__contains__(self, protected(key))
-            
+        return dict.__contains__(self, key) or key in self._protected
+
     def __delitem__(self, key):
+        key = lower(key)
+        dict.__delitem__(self, key)
+        self._remove_key(key)
+        self.version += 1
 
-        # Update nb public key
-        if (self.nb_public and not is_protected(key)):
-            self.nb_public -= 1
+    def pop(self, key, *default):
+        key = lower(key)
+        if not dict.__contains__(self, key):
+            return dict.pop(self, key, *default)
+        self._remove_key(key)
+        self.version += 1
+        return dict.pop(self, key)
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        self._remove_key(key)
+        self.version += 1
+        return key, value
+
+    def setdefault(self, key, default=None):
+        key = lower(key)
+        if not dict.__contains__(self, key):
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwds):
+        for key, value in dict(*args, **kwds).items():
+            self[key] = value
 
-        return dict.__delitem__(self, lower(key))
+    def clear(self):
+        self._protected = {}
+        self.nb_public = 0
+        self.version += 1
+        dict.clear(self)
 
     def get(self, key, default=None):
         return dict.get(self, lower(key), default)
@@ -94,16 +161,16 @@ class PackageDict(dict):
     def iter_public_values(self):
         """ Iterate througth dictionnary value (remove protected value)  """
 
-        for k, v in self.items():
+        if not self._protected:
+            for v in dict.values(self):
+                yield v
+            return
+
+        for k, v in dict.items(self):
             if (not is_protected(k)):
                 yield v
 
     def nb_public_values(self):
         """ Return the number of unprotected values """
 
-        if (self.nb_public is None):
-            l = lambda x: not is_protected(x)
-            ks = filter(l, list(self.keys()))
-            self.nb_public = len(list(ks))
-
         return self.nb_public
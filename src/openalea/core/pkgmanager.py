@@ -37,11 +37,14 @@ __revision__ = " $Id$ "
 
 import sys
 import os
-from math import pow
+import gc
+import pickle
+from concurrent.futures import ThreadPoolExecutor
 from os.path import join as pj
 from os.path import isdir
 
 import tempfile
+import time
 import importlib
 import six.moves.urllib.parse
 from openalea.core.path import path
@@ -49,31 +52,31 @@ from fnmatch import fnmatch
 
 # Remove old dependency to openalea
 #from pkg_resources import iter_entry_points
-from importlib.metadata import entry_points
+# importlib.metadata, the settings and configparser are imported when the
+# wralea paths are computed (see alea --profile-startup)
 
 from openalea.core.singleton import Singleton
 from openalea.core.observer import Observed
 from openalea.core.package import (Package, UserPackage, PyPackageReader,
-                                   PyPackageReaderWralea, PyPackageReaderVlab)
-from openalea.core.settings import get_userpkg_dir, Settings
+                                   PyPackageReaderWralea, PyPackageReaderVlab,
+                                   LazyPackage)
 from openalea.core.pkgdict import PackageDict, is_protected, protected
 from openalea.core.category import PackageManagerCategory
+from openalea.core.pkgcache import PackageIndex, package_state, load_package
+from openalea.core.pkgsearch import SearchIndex
+from openalea.core.pkgdeps import DependencyGraph
 from openalea.core import logger
 
 import six
-from six.moves.configparser import NoSectionError, NoOptionError
 
 ###########################################################################
 # Exceptions
 ###########################################################################
 
-try: # PY2
-    from time import clock
-except ImportError: #PY3
-    from time import process_time as clock
-
 DEBUG = False
 SEARCH_OUTSIDE_ENTRY_POINTS = True
+# change it when the format of the snapshots changes
+SNAPSHOT_VERSION = 1
 
 
 class UnknowFileType(Exception):
@@ -133,14 +136,74 @@ class Logger(object):
         f.close()
 
 
+def _scan_dir(directory, pattern, recursive):
+    """ Return the files matching pattern and the sub directories of
+    directory """
+    files, subdirs = [], []
+    try:
+        entries = list(os.scandir(directory))
+    except OSError as e:
+        logger.warning("Unable to list directory %s: %s" % (directory, e))
+        return files, subdirs
+    for entry in entries:
+        try:
+            if entry.is_file():
+                if fnmatch(entry.name, pattern):
+                    files.append(os.path.abspath(entry.path))
+            elif recursive and entry.is_dir():
+                subdirs.append(entry.path)
+        except OSError:
+            continue
+    return files, subdirs
+
+
+def scan_directories(directories, pattern, recursive=True, max_workers=None):
+    """
+    Return the set of the files matching pattern in directories.
+
+    The directories are listed concurrently by a pool of threads: each sub
+    directory is a new task.
+    """
+    files = set()
+    visited = set()
+    with ThreadPoolExecutor(max_workers) as pool:
+        pending = set()
+        for d in directories:
+            d = os.path.realpath(d)
+            if d not in visited:
+                visited.add(d)
+                pending.add(pool.submit(_scan_dir, d, pattern, recursive))
+        while pending:
+            future = pending.pop()
+            found, subdirs = future.result()
+            files.update(found)
+            for d in subdirs:
+                # avoid the loops of symbolic links
+                if os.path.islink(d):
+                    d = os.path.realpath(d)
+                    if d in visited:
+                        continue
+                    visited.add(d)
+                pending.add(pool.submit(_scan_dir, d, pattern, recursive))
+    return files
+
+
 ###############################################################################
 
+
 class PackageManager(six.with_metaclass(Singleton, Observed)):
     """
     The PackageManager is a Dictionary of Packages
     It can locate OpenAlea packages on the system (with wralea).
     """
 
+    # register the packages of the package index as LazyPackage
+    lazy_packages = True
+
+    # number of threads used to find and prepare the wralea files
+    # (None: default of concurrent.futures)
+    max_workers = None
+
     def __init__(self, verbose=True):
         """ Constructor """
         Observed.__init__(self)
@@ -159,6 +222,18 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
         # dictionnary of packages
         self.pkgs = PackageDict()
 
+        # duration (s) of the steps of the last package discovery
+        self.timings = {}
+
+        # index of the factories for search_node
+        self.search_index = SearchIndex(self)
+
+        # dependencies of the composite nodes
+        self.dependency_graph = DependencyGraph(self)
+
+        # (token, packages, version) of the last snapshot taken or restored
+        self._snapshot = None
+
         # dictionnary of category
         self.category = PseudoGroup("")
 
@@ -208,6 +283,9 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
         if not SEARCH_OUTSIDE_ENTRY_POINTS:
             return
 
+        from configparser import NoSectionError, NoOptionError
+        from openalea.core.settings import Settings
+
         self.user_wralea_path = set()
         config = Settings()
         l = []
@@ -225,6 +303,7 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
 
     def write_config(self):
         """ Write user config """
+        from openalea.core.settings import Settings
 
         config = Settings()
         config.set("pkgmanager", "path", repr(list(self.user_wralea_path)))
@@ -242,12 +321,12 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
 
         if self.sys_wralea_path:
             return
+        from importlib.metadata import entry_points
 
         self.sys_wralea_path = set()
         self.deprecated_pkg = set()
 
-        if DEBUG:
-            res = {}
+        timings = self.timings.setdefault('entry_points', {})
         # Deprecated : Use setuptools entry_point
         # Replace by importlib metadat
         for epoint in entry_points(group="wralea"):
@@ -263,9 +342,7 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
 
             # Be careful, this lines will import __init__.py and all its predecessor
             # to find the path.
-            if DEBUG:
-                print(epoint.module)
-                t1 = clock()
+            t0 = time.perf_counter()
 
             try:
                 m = importlib.import_module(epoint.module)
@@ -274,11 +351,7 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
                 logger.error("Cannot load %s : %s" % (epoint.module, e))
                 continue
 
-            if DEBUG:
-                print((epoint.module))
-                tn = clock() - t1
-                res[tn] = epoint.module
-
+            timings[epoint.module] = time.perf_counter() - t0
 
             l = list(m.__path__)
             for p in l:
@@ -294,12 +367,10 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
 #                self.add_wralea_path(p, self.sys_wralea_path)
 
         if SEARCH_OUTSIDE_ENTRY_POINTS:
+            from openalea.core.settings import get_userpkg_dir
             self.add_wralea_path(os.path.dirname(__file__), self.sys_wralea_path)
             self.add_wralea_path(get_userpkg_dir(), self.sys_wralea_path)
 
-        if DEBUG:
-            return res
-
     def init(self, dirname=None, verbose=True):
         """ Initialize package manager
 
@@ -340,6 +411,7 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
                 p.reload()
         else:
             pkg.reload()
+            self.dependency_graph.invalidate(pkg)
             self.load_directory(pkg.path)
         self.notify_listeners("update")
 
@@ -352,6 +424,8 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
         self.pkgs = PackageDict()
         self.recover_syspath()
         self.category = PseudoGroup('Root')
+        self.search_index.clear()
+        self.dependency_graph.clear()
 
     # Path Functions
     def add_wralea_path(self, path, container):
@@ -417,7 +491,7 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
     def update_category(self, package):
         """ Update the category dictionary with package contents """
 
-        for nf in package.values():
+        for nf in package.iter_factories():
             # skip the deprecated name (starting with #)
             if is_protected(nf.name):
                 continue
@@ -524,39 +598,22 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
         :return : a list of pkgreader instances
         """
 
-        if DEBUG:
-            t0 = clock()
-
         wralea_files = set()
         if(not os.path.isdir(directory)):
             logger.warning("%s Not a directory" % repr(directory))
             # self.log.add("%s Not a directory"%repr(directory))
             return []
 
-        p = path(directory).abspath()
-
         # search for wralea.py
-        if recursive and SEARCH_OUTSIDE_ENTRY_POINTS:
-            for f in p.walkfiles("*wralea*.py"):
-                wralea_files.add(str(f))
-        else:
-            wralea_files.update(p.glob("*wralea*.py"))
+        recursive = recursive and SEARCH_OUTSIDE_ENTRY_POINTS
+        wralea_files = scan_directories([directory], "*wralea*.py", recursive,
+                                        self.max_workers)
 
-        for f in wralea_files:
+        for f in sorted(wralea_files):
             logger.info("Package Manager : found %s" % f)
             # self.log.add("Package Manager : found %s" % f)
 
-        if DEBUG:
-            t1 = clock()
-            dt = t1 - t0
-            print('search wralea files takes %f sec' % dt)
-
-        readers = list(map(self.get_pkgreader, wralea_files))
-
-        if DEBUG:
-            t2 = clock()
-            dt1 = t2 - t1
-            print('readers takes %f sec: ' % (dt1,))
+        readers = list(map(self.get_pkgreader, sorted(wralea_files)))
 
         return readers
 
@@ -620,16 +677,10 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
         :return : a list of file paths
         """
 
-        files = set()
         directories = self.get_wralea_path()
-        recursive = True
-        if not SEARCH_OUTSIDE_ENTRY_POINTS:
-            recursive = False
-        if recursive:
-            files = set(f.abspath() for p in directories for f in path(p).walkfiles('*wralea*.py'))
-        else:
-            files = set(f.abspath() for p in directories for f in path(p).glob('*wralea*.py'))
-        return files
+        recursive = SEARCH_OUTSIDE_ENTRY_POINTS
+        return scan_directories(directories, '*wralea*.py', recursive,
+                                self.max_workers)
 
     def create_readers(self, wralea_files):
         return [_f for _f in (self.get_pkgreader(f) for f in wralea_files) if _f]
@@ -653,46 +704,195 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
     def find_and_register_packages(self, no_cache=False):
         """
         Find all wralea on the system and register them
-        If no_cache is True, ignore cache file
+        If no_cache is True, ignore the package index and execute all the
+        wralea files (the index is rebuilt)
+
+        The wralea files are found and compiled concurrently, then the
+        packages are registered one by one in the order of the filenames.
+        The duration of each step is stored in self.timings.
         """
 
-#        if(no_cache):
-#            self.delete_cache()
+        # the entry points are imported once by set_sys_wralea_path
+        timings = self.timings = {
+            'entry_points': self.timings.get('entry_points', {})}
+        t0 = time.perf_counter()
         self.set_sys_wralea_path()
         self.set_user_wralea_path()
-        if DEBUG:
-            t1 = clock()
+        t1 = time.perf_counter()
+        timings['wralea_path'] = t1 - t0
 
         wralea_files = self.find_all_wralea()
-        readerlist = self.create_readers(wralea_files)
+        readerlist = sorted(self.create_readers(wralea_files),
+                            key=lambda reader: reader.filename)
+        t2 = time.perf_counter()
+        timings['find_wralea'] = t2 - t1
+
+        index = PackageIndex()
+        if not no_cache:
+            index.load()
+        self.prepare_readers(readerlist, index)
+        t3 = time.perf_counter()
+        timings['prepare'] = t3 - t2
+
+        packages = timings['packages'] = {}
+        for x in readerlist:
+            tn = time.perf_counter()
+            self.register_reader(x, index)
+            packages[x.filename] = time.perf_counter() - tn
 
-        # readerlist = self.find_wralea_files()
+        index.prune(wralea_files)
+        index.save()
+        t4 = time.perf_counter()
+        timings['register'] = t4 - t3
 
-        if DEBUG:
-            t2 = clock()
-            print('-------------------')
-            print('find_wralea_files takes %f seconds' % (t2 - t1))
+        self.rebuild_category()
+        timings['rebuild_category'] = time.perf_counter() - t4
+        timings['total'] = time.perf_counter() - t0
 
-        if DEBUG:
-            res = {}
-        for x in readerlist:
-            if DEBUG:
-                tn = clock()
-            x.register_packages(self)
-            if DEBUG:
-                tt = clock() - tn
-                print('register package ', x.get_pkg_name(), 'in ', clock() - tn)
-                res[x.filename]=tt
-        if DEBUG:
-            t3 = clock()
-            print('-------------------')
-            print('register_packages takes %f seconds' % (t3 - t2))
-#        self.save_cache()
+        pmanLogger.debug("%d wralea files found in %f s" %
+                         (len(readerlist), timings['find_wralea']))
+        for step in ('wralea_path', 'prepare', 'register',
+                     'rebuild_category', 'total'):
+            pmanLogger.debug("%s takes %f s" % (step, timings[step]))
+
+    def prepare_readers(self, readers, index=None):
+        """
+        Check the package index and compile the python wralea files which
+        are not in the index, concurrently.
+        Errors are reported when the packages are registered.
+        """
+
+        def prepare(reader):
+            if not isinstance(reader, PyPackageReader):
+                return
+            if index is not None and index.check(
+                    os.path.abspath(reader.filename)):
+                return
+            try:
+                reader.prepare()
+            except Exception:
+                pass
+
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            list(pool.map(prepare, readers))
 
+    def register_reader(self, reader, index=None):
+        """
+        Register the packages of reader.
+
+        Packages built from python wralea files are taken from the package
+        index if their file is unchanged (as lazy packages if
+        lazy_packages is True), else the wralea file is executed and the
+        index updated.
+        """
+        if index is None or not isinstance(reader, PyPackageReader):
+            return reader.register_packages(self)
+
+        pkg = index.register(reader, self, self.lazy_packages)
+        if pkg is None:
+            pkg = reader.register_packages(self)
+            index.update(reader, pkg)
+        return pkg
+
+    # Snapshot functions
+    def snapshot(self):
+        """
+        Return the registered packages as a compact serialized snapshot:
+        the wralea paths, the package metainfo and the factory
+        descriptions. Lazy packages are not loaded.
+
+        The snapshot is used to rebuild the package manager in another
+        process with restore (see init_worker).
+        """
+        packages = []
+        keys = {}
+        ids = {}
+        for key, package in self.pkgs.items():
+            i = ids.get(id(package), -1)
+            if i == -1:
+                state = package_state(package)
+                if state is None:
+                    logger.warning("Package %s is not in the snapshot" %
+                                   package.name)
+                    i = None
+                else:
+                    i = len(packages)
+                    packages.append(state)
+                ids[id(package)] = i
+            if i is not None:
+                keys[key] = i
+
+        import uuid
+        token = uuid.uuid4().hex
+        self._snapshot = (token, self.pkgs, self.pkgs.version)
+        state = dict(token=token,
+                     user_wralea_path=self.user_wralea_path,
+                     sys_wralea_path=self.sys_wralea_path,
+                     temporary_wralea_paths=self.temporary_wralea_paths,
+                     deprecated_pkg=getattr(self, 'deprecated_pkg', set()),
+                     packages=packages,
+                     keys=keys)
+        return pickle.dumps((snapshot_header(), state),
+                            pickle.HIGHEST_PROTOCOL)
+
+    def restore(self, snapshot, lazy=None):
+        """
+        Replace the packages by the ones of a snapshot without searching
+        the wralea files.
+
+        If lazy is True (default: lazy_packages), the factories are
+        created on first access.
+        """
+        header, state = pickle.loads(snapshot)
+        if header != snapshot_header():
+            raise ValueError("Incompatible package manager snapshot")
+        if lazy is None:
+            lazy = self.lazy_packages
+
+        self.clear()
+        self.user_wralea_path = set(state['user_wralea_path'])
+        self.sys_wralea_path = set(state['sys_wralea_path'])
+        self.temporary_wralea_paths = set(state['temporary_wralea_paths'])
+        self.deprecated_pkg = set(state['deprecated_pkg'])
+
+        packages = []
+        for header, factories in state['packages']:
+            try:
+                packages.append(load_package(header, factories, lazy=lazy))
+            except Exception as e:
+                logger.warning("Cannot restore a package: %s" % e)
+                packages.append(None)
+        for key, i in state['keys'].items():
+            if packages[i] is not None:
+                self.pkgs[key] = packages[i]
         self.rebuild_category()
+        self._snapshot = (state['token'], self.pkgs, self.pkgs.version)
+        self.notify_listeners("update")
 
-        if DEBUG:
-            return res
+    def is_snapshot(self, snapshot):
+        """ Return True if the packages are still the ones of snapshot,
+        e.g. in a process forked after the snapshot was taken """
+        if self._snapshot is None:
+            return False
+        token, pkgs, version = self._snapshot
+        header, state = pickle.loads(snapshot)
+        return (state['token'] == token and pkgs is self.pkgs and
+                version == self.pkgs.version)
+
+    def prepare_fork(self, load=True):
+        """
+        Prepare the package manager before forking worker processes.
+
+        If load is True, the lazy packages are loaded once for all the
+        workers. The objects are then moved to the permanent generation of
+        the garbage collector so that the workers keep sharing their
+        memory pages (copy on write).
+        """
+        if load:
+            for package in self.get_packages():
+                if isinstance(package, LazyPackage):
+                    package.load()
+        gc.freeze()
 
     # Cache functions
     # def get_cache_filename(self):
@@ -740,6 +940,7 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
 
         # Create directory
         if not path:
+            from openalea.core.settings import get_userpkg_dir
             path = get_userpkg_dir()
         path = os.path.join(path, name)
 
@@ -881,58 +1082,7 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
               in the name (close to the begining = higher score)
         """
 
-        search_str = search_str.upper()
-
-        match = []
-
-        # Search for each package and for each factory
-        for name, pkg in self.items():
-            if is_protected(name):
-                continue  # alias
-
-            for fname, factory in pkg.items():
-                if is_protected(fname): 
-                    continue  # alias
-
-                # -- The scores for each string that is explored.
-                # They are long ints because we make a 96 bits bitshift
-                # to compute the final score --
-                facNameScore = 0
-                facDescScore = 0
-                facCateScore = 0
-                pkgNameScore = 0
-
-                fname = factory.name.upper()
-                if search_str in fname:
-                    l = float(len(fname))
-                    facNameScore = int(100 * (1 - fname.index(search_str) / l))
-
-                facDescScore = int(factory.description.upper().count(search_str))
-                facCateScore = int(factory.category.upper().count(search_str))
-
-                pname = pkg.name.upper()
-                if search_str in pname:
-                    l = float(len(pname))
-                    pkgNameScore = int(100 * (1 - pname.index(search_str) / l))
-                # A left shift by n bits is equivalent to multiplication by pow(2, n)
-                score = (int(facNameScore * pow(2, 32 * 3)) | int(facDescScore * pow(2, 32 * 2)) | 
-                         int(facCateScore * pow(2, 32 * 1)) | pkgNameScore)
-                if score > 0:
-                    match.append((score, factory))
-
-        # Filter ports
-        if(nb_inputs >= 0):
-            match = [sc_x for sc_x in match if sc_x[1] and sc_x[1].inputs and len(sc_x[1].inputs) == nb_inputs]
-        if(nb_outputs >= 0):
-            match = [sc_x for sc_x in match if sc_x[1] and sc_x[1].outputs and len(sc_x[1].outputs) == nb_outputs]
-
-        if not len(match):
-            return match
-
-        match.sort(key=lambda score:score[0], reverse=True)
-        match = list(zip(*match))[1]
-
-        return match
+        return self.search_index.search(search_str, nb_inputs, nb_outputs)
 
     ####################################################################################
     # Methods to introspect globally the PkgManager
@@ -970,47 +1120,6 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
         nf = [f for p in pkgs for f in p.values() if f.is_node()]
         return nf
 
-    def _dependencies(self, factory):
-        f = factory
-        if not f.is_composite_node():
-            return
-
-        for p, n in f.elt_factory.values():
-            if is_protected(p) or is_protected(n):
-                continue
-            try:
-                fact = self[p][n]
-            except:
-                # print p, n
-                continue
-            yield fact
-
-            for df in self._dependencies(fact):
-                yield df
-
-    def _missing_dependencies(self, factory, l=[]):
-
-        f = factory
-        if not f.is_composite_node():
-            return
-
-        for p, n in f.elt_factory.values():
-            if is_protected(p) or is_protected(n):
-                continue
-            try:
-                fact = self[p][n]
-            except:
-                l.append((p, n))
-                continue
-            yield fact
-
-            for df in self._missing_dependencies(fact, l):
-                yield df
-
-    def _missing(self, factory, l=[]):
-        list(self._missing_dependencies(factory, l))
-        return l
-
     def missing_dependencies(self, package_or_factory=None):
         """ Return all the dependencies of a package or a factory. """
         f = package_or_factory
@@ -1042,13 +1151,16 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
 
     def _pkg_dependencies(self, package):
         cns = [f for f in package.values() if f.is_composite_node()]
+        graph = self.dependency_graph
         factories = set(
-            (f.package.name, f.name) for cn_factory in cns for f in self._dependencies(cn_factory) 
+            (f.package.name, f.name) for cn_factory in cns
+            for f in graph.dependencies(cn_factory)
             if f.package.name != package.name)
         return sorted(factories)
 
     def _cn_dependencies(self, factory):
-        factories = set((f.package.name, f.name) for f in self._dependencies(factory))
+        factories = set((f.package.name, f.name)
+                        for f in self.dependency_graph.dependencies(factory))
         return sorted(factories)
 
     def _all_missing_dependencies(self):
@@ -1061,17 +1173,15 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
 
     def _missing_pkg_dependencies(self, package):
         cns = [f for f in package.values() if f.is_composite_node()]
-        l = []
+        factories = set()
         for cn in cns:
-            self._missing(cn, l)
-        factories = set(l)
+            factories.update(self.dependency_graph.missing(cn))
         if factories:
             return sorted(factories)
         return None
 
     def _missing_cn_dependencies(self, factory):
-        l = []
-        factories = set(self._missing(factory, l))
+        factories = self.dependency_graph.missing(factory)
         if factories:
             return sorted(factories)
         return None
@@ -1081,13 +1191,30 @@ class PackageManager(six.with_metaclass(Singleton, Observed)):
 
         return a list of factory.
         """
-        res = []
-        for pkg in self.get_packages():
-            cns = [f for f in pkg.values() if f.is_composite_node()]
-            res.extend(
-                (pkg.name, cn.name) for cn in cns for pname, name in self._cn_dependencies(cn) 
-                if name == factory_name)
-        return res
+        return self.dependency_graph.users(factory_name)
+
+def snapshot_header():
+    """ Validity of a snapshot of the package manager """
+    from openalea.core import version
+    return (SNAPSHOT_VERSION, tuple(sys.version_info[:2]),
+            version.__version__)
+
+
+def init_worker(snapshot):
+    """
+    Initializer of the worker processes using the package manager:
+
+        pool = multiprocessing.Pool(initializer=init_worker,
+                                    initargs=(pkgman.snapshot(),))
+
+    The package manager of the worker is restored from the snapshot,
+    unless the worker has been forked with the packages of the snapshot.
+    """
+    pkgman = PackageManager()
+    if not pkgman.is_snapshot(snapshot):
+        pkgman.restore(snapshot)
+    return pkgman
+
 
 def cmp(x, y):
     """
@@ -1137,6 +1264,9 @@ class PseudoGroup(PackageDict):
             # if value is a dict we include sub nodes
             self.item = value
             try:
+                # factories (and factory stubs) are not dicts
+                if not isinstance(value, dict):
+                    raise TypeError(value)
                 for k, v in value.items():
                     self[k] = v
             except:
@@ -0,0 +1,265 @@
+# -*- python -*-
+#
+#       OpenAlea.Core
+#
+#       Copyright 2006-2009 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Search index of the factories of the package manager.
+
+The index maps the trigrams of the factory name, description, category
+and package name to the factories containing them. A query only scores
+the factories containing all the trigrams of the search string.
+
+The index is updated incrementally: the packages whose version (see
+PackageDict) or name changed since the last query are indexed again.
+The results of the last queries are kept until the index is updated.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from openalea.core.pkgdict import is_protected
+from openalea.core.package import FactoryStub
+
+# length of the indexed substrings
+NGRAM = 3
+
+# maximum number of cached query results
+MAX_RESULTS = 256
+
+# bound of the position of the packages and factories (tie order)
+_MAX_RANK = (1 << 32) - 1
+
+
+def ngrams(text, n=NGRAM):
+    """ Return the set of the substrings of length n of text """
+    return set(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def _upper(text):
+    try:
+        return text.upper()
+    except AttributeError:
+        return ''
+
+
+class _Document(object):
+    """ Indexed metadata of a factory """
+
+    __slots__ = ('package', 'rank', 'name', 'description', 'category',
+                 'factory')
+
+    def __init__(self, package, rank, factory):
+        self.package = package
+        self.rank = rank
+        self.name = _upper(factory.name)
+        self.description = _upper(factory.description)
+        self.category = _upper(factory.category)
+        self.factory = factory
+
+    def get_factory(self):
+        """ Return the factory (load the package of a stub) """
+        factory = self.factory
+        if isinstance(factory, FactoryStub):
+            factory = self.factory = factory.get_factory()
+        return factory
+
+    def text(self):
+        return (self.name, self.description, self.category)
+
+
+class SearchIndex(object):
+    """
+    Inverted index of the factories of a package manager.
+
+    search has the same results (and order) as a full scan of the
+    factories (see PackageManager.search_node).
+    """
+
+    def __init__(self, pkgmanager):
+        self.pkgmanager = pkgmanager
+        self.clear()
+
+    def clear(self):
+        """ Remove all the indexed factories """
+        # doc id -> _Document (None for removed documents)
+        self.documents = []
+        self._free_ids = []
+        # trigram -> set of doc ids
+        self.postings = {}
+        # package key -> (package, version, name, upper name, doc ids)
+        self.packages = {}
+        # package key -> position in the package manager
+        self.package_rank = {}
+        # indexed package dict and its version
+        self._pkgs = None
+        self._version = None
+        # (search_str, nb_inputs, nb_outputs) -> result
+        self._results = {}
+
+    # Update
+
+    def add_package(self, key, package):
+        """ Index the factories of package registered with key """
+        self.remove_package(key)
+        self._results.clear()
+        pkgname = _upper(package.name)
+        # factories of the package which are not loaded
+        if hasattr(package, 'is_loaded') and not package.is_loaded():
+            factories = [(stub.name, stub) for stub in package.stubs]
+        else:
+            factories = list(package.items())
+
+        doc_ids = []
+        for fname, factory in factories:
+            if is_protected(fname):
+                continue  # alias
+            if is_protected(factory.name):
+                continue  # deprecated factory of a lazy package
+            doc = _Document(key, len(doc_ids), factory)
+            if self._free_ids:
+                doc_id = self._free_ids.pop()
+                self.documents[doc_id] = doc
+            else:
+                doc_id = len(self.documents)
+                self.documents.append(doc)
+            doc_ids.append(doc_id)
+
+            grams = set()
+            for text in doc.text() + (pkgname,):
+                grams.update(ngrams(text))
+            for gram in grams:
+                self.postings.setdefault(gram, set()).add(doc_id)
+
+        self.packages[key] = (package, getattr(package, 'version', 0),
+                              package.name, pkgname, doc_ids)
+
+    def remove_package(self, key):
+        """ Remove the factories of the package registered with key """
+        entry = self.packages.pop(key, None)
+        if entry is None:
+            return
+        self._results.clear()
+        pkgname = entry[3]
+        for doc_id in entry[4]:
+            doc = self.documents[doc_id]
+            self.documents[doc_id] = None
+            self._free_ids.append(doc_id)
+            grams = set()
+            for text in doc.text() + (pkgname,):
+                grams.update(ngrams(text))
+            for gram in grams:
+                ids = self.postings[gram]
+                ids.discard(doc_id)
+                if not ids:
+                    del self.postings[gram]
+
+    def update(self):
+        """ Index the packages modified since the last update """
+        pkgs = self.pkgmanager.pkgs
+        version = getattr(pkgs, 'version', None)
+        if pkgs is not self._pkgs or version != self._version:
+            self._pkgs = pkgs
+            self._version = version
+            self._results.clear()
+            self.package_rank = {}
+            for key in list(pkgs.keys()):
+                if not is_protected(key):
+                    self.package_rank[key] = len(self.package_rank)
+            for key in list(self.packages):
+                if key not in self.package_rank:
+                    self.remove_package(key)
+
+        for key in self.package_rank:
+            package = pkgs[key]
+            entry = self.packages.get(key)
+            if (entry is None or entry[0] is not package or
+                    entry[1] != getattr(package, 'version', 0) or
+                    entry[2] != package.name):
+                self.add_package(key, package)
+
+    # Query
+
+    def candidates(self, search_str):
+        """ Return the ids of the documents which may contain search_str """
+        if len(search_str) < NGRAM:
+            return [i for i, doc in enumerate(self.documents)
+                    if doc is not None]
+        postings = []
+        for gram in ngrams(search_str):
+            ids = self.postings.get(gram)
+            if not ids:
+                return ()
+            postings.append(ids)
+        postings.sort(key=len)
+        return set.intersection(*postings)
+
+    def search(self, search_str, nb_inputs=-1, nb_outputs=-1):
+        """
+        Return the list of the factories corresponding to search_str.
+        See PackageManager.search_node.
+        """
+        self.update()
+        search_str = search_str.upper()
+        query = (search_str, nb_inputs, nb_outputs)
+        result = self._results.get(query)
+        if result is not None:
+            return result or []
+
+        rank = self.package_rank
+        packages = self.packages
+        documents = self.documents
+
+        match = []
+        for doc_id in self.candidates(search_str):
+            doc = documents[doc_id]
+
+            facNameScore = 0
+            pkgNameScore = 0
+
+            fname = doc.name
+            i = fname.find(search_str)
+            if i >= 0:
+                facNameScore = int(100 * (1 - i / float(len(fname))))
+
+            facDescScore = doc.description.count(search_str)
+            facCateScore = doc.category.count(search_str)
+
+            pname = packages[doc.package][3]
+            i = pname.find(search_str)
+            if i >= 0:
+                pkgNameScore = int(100 * (1 - i / float(len(pname))))
+
+            # A left shift by n bits is equivalent to multiplication by
+            # pow(2, n)
+            score = ((facNameScore << 96) | (facDescScore << 64) |
+                     (facCateScore << 32) | pkgNameScore)
+            if score > 0:
+                # same order as a scan of the packages for equal scores
+                order = ((_MAX_RANK - rank[doc.package]) << 32 |
+                         (_MAX_RANK - doc.rank))
+                match.append(((score << 64) | order, doc_id))
+
+        match.sort(reverse=True)
+        factories = [documents[doc_id].get_factory() for key, doc_id in match]
+
+        # Filter ports
+        if(nb_inputs >= 0):
+            factories = [f for f in factories
+                         if f and f.inputs and len(f.inputs) == nb_inputs]
+        if(nb_outputs >= 0):
+            factories = [f for f in factories
+                         if f and f.outputs and len(f.outputs) == nb_outputs]
+
+        result = tuple(factories)
+        if len(self._results) >= MAX_RESULTS:
+            self._results.clear()
+        self._results[query] = result
+        return result or []
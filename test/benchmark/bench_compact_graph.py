@@ -0,0 +1,49 @@
+"""Memory used by the dataflow implementations.
+
+Build chains of vertices with one input and one output port and report
+the memory allocated for the DataFlow and the CompactDataFlow.
+
+usage: python bench_compact_graph.py [nb_vertices ...]
+"""
+from __future__ import print_function
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import sys
+import time
+import tracemalloc
+
+from openalea.core.dataflow import DataFlow, CompactDataFlow
+
+
+def chain(cls, n):
+    df = cls()
+    prev = None
+    for i in range(n):
+        vid = df.add_vertex()
+        pid = df.add_in_port(vid, 0)
+        if prev is not None:
+            df.connect(prev, pid)
+        prev = df.add_out_port(vid, 0)
+    # build the adjacency of the compact graph
+    list(df.in_edges(vid))
+    return df
+
+
+def main(sizes):
+    print("%-16s %10s %12s %10s" % ("dataflow", "vertices", "memory (KiB)",
+                                    "time"))
+    for n in sizes:
+        for cls in (DataFlow, CompactDataFlow):
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            df = chain(cls, n)
+            t = time.perf_counter() - t0
+            memory = tracemalloc.get_traced_memory()[0] // 1024
+            tracemalloc.stop()
+            print("%-16s %10d %12d %10.4f" % (cls.__name__, n, memory, t))
+            del df
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
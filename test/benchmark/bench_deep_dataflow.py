@@ -0,0 +1,76 @@
+"""Benchmark of the evaluation of long chains of nodes.
+
+Compare the iterative execution of the traversals (explicit stack) with the
+recursive one. The recursion limit is raised for the recursive runs.
+
+usage: python bench_deep_dataflow.py [size ...]
+"""
+from __future__ import print_function
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import sys
+import time
+
+from openalea.core.compositenode import CompositeNode
+from openalea.core.node import FuncNode
+from openalea.core.algo import dataflow_evaluation as algo
+
+EVALUATORS = ("BrutEvaluation", "GeneratorEvaluation", "LambdaEvaluation",
+              "DiscreteTimeEvaluation")
+
+
+def incr(x):
+    return x + 1
+
+
+def chain(n):
+    """ Return a composite node with n chained nodes """
+    cn = CompositeNode()
+    prev = None
+    for i in range(n):
+        node = FuncNode([dict(name='x')], [dict(name='out')], incr)
+        node.set_input(0, 0)
+        vid = cn.add_node(node)
+        if prev is not None:
+            cn.connect(prev, 0, vid, 0)
+        prev = vid
+    return cn, prev
+
+
+def run(name, cn, vid, iterative, repeat=5):
+    """ Return the best evaluation time of the dataflow """
+    evaluator = getattr(algo, name)(cn)
+    evaluator.iterative = iterative
+    # a blocked leaf without output is evaluated by a traversal of the
+    # parents rather than by the replay of the evaluation plan
+    cn.node(vid).block = name in ("BrutEvaluation", "LambdaEvaluation")
+    best = None
+    for i in range(repeat):
+        cn.node(vid).outputs[0] = None
+        t0 = time.perf_counter()
+        evaluator.eval()
+        t = time.perf_counter() - t0
+        best = t if best is None else min(best, t)
+    return best
+
+
+def main(sizes):
+    print("%-24s %8s %12s %12s" % ("evaluator", "nodes", "iterative", "recursive"))
+    for n in sizes:
+        cn, vid = chain(n)
+        for name in EVALUATORS:
+            iterative = run(name, cn, vid, True)
+            limit = sys.getrecursionlimit()
+            sys.setrecursionlimit(max(limit, 2 * n + 1000))
+            try:
+                recursive = "%12.4f" % run(name, cn, vid, False)
+            except RecursionError:
+                recursive = "%12s" % "overflow"
+            finally:
+                sys.setrecursionlimit(limit)
+            print("%-24s %8d %12.4f %s" % (name, n, iterative, recursive))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 20000])
@@ -0,0 +1,105 @@
+"""Benchmark of the id generators of the graphs.
+
+Build dataflows with explicit vertex and port ids given in a random order
+(like the instantiation of a CompositeNodeFactory), then remove and add
+back half of the vertices. The previous list based generator is given for
+comparison on the smallest graphs.
+
+usage: python bench_id_generator.py [nb_ports ...]
+"""
+from __future__ import print_function
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import random
+import sys
+import time
+
+from openalea.core.dataflow import DataFlow
+from openalea.core.graph.id_generator import IdGenerator
+
+# maximum number of ports for the list based generator
+LIST_MAX = 20000
+
+
+class ListIdGenerator(object):
+    """ Previous implementation, linear in the number of free ids """
+
+    def __init__(self):
+        self._id_max = 0
+        self._id_list = []
+
+    def get_id(self, id=None):
+        if id is None:
+            if len(self._id_list) == 0:
+                ret = self._id_max
+                self._id_max += 1
+                return ret
+            else:
+                return self._id_list.pop()
+        else:
+            if id >= self._id_max:
+                self._id_list.extend(list(range(self._id_max, id)))
+                self._id_max = id + 1
+                return id
+            else:
+                try:
+                    ind = self._id_list.index(id)
+                    del self._id_list[ind]
+                    return id
+                except ValueError:
+                    raise IndexError("id %d already used" % id)
+
+    def release_id(self, id):
+        if id > self._id_max:
+            raise IndexError("id out of range")
+        elif id in self._id_list:
+            raise IndexError("id already not used")
+        else:
+            self._id_list.append(id)
+
+
+def build(nb_ports, generator):
+    """ Return the time to build and modify a dataflow with nb_ports """
+    nb_vertices = nb_ports // 4
+    rnd = random.Random(0)
+    vids = list(range(nb_vertices))
+    rnd.shuffle(vids)
+    pids = list(range(nb_vertices * 4))
+    rnd.shuffle(pids)
+
+    t0 = time.perf_counter()
+    df = DataFlow()
+    df._vid_generator = generator()
+    df._eid_generator = generator()
+    df._pid_generator = generator()
+    for i, vid in enumerate(vids):
+        df.add_vertex(vid)
+        for j in range(3):
+            df.add_in_port(vid, j, pids[4 * i + j])
+        df.add_out_port(vid, 0, pids[4 * i + 3])
+
+    removed = vids[::2]
+    for vid in removed:
+        df.remove_vertex(vid)
+    for vid in removed:
+        vid = df.add_vertex()
+        for j in range(3):
+            df.add_in_port(vid, j)
+        df.add_out_port(vid, 0)
+    return time.perf_counter() - t0
+
+
+def main(sizes):
+    print("%10s %12s %12s" % ("ports", "set+stack", "list"))
+    for n in sizes:
+        t = build(n, IdGenerator)
+        if n <= LIST_MAX:
+            ref = "%12.4f" % build(n, ListIdGenerator)
+        else:
+            ref = "%12s" % "skipped"
+        print("%10d %12.4f %s" % (n, t, ref))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 20000, 100000])
@@ -0,0 +1,64 @@
+"""Benchmark of the instantiation of a composite node factory.
+
+Create a chain of nodes with stored input values, then time
+CompositeNodeFactory.instantiate and instantiate_many (template).
+
+usage: python bench_instantiate.py [nb_nodes ...]
+"""
+from __future__ import print_function
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import sys
+import timeit
+
+from openalea.core.pkgmanager import PackageManager
+from openalea.core.package import Package
+from openalea.core.node import NodeFactory
+from openalea.core.compositenode import CompositeNodeFactory
+
+# instances per measure
+NB_INSTANCES = 20
+
+
+def build(pkgman, n):
+    pkg = Package("bench_instantiate", {}, ".")
+    pkg.add_factory(NodeFactory(
+        name="plus", nodemodule="operator", nodeclass="add",
+        inputs=[dict(name="a", value=0), dict(name="b", value=0)],
+        outputs=[dict(name="out")]))
+
+    # vids 0 and 1 are the input and output nodes
+    vids = range(2, n + 2)
+    cn = CompositeNodeFactory(
+        "cn%d" % n,
+        elt_factory=dict((i, ("bench_instantiate", "plus")) for i in vids),
+        elt_data=dict([(i, dict(posx=i, posy=0, caption="plus"))
+                       for i in vids] +
+                      [("__in__", {}), ("__out__", {})]),
+        elt_value=dict((i, [(0, "[1, 'x']"), (1, "[2.5]")]) for i in vids),
+        elt_connections=dict((i, (i, 0, i + 1, 1)) for i in vids[:-1]))
+    pkg.add_factory(cn)
+    pkgman.add_package(pkg)
+    return cn
+
+
+def best(f):
+    return min(timeit.repeat(f, number=1, repeat=5)) / NB_INSTANCES * 1000
+
+
+def main(sizes):
+    pkgman = PackageManager()
+    print("%10s %18s %18s" % ("nodes", "instantiate (ms)",
+                              "template (ms)"))
+    for n in sizes:
+        cn = build(pkgman, n)
+        t_instantiate = best(
+            lambda: [cn.instantiate() for i in range(NB_INSTANCES)])
+        t_template = best(lambda: cn.instantiate_many(NB_INSTANCES))
+        print("%10d %18.3f %18.3f" % (n, t_instantiate, t_template))
+    del pkgman["bench_instantiate"]
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10, 100])
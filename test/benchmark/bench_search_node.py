@@ -0,0 +1,103 @@
+"""Benchmark of PackageManager.search_node.
+
+Register packages of generated factories, then time the queries with the
+search index and with the previous scan of all the factories.
+
+usage: python bench_search_node.py [nb_factories ...]
+"""
+from __future__ import print_function
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import random
+import sys
+import time
+
+from openalea.core.pkgmanager import PackageManager
+from openalea.core.package import Package
+from openalea.core.node import NodeFactory
+from openalea.core.pkgdict import is_protected
+
+WORDS = ("read write image filter mesh plant leaf root tree sum mean "
+         "signal graph random sort split merge convert display plot "
+         "simulate grow light water soil").split()
+
+QUERIES = ["tree", "mesh filter", "ro", "convert", "xyz", "plant", "s"]
+
+# factories per package
+PKG_SIZE = 100
+
+
+def build(pkgman, n):
+    rnd = random.Random(0)
+    for i in range(n // PKG_SIZE):
+        pkg = Package("bench_search_%d" % i, {}, ".")
+        for j in range(PKG_SIZE):
+            pkg.add_factory(NodeFactory(
+                name="%s_%s_%d" % (rnd.choice(WORDS), rnd.choice(WORDS), j),
+                description=" ".join(rnd.choice(WORDS) for k in range(12)),
+                category=rnd.choice(WORDS),
+                inputs=[dict(name="in%d" % k)
+                        for k in range(rnd.randint(0, 3))]))
+        pkgman.add_package(pkg)
+
+
+def scan(pkgman, search_str):
+    """ Previous implementation: score all the factories """
+    search_str = search_str.upper()
+    match = []
+    for name, pkg in pkgman.items():
+        if is_protected(name):
+            continue
+        for fname, factory in pkg.items():
+            if is_protected(fname):
+                continue
+            facNameScore = 0
+            pkgNameScore = 0
+            fname = factory.name.upper()
+            if search_str in fname:
+                l = float(len(fname))
+                facNameScore = int(100 * (1 - fname.index(search_str) / l))
+            facDescScore = int(factory.description.upper().count(search_str))
+            facCateScore = int(factory.category.upper().count(search_str))
+            pname = pkg.name.upper()
+            if search_str in pname:
+                l = float(len(pname))
+                pkgNameScore = int(100 * (1 - pname.index(search_str) / l))
+            score = (int(facNameScore * pow(2, 32 * 3)) |
+                     int(facDescScore * pow(2, 32 * 2)) |
+                     int(facCateScore * pow(2, 32 * 1)) | pkgNameScore)
+            if score > 0:
+                match.append((score, factory))
+    match.sort(key=lambda score: score[0], reverse=True)
+    return [f for s, f in match]
+
+
+def timeit(f, *args):
+    t0 = time.perf_counter()
+    res = f(*args)
+    return (time.perf_counter() - t0) * 1000, len(res)
+
+
+def main(sizes):
+    pkgman = PackageManager()
+    for n in sizes:
+        pkgman.clear()
+        build(pkgman, n)
+
+        t0 = time.perf_counter()
+        pkgman.search_index.update()
+        print("%d factories, index built in %.3f s" %
+              (n, time.perf_counter() - t0))
+        print("%12s %10s %12s %12s" % ("query", "results", "index (ms)",
+                                       "scan (ms)"))
+        for q in QUERIES:
+            t_index, nb = timeit(pkgman.search_node, q)
+            t_scan, nb_scan = timeit(scan, pkgman, q)
+            assert nb == nb_scan
+            print("%12s %10d %12.3f %12.3f" % (q, nb, t_index, t_scan))
+    pkgman.clear()
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000])
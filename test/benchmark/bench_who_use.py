@@ -0,0 +1,64 @@
+"""Benchmark of the dependency analysis of the package manager.
+
+Register packages of composite node factories using random composites
+registered before them, then run who_use for all the factories.
+
+usage: python bench_who_use.py [nb_composites ...]
+"""
+from __future__ import print_function
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import random
+import sys
+import time
+
+from openalea.core.pkgmanager import PackageManager
+from openalea.core.package import Package
+from openalea.core.node import NodeFactory
+from openalea.core.compositenode import CompositeNodeFactory
+
+# composites per package
+PKG_SIZE = 100
+# nodes per composite
+NB_NODES = 4
+
+
+def build(pkgman, n):
+    rnd = random.Random(0)
+    names = []
+    for i in range(n // PKG_SIZE):
+        pkg = Package("bench_deps_%d" % i, {}, ".")
+        pkg.add_factory(NodeFactory(name="leaf"))
+        for j in range(PKG_SIZE):
+            elements = [(pkg.name, "leaf")]
+            elements += [rnd.choice(names) for k in range(NB_NODES - 1)
+                         if names]
+            pkg.add_factory(CompositeNodeFactory(
+                "cn%d" % j, elt_factory=dict(enumerate(elements))))
+        names.extend((pkg.name, "cn%d" % j) for j in range(PKG_SIZE))
+        pkgman.add_package(pkg)
+    return names
+
+
+def main(sizes):
+    pkgman = PackageManager()
+    print("%12s %12s %12s" % ("composites", "first (s)", "next (ms)"))
+    for n in sizes:
+        pkgman.clear()
+        names = build(pkgman, n)
+
+        t0 = time.perf_counter()
+        pkgman.who_use("leaf")
+        t_first = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for pname, name in names:
+            pkgman.who_use(name)
+        t_next = (time.perf_counter() - t0) / len(names)
+        print("%12d %12.3f %12.3f" % (n, t_first, t_next * 1000))
+    pkgman.clear()
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [500, 2000])
@@ -3,6 +3,8 @@ from os.path import dirname, exists
 from shutil import rmtree
 from time import sleep
 
+from openalea.core.node import FuncNode
+
 
 def test_dir():
     """Return path of test directory
@@ -34,3 +36,22 @@ def ensure_path(pth):
     if not exists(dname):
         ensure_path(dname)
         mkdir(dname)
+
+
+def value(x):
+    return x
+
+
+def unary(func, x=None):
+    """Return a FuncNode calling func with its input 'a' (set to x if given)
+    """
+    node = FuncNode([dict(name='a')], [dict(name='out')], func)
+    if x is not None:
+        node.set_input(0, x)
+    return node
+
+
+def binary(func):
+    """Return a FuncNode calling func with its inputs 'a' and 'b'
+    """
+    return FuncNode([dict(name='a'), dict(name='b')], [dict(name='out')], func)
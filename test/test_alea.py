@@ -0,0 +1,70 @@
+"""Test the alea command line"""
+from __future__ import absolute_import
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import os
+
+from six import StringIO
+
+from openalea.core.alea import parse_import_times, profile_startup, profile_run
+from openalea.core.pkgmanager import PackageManager
+from openalea.core.package import Package
+from openalea.core.node import NodeFactory
+from openalea.core.compositenode import CompositeNodeFactory
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       450 |       2217 |   os
+import time:        70 |       2800 | openalea.core.alea
+"""
+
+
+def test_parse_import_times():
+    assert parse_import_times(IMPORTTIME) == [(120, 120, '_io'),
+                                              (2217, 450, 'os'),
+                                              (2800, 70, 'openalea.core.alea')]
+    assert parse_import_times("no import") == []
+
+
+def test_profile_startup():
+    out = StringIO()
+    pm = profile_startup(limit=5, out=out)
+    try:
+        text = out.getvalue()
+        assert text.startswith('Imports:')
+        assert 'Package manager' in text
+        assert 'total' in pm.timings
+    finally:
+        pm.clear()
+
+
+def test_profile_run(tmp_path):
+    pkg = Package("profile_pkg", {}, ".")
+    pkg.add_factory(NodeFactory(
+        name="plus", nodemodule="operator", nodeclass="add",
+        inputs=[dict(name="a", value=1), dict(name="b", value=2)],
+        outputs=[dict(name="out")]))
+    pkg.add_factory(CompositeNodeFactory(
+        "cn", outputs=[dict(name="out")],
+        elt_factory={2: ("profile_pkg", "plus"), 3: ("profile_pkg", "plus")},
+        elt_data={2: {}, 3: {}, "__in__": {}, "__out__": {}},
+        elt_connections={0: (2, 0, 3, 0), 1: (3, 0, "__out__", 0)}))
+    pm = PackageManager()
+    pm.add_package(pkg)
+
+    try:
+        out = StringIO()
+        prefix = str(tmp_path / 'profile')
+        profiler = profile_run(("profile_pkg", "cn"), {}, pm=pm,
+                               prefix=prefix, out=out)
+        text = out.getvalue()
+        assert text.startswith('[5]')
+        assert 'evaluator overhead' in text
+        assert '3:plus' in text
+        assert len(profiler.stats) == 3
+        assert os.path.exists(prefix + '.folded')
+        assert os.path.exists(prefix + '.csv')
+    finally:
+        del pm["profile_pkg"]
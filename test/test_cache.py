@@ -0,0 +1,230 @@
+"""Test the memoization of the node outputs"""
+from __future__ import absolute_import
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import os
+import time
+
+from openalea.core.node import Node, FuncNode, NodeFactory
+from openalea.core.cache import LRUCache, DiskCache, fingerprint, bypass
+from openalea.core.factory_decorator import factory
+from openalea.core.compositenode import CompositeNode
+
+calls = []
+
+
+def square(x):
+    calls.append(x)
+    return x * x
+
+
+def cached_node(cache):
+    node = FuncNode([dict(name='x')], [dict(name='out')], square)
+    node.cache = cache
+    return node
+
+
+def test_fingerprint():
+    assert fingerprint([1, [2, 3]]) == fingerprint([1, [2, 3]])
+    assert fingerprint([1]) != fingerprint([1.])
+    assert fingerprint([lambda: None]) is None
+
+
+def test_memoize():
+    del calls[:]
+    cache = LRUCache()
+    cn = CompositeNode()
+    vids = [cn.add_node(cached_node(cache)) for i in range(3)]
+    for vid in vids:
+        cn.node(vid).set_input(0, 4)
+    cn.eval_as_expression()
+    assert [cn.node(vid).get_output(0) for vid in vids] == [16] * 3
+    assert calls == [4]
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (2, 1, 1)
+
+    algo = cn.get_eval_algo()
+    algo.use_cache = False
+    cn.reset()
+    for vid in vids:
+        cn.node(vid).set_input(0, 4)
+    cn.eval_as_expression()
+    assert calls == [4] * 4
+
+
+def test_not_digestable():
+    cache = LRUCache()
+    node = cached_node(cache)
+    node.func = lambda f: f
+    node.set_input(0, lambda: None)
+    node.eval()
+    assert cache.stats()['skipped'] == 1
+    assert len(cache) == 0
+
+
+class Scale(Node):
+    """ Node class whose outputs depend on an attribute """
+
+    def __init__(self, factor):
+        Node.__init__(self, [dict(name='x')], [dict(name='out')])
+        self.factor = factor
+
+    def __call__(self, inputs):
+        return (self.factor * inputs[0],)
+
+
+def test_node_class():
+    cache = LRUCache()
+    nodes = []
+    for factor in (2, 3, 2):
+        node = Scale(factor)
+        node.cache = cache
+        node.set_input(0, 5)
+        nodes.append(node)
+
+    # without factory, the node class is not cached
+    nodes[2].eval()
+    assert cache.stats()['skipped'] == 1 and len(cache) == 0
+
+    # the nodes of different factories do not share the outputs
+    for node, name in zip(nodes[:2], ('double', 'triple')):
+        node.factory = NodeFactory(name)
+        node.eval()
+    assert [node.get_output(0) for node in nodes] == [10, 15, 10]
+    assert len(cache) == 2
+
+
+def test_eviction():
+    cache = LRUCache(max_entries=2)
+    for i in range(3):
+        cache.put(i, i)
+    assert 0 not in cache and 2 in cache
+    cache.get(1)
+    cache.put(3, 3)
+    assert 1 in cache and 2 not in cache
+    assert cache.stats()['evictions'] == 2
+
+    cache = LRUCache(max_bytes=1000)
+    cache.put('small', 1)
+    cache.put('big', b' ' * 2000)
+    assert 'small' in cache and 'big' not in cache
+    cache.put('medium', b' ' * 950)
+    assert 'small' not in cache and 'medium' in cache
+
+
+def test_factory():
+    f = NodeFactory('square', inputs=[dict(name='x')],
+                    nodemodule='test_cache', nodeclass='square',
+                    search_path=[os.path.dirname(__file__)], cache=True)
+    for i in range(2):
+        node = f.instantiate()
+        node.set_input(0, 12345)
+        node.eval()
+        assert node.get_output(0) == 12345 ** 2
+    # the factory module has its own list of calls
+    assert node.func.__globals__['calls'] == [12345]
+
+
+def square_factory(cache):
+    return NodeFactory('square', inputs=[dict(name='x')],
+                       nodemodule='test_cache', nodeclass='square',
+                       search_path=[os.path.dirname(__file__)], cache=cache)
+
+
+def eval_square(factory, x):
+    node = factory.instantiate()
+    node.set_input(0, x)
+    node.eval()
+    assert node.get_output(0) == x * x
+    return node.func.__globals__['calls']
+
+
+def test_disk(tmp_path):
+    factory = square_factory(DiskCache(str(tmp_path)))
+    calls = eval_square(factory, 3)
+    n = len(calls)
+
+    # another session
+    factory = square_factory(DiskCache(str(tmp_path)))
+    eval_square(factory, 3)
+    assert len(calls) == n
+    assert factory.cache.stats()['hits'] == 1
+
+    # the source of the factory has changed
+    factory.src_cache = "def square(x):\n    return x ** 2\n"
+    eval_square(factory, 3)
+    assert len(calls) == n + 1
+
+    with bypass():
+        eval_square(factory, 3)
+    assert len(calls) == n + 2
+    assert len(factory.cache) == 2
+
+
+def test_disk_eviction(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=3000)
+    for i in range(5):
+        cache.put('%02d' % i, b' ' * 1000)
+        time.sleep(0.01)
+    assert len(cache) < 3
+    assert '04' in cache and '00' not in cache
+    assert cache.stats()['evictions'] >= 3
+
+    cache = DiskCache(str(tmp_path), ttl=0.)
+    assert cache.get('04') is None
+    assert '04' not in cache
+
+
+def test_disk_ttl(tmp_path):
+    cache = DiskCache(str(tmp_path), ttl=0.3)
+    cache.put('aa', 1)
+    cache.put('bb', 2)
+    time.sleep(0.2)
+    assert cache.get('aa') == 1
+    time.sleep(0.15)
+    # reading an entry does not make it younger
+    cache.evict()
+    assert 'aa' not in cache and 'bb' not in cache
+
+    # the least recently read entries are evicted first
+    cache = DiskCache(str(tmp_path), max_bytes=3000)
+    for key in ('00', '01', '02'):
+        cache.put(key, b' ' * 900)
+        time.sleep(0.01)
+    cache.get('00')
+    cache.put('03', b' ' * 900)
+    assert '00' in cache and '01' not in cache
+
+
+def test_disk_source(tmp_path):
+    factory = square_factory(DiskCache(str(tmp_path)))
+    sources = []
+    get_node_src = factory.get_node_src
+
+    def counted(*args):
+        sources.append(1)
+        return get_node_src(*args)
+    factory.get_node_src = counted
+
+    for x in (1, 2, 3):
+        eval_square(factory, x)
+    assert len(sources) == 1
+
+    factory.src_cache = "def square(x):\n    return x ** 2\n"
+    n = len(sources)
+    eval_square(factory, 4)
+    assert len(sources) == n + 1
+
+
+def test_decorator():
+    @factory(cache=True)
+    def double(x):
+        return 2 * x
+
+    @factory
+    def triple(x):
+        return 3 * x
+
+    assert double.__factory__ and double.__cache__
+    assert triple.__factory__ and not hasattr(triple, '__cache__')
@@ -0,0 +1,107 @@
+"""Test the change detection of the lazy node inputs"""
+from __future__ import absolute_import
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import pytest
+
+from openalea.core.node import FuncNode, NodeFactory
+from openalea.core.interface import IInterface
+from openalea.core import change_detection as cd
+
+from .small_tools import value
+
+
+def lazy_node(**port):
+    port['name'] = 'x'
+    node = FuncNode([port], [dict(name='out')], value)
+    node.eval()
+    return node
+
+
+def is_modified(node, val):
+    node.modified = False
+    node.set_input(0, val)
+    return node.modified
+
+
+class Counter(object):
+    def __init__(self):
+        self.version = 0
+        self.data = []
+
+    def append(self, x):
+        self.data.append(x)
+        self.version += 1
+
+
+def test_default():
+    node = lazy_node()
+    node.set_input(0, [1, 2])
+    assert not is_modified(node, [1, 2])
+    assert is_modified(node, [1, 3])
+    assert is_modified(node, object())
+
+
+def test_identity():
+    node = lazy_node(change_detection='identity')
+    l = [1, 2]
+    node.set_input(0, l)
+    assert not is_modified(node, l)
+    assert is_modified(node, [1, 2])
+
+
+def test_version():
+    node = lazy_node(change_detection='version')
+    c = Counter()
+    assert is_modified(node, c)
+    assert not is_modified(node, c)
+    c.append(1)
+    assert is_modified(node, c)
+    assert not is_modified(node, c)
+
+
+def test_hash():
+    node = lazy_node(change_detection='hash')
+    node.set_input(0, list(range(100)))
+    assert not is_modified(node, list(range(100)))
+    assert is_modified(node, list(range(101)))
+    assert is_modified(node, lambda: None)
+
+
+def test_array():
+    numpy = pytest.importorskip('numpy')
+    for strategy in ('array', 'hash'):
+        node = lazy_node(change_detection=strategy)
+        node.set_input(0, numpy.arange(10))
+        assert not is_modified(node, numpy.arange(10))
+        assert is_modified(node, numpy.arange(10.))
+        assert is_modified(node, numpy.arange(11))
+
+
+class IVersioned(IInterface):
+    __change_detection__ = cd.Version('version')
+
+
+def test_resolution():
+    node = lazy_node(interface=IVersioned)
+    assert isinstance(node.input_desc[0].get_change_detection(), cd.Version)
+
+    node.input_desc[0].set_change_detection('identity')
+    assert isinstance(node.input_desc[0].get_change_detection(), cd.Identity)
+
+    node = lazy_node()
+    node.set_change_detection('hash')
+    assert isinstance(node.input_desc[0].get_change_detection(), cd.Hash)
+
+    with pytest.raises(ValueError):
+        cd.get_change_detection('unknown')
+
+
+def test_factory():
+    factory = NodeFactory('value', inputs=[dict(name='x')],
+                          nodemodule='small_tools',
+                          nodeclass='value', change_detection='identity',
+                          search_path=[__file__.rsplit('/', 1)[0]])
+    node = factory.instantiate()
+    assert isinstance(node.input_desc[0].get_change_detection(), cd.Identity)
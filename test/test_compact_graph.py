@@ -0,0 +1,148 @@
+"""Test the compact graph implementations"""
+from __future__ import absolute_import
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import operator
+import pickle
+
+import pytest
+
+from openalea.core.graph.graph import Graph
+from openalea.core.graph.property_graph import PropertyGraph
+from openalea.core.graph.compact_graph import (CompactGraph,
+                                               CompactPropertyGraph, Column)
+from openalea.core.graph.interface.graph import InvalidVertex, InvalidEdge
+from openalea.core.dataflow import DataFlow, CompactDataFlow, PortError
+from openalea.core.compositenode import (CompositeNode, CompactCompositeNode,
+                                         CompositeNodeFactory)
+
+from .small_tools import binary, unary, value
+
+
+def build(g):
+    vids = [g.add_vertex() for i in range(4)]
+    g.add_vertex(10)
+    eids = [g.add_edge((vids[0], vids[1])),
+            g.add_edge((vids[0], vids[2])),
+            g.add_edge((vids[1], vids[3])),
+            g.add_edge((vids[2], vids[3])),
+            g.add_edge((vids[2], vids[3])),
+            g.add_edge((10, 10))]
+    return vids, eids
+
+
+def state(g):
+    return (sorted(g.vertices()), sorted(g.edges()),
+            dict((v, (sorted(g.in_edges(v)), sorted(g.out_edges(v)),
+                      sorted(g.in_neighbors(v)), sorted(g.out_neighbors(v)),
+                      g.nb_edges(v)))
+                 for v in g.vertices()),
+            dict((e, (g.source(e), g.target(e))) for e in g.edges()),
+            g.nb_vertices(), g.nb_edges())
+
+
+def test_graph():
+    g, c = Graph(), CompactGraph()
+    for graph in (g, c):
+        vids, eids = build(graph)
+    assert state(g) == state(c)
+
+    for graph in (g, c):
+        graph.remove_edge(eids[3])
+        graph.remove_vertex(vids[1])
+        graph.remove_vertex(10)
+        graph.add_vertex()
+        graph.add_edge((vids[3], vids[0]))
+    assert state(g) == state(c)
+
+    assert vids[1] not in c and 'x' not in c
+    with pytest.raises(InvalidVertex):
+        list(c.in_edges(vids[1]))
+    with pytest.raises(InvalidEdge):
+        c.source(eids[3])
+    with pytest.raises(InvalidEdge):
+        c.remove_edge(eids[3])
+
+    assert state(CompactGraph(g))[4:] == state(g)[4:]
+    c.clear()
+    assert c.nb_vertices() == 0 and c.nb_edges() == 0
+
+
+def test_property_graph():
+    g, c = PropertyGraph(), CompactPropertyGraph()
+    for graph in (g, c):
+        vids, eids = build(graph)
+        graph.add_vertex_property('name')
+        graph.add_edge_property('weight')
+        for v in vids:
+            graph.vertex_property('name')[v] = 'v%d' % v
+        for e in eids:
+            graph.edge_property('weight')[e] = e * 2
+        graph.remove_vertex(vids[0])
+    assert (dict(g.vertex_property('name')) ==
+            dict(c.vertex_property('name')))
+    assert dict(g.edge_property('weight')) == dict(c.edge_property('weight'))
+
+
+def test_column():
+    col = Column('l')
+    col[3] = 5
+    col[0] = 1
+    assert list(col.items()) == [(0, 1), (3, 5)]
+    assert 1 not in col and col.get(1) is None
+    assert col.pop(3) == 5 and len(col) == 1
+    with pytest.raises(KeyError):
+        col['a']
+    with pytest.raises(TypeError):
+        col['a'] = 1
+
+
+def test_dataflow():
+    for df in (DataFlow(), CompactDataFlow()):
+        vid1 = df.add_vertex()
+        pid11 = df.add_out_port(vid1, "out")
+        vid2 = df.add_vertex()
+        pid21 = df.add_in_port(vid2, "in")
+        eid = df.connect(pid11, pid21)
+        assert list(df.connected_ports(pid11)) == [pid21]
+        assert list(df.in_edges(vid2)) == [eid]
+        assert df.in_port(vid2, "in") == pid21
+        df.remove_vertex(vid1)
+        assert df.nb_edges() == 0
+        with pytest.raises(PortError):
+            df.out_port(vid1, "out")
+
+    port = pickle.loads(pickle.dumps(df.port(pid21)))
+    assert (port._vid, port._local_pid) == (vid2, "in")
+
+
+def test_composite():
+    cn = CompactCompositeNode()
+    a = cn.add_node(unary(value))
+    b = cn.add_node(unary(value))
+    add = cn.add_node(binary(operator.add))
+    cn.node(a).set_input(0, 1)
+    cn.node(b).set_input(0, 2)
+    cn.connect(a, 0, add, 0)
+    cn.connect(b, 0, add, 1)
+    cn.eval_as_expression()
+    assert cn.node(add).get_output(0) == 3
+
+    cn = pickle.loads(pickle.dumps(cn))
+    cn.node(a).set_input(0, 5)
+    cn.eval_as_expression()
+    assert cn.node(add).get_output(0) == 7
+
+
+def test_factory():
+    factory = CompositeNodeFactory('empty', inputs=[dict(name='x')],
+                                   outputs=[dict(name='y')],
+                                   elt_connections={0: ('__in__', 0,
+                                                        '__out__', 0)})
+    cn = factory.instantiate(compact=True)
+    assert isinstance(cn, CompactCompositeNode)
+    cn.set_input(0, 4)
+    cn.eval()
+    assert cn.get_output(0) == 4
+    assert type(factory.instantiate()) is CompositeNode
@@ -1,8 +1,10 @@
 from __future__ import absolute_import
+from copy import deepcopy
 from os.path import join as pj
 
 from openalea.core.pkgmanager import PackageManager
 from openalea.core.compositenode import CompositeNodeFactory, CompositeNode
+from openalea.core.compositenode import PyCNFactoryWriter, StoredValue
 from openalea.core.node import RecursionError
 from openalea.core import Package
 
@@ -332,3 +334,123 @@ class TestClass:
         sg()
         res = sg.get_output(0)
         assert ''.join(eval(res)) == "toto"
+
+    def test_instantiate_many(self):
+        """ Instances created from the template of a factory """
+        sg = CompositeNode(inputs=(dict(name="in1", interface=None,
+                                        value=None),),
+                           outputs=(dict(name="out", interface=None),), )
+        addid = sg.add_node(self.plus_node)
+        valid = sg.add_node(self.float_node)
+        sg.node(valid).set_input(0, 2.)
+        strid = sg.add_node(self.string_node)
+        sg.node(strid).set_input(0, ["x"])
+        sg.connect(sg.id_in, 0, addid, 0)
+        sg.connect(valid, 0, addid, 1)
+        sg.connect(addid, 0, sg.id_out, 0)
+
+        sgfactory = CompositeNodeFactory("many")
+        sg.to_factory(sgfactory)
+
+        ref = sgfactory.instantiate()
+        nodes = sgfactory.instantiate_many(3)
+        assert len(nodes) == 3
+        assert sgfactory.template() is sgfactory.template()
+        for sg1 in nodes:
+            assert sorted(sg1.vertices()) == sorted(ref.vertices())
+            assert len(list(sg1.edges())) == len(list(ref.edges()))
+            for vid in ref.vertices():
+                assert sg1.node(vid).inputs == ref.node(vid).inputs
+                assert (sg1.node(vid).internal_data ==
+                        ref.node(vid).internal_data)
+            assert not sg1.__dict__.get('notify_listeners')
+            sg1.set_input(0, 3.)
+            sg1()
+            assert sg1.get_output(0) == 5.
+
+        # the stored values are not shared between the instances
+        assert nodes[0].node(strid).inputs[0] == ["x"]
+        assert nodes[0].node(strid).inputs[0] is not \
+            nodes[1].node(strid).inputs[0]
+
+        # the template follows the modifications of the factory
+        sg.node(valid).set_input(0, 4.)
+        sg.to_factory(sgfactory)
+        sg1 = sgfactory.instantiate_many(1)[0]
+        sg1.set_input(0, 3.)
+        sg1()
+        assert sg1.get_output(0) == 7.
+
+        # in place modification of a stored value
+        template = sgfactory.template()
+        sgfactory.elt_value[valid][0] = (0, "1.")
+        sgfactory.modified()
+        assert sgfactory.template() is not template
+        sg1 = sgfactory.instantiate_many(1)[0]
+        sg1.set_input(0, 3.)
+        sg1()
+        assert sg1.get_output(0) == 4.
+
+    def test_stored_values(self):
+        """ Values parsed once and written on demand """
+        sg = CompositeNode()
+        valid = sg.add_node(self.float_node)
+        sg.node(valid).set_input(0, 2.5)
+        strid = sg.add_node(self.string_node)
+        sg.node(strid).set_input(0, {"x": [1, 2]})
+
+        sgfactory = CompositeNodeFactory("values")
+        sg.to_factory(sgfactory)
+        value = dict(sgfactory.elt_value[strid])[0]
+        assert isinstance(value, StoredValue)
+        assert value == "{'x': [1, 2]}"
+        assert "{'x': [1, 2]}" in repr(PyCNFactoryWriter(sgfactory))
+        assert deepcopy(sgfactory.elt_value)[strid] == [(0, "{'x': [1, 2]}")]
+
+        # the stored values are not modified by the nodes
+        sg.node(strid).get_input(0)["x"].append(3)
+        sg1 = sgfactory.instantiate()
+        assert sg1.node(valid).get_input(0) == 2.5
+        assert sg1.node(strid).get_input(0) == {"x": [1, 2]}
+        sg1.node(strid).get_input(0)["x"].append(4)
+        assert sgfactory.instantiate().node(strid).get_input(0) == \
+            {"x": [1, 2]}
+
+        # representations read from a file, literal or not
+        sgfactory.elt_value[valid] = [(0, "float('inf')")]
+        sgfactory.elt_value[strid] = [(0, "[1, 'a']")]
+        for sg1 in (sgfactory.instantiate(), sgfactory.instantiate()):
+            assert sg1.node(valid).get_input(0) == float('inf')
+            assert sg1.node(strid).get_input(0) == [1, 'a']
+
+    def test_paste_batch(self):
+        """ The events of the pasted nodes are sent at the end """
+        from openalea.core.observer import AbstractListener
+
+        events = []
+
+        class Recorder(AbstractListener):
+            def notify(self, sender, event=None):
+                events.append(event[0])
+
+        sg = CompositeNode()
+        ids = [sg.add_node(self.float_node), sg.add_node(self.plus_node)]
+        sg.connect(ids[0], 0, ids[1], 0)
+        sg.connect(ids[0], 0, ids[1], 1)
+        sgfactory = CompositeNodeFactory("paste")
+        sg.to_factory(sgfactory)
+
+        target = CompositeNode()
+        l = Recorder()
+        l.initialise(target)
+        pasted = sgfactory.paste(target)
+        assert len(pasted) == 2
+        assert events.count('vertex_added') == 2
+        assert events.count('connection_modified') == 1
+        assert events.count('graph_modified') == 1
+
+        del events[:]
+        target.remove_nodes(pasted)
+        assert events.count('vertex_removed') == 2
+        assert events.count('edge_removed') == 2
+        assert events.count('graph_modified') == 1
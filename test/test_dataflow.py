@@ -57,3 +57,71 @@ def test_dataflow():
     except PortError:
         test=True
     assert test
+
+
+def test_port_index():
+    """ test the port indexes through modifications """
+    df = DataFlow()
+    out = df.add_vertex()
+    pid_out = df.add_out_port(out, 0)
+    agg = df.add_vertex()
+    pids = [df.add_in_port(agg, i) for i in range(200)]
+    eids = [df.connect(pid_out, pid) for pid in pids]
+
+    assert df.nb_connections(pid_out) == 200
+    assert list(df.connected_edges(pid_out)) == eids
+    assert df.in_port(agg, 150) == pids[150]
+
+    df.remove_edge(eids[0])
+    assert df.nb_connections(pid_out) == 199
+    assert df.nb_connections(pids[0]) == 0
+
+    df.remove_port(pids[1])
+    assert df.nb_connections(pid_out) == 198
+    try:
+        df.in_port(agg, 1)
+        assert False
+    except PortError:
+        pass
+
+    # the removed port id is reused
+    pid = df.add_in_port(agg, 'new')
+    assert pid == pids[1]
+    assert df.in_port(agg, 'new') == pid
+    assert df.nb_connections(pid) == 0
+
+    df.remove_vertex(agg)
+    assert df.nb_connections(pid_out) == 0
+    try:
+        df.in_port(agg, 150)
+        assert False
+    except PortError:
+        pass
+
+    df.clear()
+    assert len(df._port_edges) == 0 and len(df._local_ports) == 0
+
+
+def test_clear_edges():
+    """ test the port indexes and the version after bulk edge changes """
+    df = DataFlow()
+    out = df.add_vertex()
+    pid_out = df.add_out_port(out, 0)
+    vid = df.add_vertex()
+    pid_in = df.add_in_port(vid, 0)
+    df.connect(pid_out, pid_in)
+
+    version = df.topology_version()
+    df.clear_edges()
+    assert df.topology_version() > version
+    assert list(df.edges()) == []
+    assert list(df.connected_edges(pid_out)) == []
+    assert df.nb_connections(pid_in) == 0
+
+    other = DataFlow()
+    other.add_vertex()
+    other.add_vertex()
+    version = df.topology_version()
+    trans_vid, trans_eid = df.extend(other)
+    assert df.topology_version() > version
+    assert len(trans_vid) == 2
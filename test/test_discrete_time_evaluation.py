@@ -0,0 +1,140 @@
+"""Test the discrete time evaluation algorithm"""
+from __future__ import absolute_import
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from openalea.core.compositenode import CompositeNode
+from openalea.core.node import Node, FuncNode
+from openalea.core.algo.dataflow_evaluation import DiscreteTimeEvaluation
+
+
+class Timer(Node):
+    """ Fire every period cycles, count times (forever if count is None) """
+
+    def __init__(self, period, count=None):
+        Node.__init__(self, [dict(name='x')], [dict(name='n')])
+        self.period = period
+        self.count = count
+        self.cycles = []
+        self.nb_reset = 0
+        self.evaluator = None
+
+    def eval(self):
+        self.cycles.append(self.evaluator.current_cycle)
+        self.outputs[0] = len(self.cycles)
+        if self.count is not None and len(self.cycles) >= self.count:
+            return False
+        return self.period
+
+    def reset(self):
+        Node.reset(self)
+        self.nb_reset += 1
+
+
+class Recorder(FuncNode):
+    """ Record the evaluations (not lazy) """
+
+    def __init__(self):
+        FuncNode.__init__(self, [dict(name='a')], [dict(name='out')],
+                          self.record)
+        self.lazy = False
+        self.values = []
+
+    def record(self, a):
+        self.values.append(a)
+        return a
+
+
+def simulation(*timers):
+    """ A timer and a recorder per timer, and a lonely recorder """
+    cn = CompositeNode()
+    evaluator = DiscreteTimeEvaluation(cn)
+    recorders = []
+    for timer in timers:
+        timer.evaluator = evaluator
+        tid = cn.add_node(timer)
+        rid = cn.add_node(Recorder())
+        cn.connect(tid, 0, rid, 0)
+        recorders.append(cn.node(rid))
+    lonely = cn.node(cn.add_node(Recorder()))
+    return cn, evaluator, recorders, lonely
+
+
+def test_event_queue():
+    fast, slow = Timer(2), Timer(3, count=4)
+    cn, evaluator, (rfast, rslow), lonely = simulation(fast, slow)
+
+    # slow returns no delay at cycle 9: the timers are reset
+    evaluator.eval()
+    assert slow.cycles == [0, 3, 6, 9]
+    assert fast.cycles == [0, 2, 4, 6, 8]
+    assert rslow.values == [1, 2, 3, 4]
+    assert rfast.values == [1, 2, 3, 4, 5]
+    # only the descendants of the firing nodes are evaluated
+    assert lonely.values == [None]
+    assert slow.nb_reset == fast.nb_reset == 1
+    assert evaluator.current_cycle == 0
+
+
+def test_budget():
+    timer = Timer(5)
+    cn, evaluator, recorders, lonely = simulation(timer)
+
+    assert evaluator.run_until(12) == 12
+    assert timer.cycles == [0, 5, 10]
+    assert evaluator.step() == 15
+    assert evaluator.run_cycles(max_cycles=30) == 30
+    assert timer.cycles[-1] == 30 and len(timer.cycles) == 7
+    evaluator.finish()
+    assert timer.nb_reset == 1
+
+    # default budget
+    evaluator.max_cycles = 100
+    evaluator.eval()
+    assert timer.cycles[-1] == 100
+    assert timer.nb_reset == 2
+
+    # time budget
+    timer.cycles = []
+    evaluator.max_cycles = None
+    evaluator.run_cycles(max_time=0.01)
+    assert not evaluator.is_finished()
+    evaluator.finish()
+
+
+def test_step():
+    timer = Timer(1, count=3)
+    cn, evaluator, recorders, lonely = simulation(timer)
+    for i in range(3):
+        evaluator.eval(step=True)
+    assert timer.cycles == [0, 1, 2]
+    assert timer.nb_reset == 1
+
+    # a new simulation
+    evaluator.eval(step=True)
+    assert timer.cycles == [0, 1, 2, 0]
+
+
+def test_long_simulation():
+    timers = [Timer(1)] + [Timer(250) for i in range(20)]
+    cn, evaluator, recorders, lonely = simulation(*timers)
+    evaluator.run_cycles(max_cycles=5000)
+    assert len(timers[0].cycles) == 5001
+    assert len(timers[1].cycles) == 21
+    assert len(recorders[0].values) == 5001
+    assert len(recorders[1].values) == 21
+    assert lonely.values == [None]
+
+
+def test_eval_vertex():
+    timer = Timer(2)
+    cn, evaluator, (recorder,), lonely = simulation(timer)
+    evaluator.start()
+    assert lonely.values == [None]
+    # the traversal executor of AbstractEvaluation is not hidden
+    vid = [v for v in cn.vertices() if cn.node(v) is lonely][0]
+    evaluator.eval_vertex(vid)
+    assert lonely.values == [None, None]
+    assert evaluator.run_cycles(max_cycles=4) == 4
+    assert timer.cycles == [0, 2, 4]
+    evaluator.finish()
@@ -0,0 +1,78 @@
+"""Test the evaluation plan cached by the evaluators"""
+from __future__ import absolute_import
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from openalea.core.compositenode import CompositeNode
+
+from .small_tools import unary, value
+
+
+def collect(x):
+    return x
+
+
+def graph():
+    """ two values connected to the same input """
+    cn = CompositeNode()
+    a = cn.add_node(unary(value, 1))
+    b = cn.add_node(unary(value, 2))
+    out = cn.add_node(unary(collect))
+    cn.node(a).get_ad_hoc_dict().set_metadata('position', [0, 0])
+    cn.node(b).get_ad_hoc_dict().set_metadata('position', [10, 0])
+    cn.connect(a, 0, out, 0)
+    cn.connect(b, 0, out, 0)
+    return cn, a, b, out
+
+
+def test_plan_reused():
+    cn, a, b, out = graph()
+    algo = cn.get_eval_algo()
+    cn.eval_as_expression()
+    plan = algo.get_plan()
+    assert cn.node(out).get_output(0) == [1, 2]
+
+    cn.node(a).set_input(0, 3)
+    cn.eval_as_expression()
+    assert cn.get_eval_algo() is algo
+    assert algo.get_plan() is plan
+    assert cn.node(out).get_output(0) == [3, 2]
+
+
+def test_topology():
+    cn, a, b, out = graph()
+    algo = cn.get_eval_algo()
+    cn.eval_as_expression()
+    plan = algo.get_plan()
+
+    cn.disconnect(b, 0, out, 0)
+    cn.eval_as_expression()
+    assert algo.get_plan() is not plan
+    assert cn.node(out).get_output(0) == 1
+
+    c = cn.add_node(unary(value, 5))
+    cn.connect(c, 0, a, 0)
+    cn.eval_as_expression()
+    assert cn.node(out).get_output(0) == 5
+    assert algo.get_plan().schedule(out) == [c, a, out]
+
+
+def test_position():
+    cn, a, b, out = graph()
+    algo = cn.get_eval_algo()
+    cn.eval_as_expression()
+    plan = algo.get_plan()
+
+    cn.node(a).get_ad_hoc_dict().set_metadata('position', [20, 0])
+    cn.eval_as_expression()
+    assert algo.get_plan() is not plan
+    assert cn.node(out).get_output(0) == [2, 1]
+
+
+def test_eval_algo():
+    cn, a, b, out = graph()
+    algo = cn.get_eval_algo()
+    cn.eval_algo = "PriorityEvaluation"
+    assert cn.get_eval_algo() is not algo
+    cn.eval_as_expression()
+    assert cn.node(out).get_output(0) == [1, 2]
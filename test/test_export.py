@@ -10,7 +10,7 @@ import os
 from io import open
 
 
-def test_export():
+def test_export(tmp_path):
     """test export"""
     d = {}
     file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
@@ -42,22 +42,17 @@ def test_export():
     sgfactory = CompositeNodeFactory("addition")
     sg.to_factory(sgfactory)
 
-    export_app.export_app("ADD", "app.py", sgfactory)
+    filename = str(tmp_path / "app.py")
+    export_app.export_app("ADD", filename, sgfactory)
+    assert os.path.exists(filename)
 
     try:
         import qtpy
-        f = open("app.py")
-        assert f
-
-        from . import app
+        import importlib.util
+        spec = importlib.util.spec_from_file_location("app", filename)
+        app = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(app)
         # requires X server 
         # app.main(sys.argv)
-        f.close()
-        os.remove("app.py")
-        try:
-            os.remove("app.pyc")
-        except:
-            pass
-
     except:
         pass
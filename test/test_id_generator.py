@@ -0,0 +1,71 @@
+"""Test the id generator of the graphs"""
+from __future__ import absolute_import
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import pickle
+
+import pytest
+
+from openalea.core.graph.id_generator import IdGenerator
+
+
+def test_sequence():
+    gen = IdGenerator()
+    assert [gen.get_id() for i in range(3)] == [0, 1, 2]
+    gen.release_id(0)
+    gen.release_id(2)
+    # last released first
+    assert [gen.get_id() for i in range(3)] == [2, 0, 3]
+
+
+def test_explicit():
+    gen = IdGenerator()
+    assert gen.get_id(5) == 5
+    assert gen.get_id(2) == 2
+    with pytest.raises(IndexError):
+        gen.get_id(5)
+    with pytest.raises(IndexError):
+        gen.get_id(2)
+    assert sorted(gen.get_id() for i in range(4)) == [0, 1, 3, 4]
+    assert gen.get_id() == 6
+
+
+def test_release():
+    gen = IdGenerator()
+    gen.get_id(3)
+    with pytest.raises(IndexError):
+        gen.release_id(10)
+    with pytest.raises(IndexError):
+        gen.release_id(1)
+
+    # 1 is taken explicitly, released and taken again
+    gen.get_id(1)
+    gen.release_id(1)
+    gen.release_id(3)
+    assert gen.get_id() == 3
+    assert gen.get_id() == 1
+    assert sorted(gen.get_id() for i in range(3)) == [0, 2, 4]
+
+
+def test_many_explicit():
+    gen = IdGenerator()
+    gen.get_id(10000)
+    for i in range(0, 10000, 2):
+        gen.get_id(i)
+    assert len(gen._id_list) < 3 * len(gen._id_set)
+    assert sorted(gen.get_id() for i in range(5000)) == list(range(1, 10000, 2))
+    assert gen.get_id() == 10001
+
+
+def test_pickle():
+    gen = IdGenerator()
+    gen.get_id(4)
+    state = dict(_id_max=5, _id_list=[0, 1, 2, 3])
+    old = IdGenerator.__new__(IdGenerator)
+    old.__setstate__(state)
+    assert old.get_id() == 3
+    with pytest.raises(IndexError):
+        old.get_id(4)
+    gen = pickle.loads(pickle.dumps(gen))
+    assert gen.get_id(1) == 1
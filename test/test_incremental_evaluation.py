@@ -0,0 +1,93 @@
+"""Test the incremental evaluation algorithm"""
+from __future__ import absolute_import
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import operator
+
+from openalea.core.compositenode import CompositeNode
+from openalea.core.algo.dataflow_evaluation import IncrementalEvaluation
+
+from .small_tools import binary, unary, value
+
+
+def graph():
+    """
+    a  b   c
+     \\ /   |
+      +    abs
+       \\  /
+        *
+    """
+    cn = CompositeNode()
+    vids = {}
+    for name in 'abc':
+        vids[name] = cn.add_node(unary(value))
+    vids['+'] = cn.add_node(binary(operator.add))
+    vids['abs'] = cn.add_node(unary(abs))
+    vids['*'] = cn.add_node(binary(operator.mul))
+    cn.connect(vids['a'], 0, vids['+'], 0)
+    cn.connect(vids['b'], 0, vids['+'], 1)
+    cn.connect(vids['c'], 0, vids['abs'], 0)
+    cn.connect(vids['+'], 0, vids['*'], 0)
+    cn.connect(vids['abs'], 0, vids['*'], 1)
+    cn.node(vids['a']).set_input(0, 1)
+    cn.node(vids['b']).set_input(0, 2)
+    cn.node(vids['c']).set_input(0, -3)
+    return cn, vids
+
+
+def names(vids, executed):
+    ids = dict((v, k) for k, v in vids.items())
+    return sorted(ids[vid] for vid in executed)
+
+
+def test_first_eval():
+    cn, vids = graph()
+    algo = IncrementalEvaluation(cn)
+    executed = algo.eval()
+    assert set(vids.values()) <= set(executed)
+    assert cn.node(vids['*']).get_output(0) == 9
+    assert algo.eval() == []
+
+
+def test_cone():
+    cn, vids = graph()
+    algo = IncrementalEvaluation(cn)
+    algo.eval()
+
+    cn.node(vids['a']).set_input(0, 4)
+    assert names(vids, algo.eval()) == ['*', '+', 'a']
+    assert cn.node(vids['*']).get_output(0) == 18
+
+    # abs produces the same value: * is not executed again
+    cn.node(vids['c']).set_input(0, 3)
+    assert names(vids, algo.eval()) == ['abs', 'c']
+    assert cn.node(vids['*']).get_output(0) == 18
+
+
+def test_target():
+    cn, vids = graph()
+    algo = IncrementalEvaluation(cn)
+    algo.eval()
+
+    cn.node(vids['a']).set_input(0, 0)
+    cn.node(vids['c']).set_input(0, 5)
+    assert names(vids, algo.eval(vids['abs'])) == ['abs', 'c']
+    assert names(vids, algo.eval()) == ['*', '+', 'a']
+    assert cn.node(vids['*']).get_output(0) == 10
+
+
+def test_topology():
+    cn, vids = graph()
+    cn.eval_algo = "IncrementalEvaluation"
+    cn.eval_as_expression()
+    algo = cn.get_eval_algo()
+
+    d = cn.add_node(unary(value))
+    cn.node(d).set_input(0, 10)
+    cn.disconnect(vids['b'], 0, vids['+'], 1)
+    cn.connect(d, 0, vids['+'], 1)
+    cn.eval_as_expression()
+    assert d in algo.executed
+    assert cn.node(vids['*']).get_output(0) == 33
@@ -0,0 +1,87 @@
+"""Test the evaluation of dataflows deeper than the recursion limit"""
+from __future__ import absolute_import
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import sys
+
+from openalea.core.compositenode import CompositeNode
+from openalea.core.node import FuncNode
+from openalea.core.algo import dataflow_evaluation as algo
+
+
+def incr(x):
+    return x + 1
+
+
+def chain(n):
+    """ n nodes adding 1 to the previous one """
+    cn = CompositeNode()
+    vids = []
+    for i in range(n):
+        node = FuncNode([dict(name='x')], [dict(name='out')], incr)
+        node.set_input(0, 0)
+        vids.append(cn.add_node(node))
+        if i > 0:
+            cn.connect(vids[i - 1], 0, vids[i], 0)
+    return cn, vids
+
+
+N = sys.getrecursionlimit() + 500
+
+
+def check(evaluator, cn, vids):
+    evaluator.eval()
+    assert cn.node(vids[-1]).get_output(0) == len(vids)
+
+
+def test_deep_replay():
+    cn, vids = chain(N)
+    for name in ("PriorityEvaluation", "LambdaEvaluation"):
+        cn.reset()
+        check(getattr(algo, name)(cn), cn, vids)
+
+
+def test_deep_traversal():
+    cn, vids = chain(N)
+    for name in ("GeneratorEvaluation", "DiscreteTimeEvaluation"):
+        cn.reset()
+        check(getattr(algo, name)(cn), cn, vids)
+
+    # a blocked node without output does not stop the evaluation
+    cn.reset()
+    cn.node(vids[1]).block = True
+    check(algo.BrutEvaluation(cn), cn, vids)
+
+
+class ScriptNode(FuncNode):
+    def to_script(self):
+        return "x += 1\n"
+
+
+def test_script():
+    cn = CompositeNode()
+    prev = None
+    for i in range(N):
+        vid = cn.add_node(ScriptNode([dict(name='x')], [dict(name='out')], incr))
+        if prev is not None:
+            cn.connect(prev, 0, vid, 0)
+        prev = vid
+    assert algo.ToScriptEvaluation(cn).eval() == "x += 1\n" * N
+
+
+def test_recursive():
+    cn, vids = chain(10)
+    for name in ("BrutEvaluation", "GeneratorEvaluation", "LambdaEvaluation"):
+        evaluator = getattr(algo, name)(cn)
+        evaluator.iterative = False
+        cn.reset()
+        cn.node(vids[0]).set_input(0, 0)
+        check(evaluator, cn, vids)
+
+        # the evaluation stops on the blocked node
+        cn.node(vids[1]).block = True
+        cn.node(vids[0]).set_input(0, 100)
+        check(evaluator, cn, vids)
+        assert cn.node(vids[0]).get_output(0) == 1
+        cn.node(vids[1]).block = False
@@ -16,5 +16,53 @@ def test_dict():
     print(d)
 
 
+def test_protected():
+    d = PackageDict({'A': 1, '#Alias': 2})
+    assert d['a'] == 1
+    assert d['ALIAS'] == 2
+    assert d['#alias'] == 2
+    assert 'alias' in d and d.has_key('#ALIAS')
+    assert d.get('alias') is None
+    assert d.nb_public_values() == 1
+    assert list(d.iter_public_values()) == [1]
+    try:
+        d['missing']
+        assert False
+    except KeyError:
+        pass
+
+    d['B'] = 3
+    d['b'] = 4
+    assert d.nb_public_values() == 2
+    assert sorted(d.iter_public_values()) == [1, 4]
+
+    del d['#alias']
+    assert 'alias' not in d
+    assert d.pop('A') == 1
+    assert d.pop('A', None) is None
+    assert d.nb_public_values() == 1
+    d.setdefault('#C', 5)
+    assert d['c'] == 5
+    d.update({'D': 6})
+    assert d['d'] == 6 and d.nb_public_values() == 2
+
+    version = d.version
+    d.clear()
+    assert d.version > version
+    assert d.nb_public_values() == 0 and 'c' not in d
+
+
+def test_copy():
+    import copy
+    import pickle
+
+    d = PackageDict({'A': 1, '#B': 2})
+    for d2 in (pickle.loads(pickle.dumps(d)), copy.deepcopy(d)):
+        assert d2['b'] == 2
+        assert d2.nb_public_values() == 1
+        d2['C'] = 3
+        assert d2.nb_public_values() == 2
+
+
 if __name__=="__main__":
     test_dict()
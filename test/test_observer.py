@@ -87,3 +87,136 @@ def test_lock():
         assert True
     except NotifyException:
         assert False
+
+
+# Test notification policy
+
+
+class recorder(AbstractListener):
+
+    def __init__(self, observed):
+        AbstractListener.__init__(self)
+        self.events = []
+        self.initialise(observed)
+
+    def notify(self, sender, event=None):
+        self.events.append(event)
+
+
+def evaluated_composite():
+    from openalea.core.compositenode import CompositeNode
+    from openalea.core.node import FuncNode
+
+    cn = CompositeNode()
+    a = cn.add_node(FuncNode([dict(name='a')], [dict(name='out')], abs))
+    b = cn.add_node(FuncNode([dict(name='a')], [dict(name='out')], abs))
+    cn.connect(a, 0, b, 0)
+    cn.node(a).set_input(0, -2)
+    return cn, a, b
+
+
+def test_notification_policy():
+    import threading
+    from openalea.core.algo.dataflow_evaluation import ParallelEvaluation
+
+    # silent and coalesced evaluations
+    for policy in (SILENT, COALESCED):
+        cn, a, b = evaluated_composite()
+        l = recorder(cn)
+        la = recorder(cn.node(a))
+        cn.notification_policy = policy
+        cn.eval_as_expression()
+        assert cn.node(b).get_output(0) == 2
+        assert la.events == []
+        if policy == SILENT:
+            assert l.events == []
+        else:
+            assert l.events == [('evaluation_summary', sorted(
+                [a, b, cn.id_in, cn.id_out]))]
+        assert get_notification_policy() == FULL
+
+    # the policy of the evaluation algo has precedence, also in the threads
+    cn, a, b = evaluated_composite()
+    la = recorder(cn.node(a))
+    cn.eval_algo = 'ParallelEvaluation'
+    cn.get_eval_algo().notification_policy = COALESCED
+    cn.notification_policy = FULL
+    cn.eval_as_expression()
+    assert cn.node(b).get_output(0) == 2
+    assert la.events == []
+
+    cn.get_eval_algo().notification_policy = None
+    cn.node(a).set_input(0, -3)
+    cn.eval_as_expression()
+    assert ('start_eval',) in la.events
+
+    # threads
+    with notification_policy(COALESCED) as skipped:
+        o = myobserved()
+        thread = threading.Thread(target=with_notification_policy(
+            lambda: skip_notification(o)))
+        thread.start()
+        thread.join()
+    assert id(o) in skipped
+    assert not skip_notification(o)
+
+    # unknown policy
+    cn, a, b = evaluated_composite()
+    cn.notification_policy = 'quiet'
+    try:
+        cn.eval_as_expression()
+        assert False
+    except ValueError:
+        pass
+    assert not cn.evaluating
+
+
+# Test batch of notifications
+
+
+def test_batch():
+    o = myobserved()
+    l = recorder(o)
+
+    with o.batch():
+        o.notify_listeners(('input_modified', 0))
+        o.notify_listeners(('caption_modified', 'a'))
+        with batch(o):
+            o.notify_listeners(('input_modified', 0))
+            o.notify_listeners(('input_modified', 1))
+        o.notify_listeners(('caption_modified', 'a'))
+        assert l.events == []
+    assert l.events == [('input_modified', 0), ('caption_modified', 'a'),
+                        ('input_modified', 1), ('caption_modified', 'a')]
+    assert o._event_batch is None
+
+    # without listener
+    o = myobserved()
+    with o.batch():
+        o.notify_listeners(('input_modified', 0))
+    o.notify_listeners(('input_modified', 0))
+
+    # the queued events are sent by the overridden notify_listeners
+    o = myobserved()
+    l = recorder(o)
+    events = []
+
+    def notify_listeners(event=None):
+        events.append(event)
+        Observed.notify_listeners(o, event)
+    o.notify_listeners = notify_listeners
+    with o.batch():
+        o.notify_listeners(('input_modified', 0))
+        o.notify_listeners(('input_modified', 0))
+        assert l.events == []
+    assert len(events) == 3 and l.events == [('input_modified', 0)]
+
+    # the events converted by the nodes are sent once
+    from openalea.core.node import Node
+    node = Node()
+    l = recorder(node)
+    with node.batch():
+        node.notify_listeners(('caption_modified', 'a'))
+    assert l.events == [('data_modified', 'caption', 'a'),
+                        ('caption_modified', 'a')]
+
@@ -1,5 +1,6 @@
 from __future__ import absolute_import
 from __future__ import print_function
+import os
 from openalea.core.pkgmanager import PackageManager
 
 from .small_tools import test_dir
@@ -87,3 +88,30 @@ def test_search():
 #     paths = list(eval(path))  # path is a string
 #
 #     assert set(paths) == set(p)
+
+
+def test_scan_directories(tmp_path):
+    from openalea.core.pkgmanager import scan_directories
+
+    (tmp_path / 'a' / 'b').mkdir(parents=True)
+    (tmp_path / 'c').mkdir()
+    for f in ('__wralea__.py', 'a/my_wralea.py', 'a/b/__wralea__.py',
+              'c/other.py'):
+        (tmp_path / f).write_text(u'')
+    # loop of symbolic links
+    os.symlink(str(tmp_path), str(tmp_path / 'a' / 'loop'))
+
+    expected = set(str(tmp_path / f) for f in
+                   ('__wralea__.py', 'a/my_wralea.py', 'a/b/__wralea__.py'))
+    assert scan_directories([str(tmp_path)], '*wralea*.py') == expected
+    assert (scan_directories([str(tmp_path)], '*wralea*.py', False) ==
+            set([str(tmp_path / '__wralea__.py')]))
+
+
+def test_timings():
+    pkgman = PackageManager()
+    pkgman.find_and_register_packages()
+
+    for step in ('find_wralea', 'prepare', 'register', 'rebuild_category'):
+        assert 0 <= pkgman.timings[step] <= pkgman.timings['total']
+    assert pkgman.timings['packages']
@@ -0,0 +1,101 @@
+"""Test the parallel evaluation algorithm"""
+from __future__ import absolute_import
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import operator
+import threading
+
+import pytest
+
+from openalea.core.compositenode import CompositeNode
+from openalea.core.algo.dataflow_evaluation import (ParallelEvaluation,
+                                                    EvaluationException)
+
+from .small_tools import binary, unary, value
+
+
+def fail(x):
+    raise ValueError(x)
+
+
+def diamond(left=operator.add, right=operator.mul):
+    """ (x + y) - (x * y) """
+    cn = CompositeNode()
+    x = cn.add_node(unary(value))
+    y = cn.add_node(unary(value))
+    l = cn.add_node(binary(left))
+    r = cn.add_node(binary(right))
+    out = cn.add_node(binary(operator.sub))
+    cn.node(x).set_input(0, 3)
+    cn.node(y).set_input(0, 4)
+    cn.connect(x, 0, l, 0)
+    cn.connect(y, 0, l, 1)
+    cn.connect(x, 0, r, 0)
+    cn.connect(y, 0, r, 1)
+    cn.connect(l, 0, out, 0)
+    cn.connect(r, 0, out, 1)
+    return cn, out
+
+
+def test_thread():
+    cn, out = diamond()
+    ParallelEvaluation(cn).eval()
+    assert cn.node(out).get_output(0) == (3 + 4) - (3 * 4)
+
+
+def test_concurrent_branches():
+    barrier = threading.Barrier(2, timeout=10)
+
+    def wait_add(a, b):
+        barrier.wait()
+        return a + b
+
+    def wait_mul(a, b):
+        barrier.wait()
+        return a * b
+
+    # both branches must run at the same time to cross the barrier
+    cn, out = diamond(wait_add, wait_mul)
+    ParallelEvaluation(cn, max_workers=2).eval()
+    assert cn.node(out).get_output(0) == -5
+
+
+def test_process():
+    cn, out = diamond()
+    algo = ParallelEvaluation(cn, backend='process', max_workers=2)
+    algo.eval(out)
+    assert cn.node(out).get_output(0) == -5
+
+
+def test_eval_algo():
+    cn, out = diamond()
+    cn.eval_algo = "ParallelEvaluation"
+    assert isinstance(cn.get_eval_algo(), ParallelEvaluation)
+    cn.eval_as_expression(out)
+    assert cn.node(out).get_output(0) == -5
+
+
+def test_exception():
+    cn, out = diamond(right=fail)
+    with pytest.raises(EvaluationException):
+        ParallelEvaluation(cn).eval()
+    assert cn.node(out).get_output(0) is None
+
+
+def test_backend():
+    with pytest.raises(ValueError):
+        ParallelEvaluation(CompositeNode(), backend='gpu')
+
+
+def test_eval_vertex_blocked():
+    cn, out = diamond()
+    ParallelEvaluation(cn).eval()
+    l, r = sorted(cn.in_neighbors(out))
+    x, y = sorted(cn.in_neighbors(l))
+
+    # the blocked left branch keeps its output: (3 + 4) - (5 * 4)
+    cn.node(l).block = True
+    cn.node(x).set_input(0, 5)
+    ParallelEvaluation(cn).eval_vertex(out)
+    assert cn.node(out).get_output(0) == (3 + 4) - (5 * 4)
@@ -0,0 +1,149 @@
+"""Test the persistent package index"""
+from __future__ import absolute_import
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import functools
+import os
+
+from openalea.core.pkgmanager import PackageManager
+from openalea.core.package import (PyPackageReaderWralea, LazyPackage,
+                                   FactoryStub)
+from openalea.core.pkgcache import PackageIndex, factory_loader
+from openalea.core.pkgdict import protected
+
+WRALEA = '''
+from openalea.core.external import *
+
+__name__ = "pkgcache_test"
+__version__ = "%s"
+__alias__ = ["pkgcache_alias"]
+__all__ = ["plus"]
+
+plus = Factory(name="plus",
+               nodemodule="pkgcache_nodes",
+               nodeclass="plus",
+               inputs=(dict(name="a", value=1), dict(name="b", value=2)),
+               outputs=(dict(name="out"),),
+               alias=["add"])
+'''
+
+NODES = '''
+def plus(a, b):
+    return a + b
+'''
+
+
+def write_package(dirname, version):
+    with open(os.path.join(dirname, 'pkgcache_nodes.py'), 'w') as f:
+        f.write(NODES)
+    filename = os.path.join(dirname, '__wralea__.py')
+    with open(filename, 'w') as f:
+        f.write(WRALEA % version)
+    return filename
+
+
+def not_executed(pkgmanager):
+    raise AssertionError("the wralea file should not be executed")
+
+
+def test_index(tmp_path):
+    pkg_dir = tmp_path / 'pkg'
+    pkg_dir.mkdir()
+    filename = write_package(str(pkg_dir), '1.0')
+    index_file = str(tmp_path / 'index.pkl')
+    pkgman = PackageManager()
+
+    try:
+        index = PackageIndex(index_file)
+        reader = PyPackageReaderWralea(filename)
+        pkg = pkgman.register_reader(reader, index)
+        assert pkg.metainfo['version'] == '1.0'
+        index.save()
+        del pkgman['pkgcache_test']
+        del pkgman[protected('pkgcache_alias')]
+
+        # unchanged: the package is read from the index
+        index = PackageIndex(index_file)
+        assert index.load()
+        reader = PyPackageReaderWralea(filename)
+        reader.register_packages = not_executed
+        pkg = pkgman.register_reader(reader, index)
+        assert pkgman['pkgcache_test'] is pkg
+        assert pkgman[protected('pkgcache_alias')] is pkg
+        assert sorted(pkg.keys()) == [protected('add'), 'plus']
+        factory = pkg['plus']
+        assert factory.package is pkg
+        node = factory.instantiate()
+        node.eval()
+        assert node.get_output(0) == 3
+        del pkgman['pkgcache_test']
+        del pkgman[protected('pkgcache_alias')]
+
+        # modified: the wralea file is executed again
+        write_package(str(pkg_dir), '2.0')
+        os.utime(filename, ns=(0, 0))
+        assert index.load()
+        reader = PyPackageReaderWralea(filename)
+        pkg = pkgman.register_reader(reader, index)
+        assert pkg.metainfo['version'] == '2.0'
+
+        index.prune([])
+        assert not index.entries
+    finally:
+        for key in ('pkgcache_test', protected('pkgcache_alias')):
+            if key in pkgman:
+                del pkgman[key]
+
+
+def test_lazy_package(tmp_path):
+    pkg_dir = tmp_path / 'pkg'
+    pkg_dir.mkdir()
+    filename = write_package(str(pkg_dir), '1.0')
+    index = PackageIndex(str(tmp_path / 'index.pkl'))
+    pkgman = PackageManager()
+
+    try:
+        reader = PyPackageReaderWralea(filename)
+        pkgman.register_reader(reader, index)
+        del pkgman['pkgcache_test']
+        del pkgman[protected('pkgcache_alias')]
+
+        reader.register_packages = not_executed
+        pkg = index.register(reader, pkgman, lazy=True)
+        assert isinstance(pkg, LazyPackage) and not pkg.is_loaded()
+        assert pkg.metainfo['version'] == '1.0'
+
+        # the categories are built with stubs
+        pkgman.rebuild_category()
+        assert not pkg.is_loaded()
+        stub, = pkg.iter_factories()
+        assert isinstance(stub, FactoryStub) and stub.name == 'plus'
+
+        # first access
+        assert stub.get_factory() is pkg['add']
+        assert pkg.is_loaded()
+        assert len(pkg) == 2
+        assert set(pkg.iter_factories()) == set([pkg['plus']])
+
+        # invalid factories in the index: the wralea file is executed
+        pkg = index.register(reader, pkgman, lazy=True)
+        pkg._loader = functools.partial(factory_loader, b'invalid', filename)
+        assert pkg['plus'].inputs[1]['value'] == 2
+    finally:
+        for key in ('pkgcache_test', protected('pkgcache_alias')):
+            if key in pkgman:
+                del pkgman[key]
+
+
+def test_invalid_index(tmp_path):
+    index_file = str(tmp_path / 'index.pkl')
+    with open(index_file, 'wb') as f:
+        f.write(b'invalid')
+    index = PackageIndex(index_file)
+    assert not index.load()
+
+    index.modified = True
+    index.save()
+    index = PackageIndex(index_file)
+    assert index.load() and index.entries == {}
@@ -0,0 +1,100 @@
+"""Test the dependency graph of the package manager"""
+from __future__ import absolute_import
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from openalea.core.pkgmanager import PackageManager
+from openalea.core.package import Package
+from openalea.core.node import NodeFactory
+from openalea.core.compositenode import CompositeNodeFactory
+
+from .small_tools import test_dir
+
+
+def composite(name, *elements):
+    return CompositeNodeFactory(
+        name, elt_factory=dict((i, e) for i, e in enumerate(elements)))
+
+
+def build():
+    """
+    deps_a: node, cn1 -> node, cn2 -> cn1 + deps_b.cn3 + missing
+    deps_b: cn3 -> deps_b.cn4 -> deps_b.cn3 (cycle) + deps_a.node
+    """
+    a = Package("deps_a", {}, test_dir())
+    a.add_factory(NodeFactory(name="node"))
+    a.add_factory(composite("cn1", ("deps_a", "node")))
+    a.add_factory(composite("cn2", ("deps_a", "cn1"), ("deps_b", "cn3"),
+                            ("deps_c", "lost"), ("__in__", "#in")))
+    b = Package("deps_b", {}, test_dir())
+    b.add_factory(composite("cn3", ("deps_b", "cn4")))
+    b.add_factory(composite("cn4", ("deps_b", "cn3"), ("deps_a", "node")))
+    return a, b
+
+
+def test_dependencies():
+    pkgman = PackageManager()
+    a, b = build()
+    pkgman.add_package(a)
+    pkgman.add_package(b)
+
+    try:
+        assert pkgman.dependencies(a["cn1"]) == [("deps_a", "node")]
+        assert pkgman.dependencies(a["cn2"]) == [
+            ("deps_a", "cn1"), ("deps_a", "node"),
+            ("deps_b", "cn3"), ("deps_b", "cn4")]
+        assert pkgman.dependencies(b["cn3"]) == [
+            ("deps_a", "node"), ("deps_b", "cn3"), ("deps_b", "cn4")]
+        assert pkgman.dependencies(a) == [("deps_b", "cn3"),
+                                          ("deps_b", "cn4")]
+        assert pkgman.dependencies()["deps_b"] == [("deps_a", "node")]
+
+        assert pkgman.missing_dependencies(a["cn2"]) == [("deps_c", "lost")]
+        assert pkgman.missing_dependencies(a["cn1"]) is None
+        assert pkgman.missing_dependencies(a) == [("deps_c", "lost")]
+        assert pkgman.missing_dependencies(b) is None
+
+        assert sorted(pkgman.who_use("node")) == [
+            ("deps_a", "cn1"), ("deps_a", "cn2"),
+            ("deps_b", "cn3"), ("deps_b", "cn4")]
+        assert sorted(pkgman.who_use("cn1")) == [("deps_a", "cn2")]
+
+        # the missing package is registered
+        c = Package("deps_c", {}, test_dir())
+        c.add_factory(NodeFactory(name="lost"))
+        pkgman.add_package(c)
+        assert pkgman.missing_dependencies(a["cn2"]) is None
+        assert ("deps_c", "lost") in pkgman.dependencies(a["cn2"])
+        assert pkgman.who_use("lost") == [("deps_a", "cn2")]
+
+        # a package is replaced
+        a2, b2 = build()
+        pkgman.add_package(b2)
+        b2["cn4"].elt_factory = {0: ("deps_b", "cn3")}
+        pkgman.dependency_graph.invalidate(b2)
+        assert pkgman.dependencies(b2["cn3"]) == [("deps_b", "cn3"),
+                                                 ("deps_b", "cn4")]
+        assert pkgman.dependencies(a["cn2"]) == [
+            ("deps_a", "cn1"), ("deps_a", "node"),
+            ("deps_b", "cn3"), ("deps_b", "cn4"), ("deps_c", "lost")]
+        assert sorted(pkgman.who_use("node")) == [("deps_a", "cn1"),
+                                                  ("deps_a", "cn2")]
+    finally:
+        for name in ("deps_a", "deps_b", "deps_c"):
+            if name in pkgman:
+                del pkgman[name]
+
+
+def test_no_accumulation():
+    pkgman = PackageManager()
+    a, b = build()
+    pkgman.add_package(a)
+
+    try:
+        # deps_b is missing, twice
+        for i in range(2):
+            assert pkgman.missing_dependencies(a["cn2"]) == [
+                ("deps_b", "cn3"), ("deps_c", "lost")]
+            assert pkgman.missing_dependencies(a["cn1"]) is None
+    finally:
+        del pkgman["deps_a"]
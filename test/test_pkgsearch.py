@@ -0,0 +1,103 @@
+"""Test the search index of the package manager"""
+from __future__ import absolute_import
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from openalea.core.pkgmanager import PackageManager
+from openalea.core.pkgdict import is_protected, protected
+from openalea.core.package import Package
+from openalea.core.node import NodeFactory
+from openalea.core.pkgsearch import ngrams
+
+from .small_tools import test_dir
+
+
+def scan(pkgman, search_str, nb_inputs=-1, nb_outputs=-1):
+    """ Reference implementation: score all the factories """
+    search_str = search_str.upper()
+    match = []
+    for name, pkg in pkgman.items():
+        if is_protected(name):
+            continue
+        for fname, factory in pkg.items():
+            if is_protected(fname):
+                continue
+            fname = factory.name.upper()
+            name_score = 0
+            if search_str in fname:
+                name_score = int(100 * (1 - fname.index(search_str) /
+                                        float(len(fname))))
+            pname = pkg.name.upper()
+            pkg_score = 0
+            if search_str in pname:
+                pkg_score = int(100 * (1 - pname.index(search_str) /
+                                       float(len(pname))))
+            score = (name_score,
+                     factory.description.upper().count(search_str),
+                     factory.category.upper().count(search_str),
+                     pkg_score)
+            if score > (0, 0, 0, 0):
+                match.append((score, factory))
+    match.sort(key=lambda m: m[0], reverse=True)
+    match = [f for s, f in match]
+    if nb_inputs >= 0:
+        match = [f for f in match if f.inputs and len(f.inputs) == nb_inputs]
+    if nb_outputs >= 0:
+        match = [f for f in match
+                 if f.outputs and len(f.outputs) == nb_outputs]
+    return match
+
+
+def test_ngrams():
+    assert ngrams("ABCD") == set(["ABC", "BCD"])
+    assert ngrams("AB") == set()
+
+
+def test_same_results():
+    pkgman = PackageManager()
+    pkgman.init()
+    pkgman.load_directory(test_dir())
+
+    for search_str in ("sum", "s", "ex", "flow", "iter", "data", "zzzz",
+                       "workflow", "Control"):
+        assert list(pkgman.search_node(search_str)) == scan(pkgman,
+                                                            search_str)
+        assert (list(pkgman.search_node(search_str, nb_inputs=1)) ==
+                scan(pkgman, search_str, nb_inputs=1))
+        assert (list(pkgman.search_node(search_str, nb_outputs=2)) ==
+                scan(pkgman, search_str, nb_outputs=2))
+
+
+def test_incremental():
+    pkgman = PackageManager()
+    pkg = Package("pkgsearch_test", {}, test_dir())
+    pkg.add_factory(NodeFactory(name="zyxwv_first", category="zyxwv"))
+    pkgman.add_package(pkg)
+
+    try:
+        res = pkgman.search_node("zyxwv")
+        assert [f.name for f in res] == ["zyxwv_first"]
+
+        # factory added to a registered package
+        pkg.add_factory(NodeFactory(name="other", description="zyxwv zyxwv"))
+        res = pkgman.search_node("zyxwv")
+        assert [f.name for f in res] == ["zyxwv_first", "other"]
+
+        factory = pkg["other"]
+        factory.name = "zyxwv_second"
+        pkg.update_factory("other", factory)
+        res = pkgman.search_node("zyxwv")
+        assert [f.name for f in res] == ["zyxwv_second", "zyxwv_first"]
+
+        # renamed package
+        pkg.name = "renamed_zyxwv"
+        pkgman[pkg.name] = pkg
+        del pkgman["pkgsearch_test"]
+        res = pkgman.search_node("renamed_zyxwv")
+        assert len(res) == 2
+    finally:
+        for key in ("pkgsearch_test", "renamed_zyxwv"):
+            if key in pkgman:
+                del pkgman[key]
+
+    assert not pkgman.search_node("zyxwv")
@@ -0,0 +1,87 @@
+"""Test the snapshots of the package manager"""
+from __future__ import absolute_import
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import gc
+import multiprocessing
+
+import pytest
+
+from openalea.core.pkgmanager import PackageManager, init_worker
+from openalea.core.package import LazyPackage
+
+from .small_tools import test_dir
+
+
+def content(pkgman):
+    return sorted((key, sorted(pkg.keys())) for key, pkg in pkgman.items())
+
+
+def worker(pkg_name):
+    pkgman = PackageManager()
+    return id(pkgman.pkgs), sorted(pkgman[pkg_name].keys())
+
+
+def test_snapshot():
+    pkgman = PackageManager()
+    pkgman.clear()
+    pkgman.load_directory(test_dir())
+
+    try:
+        expected = content(pkgman)
+        paths = pkgman.get_wralea_path()
+        snapshot = pkgman.snapshot()
+        assert pkgman.is_snapshot(snapshot)
+
+        pkgman.clear()
+        assert not pkgman.is_snapshot(snapshot)
+        init_worker(snapshot)
+        assert pkgman.is_snapshot(snapshot)
+        assert pkgman.get_wralea_path() == paths
+
+        packages = pkgman.get_packages()
+        assert all(isinstance(pkg, LazyPackage) and not pkg.is_loaded()
+                   for pkg in packages)
+        # the snapshot of unloaded lazy packages does not load them
+        assert pkgman.snapshot()
+        assert not any(pkg.is_loaded() for pkg in packages)
+        assert pkgman.category
+
+        assert content(pkgman) == expected
+        for pkg in packages:
+            for factory in pkg.values():
+                assert factory.package is pkg
+
+        pkgman.restore(snapshot, lazy=False)
+        assert not any(isinstance(pkg, LazyPackage)
+                       for pkg in pkgman.values())
+        assert content(pkgman) == expected
+    finally:
+        pkgman.clear()
+        pkgman.init()
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(),
+                    reason="fork is not available")
+def test_fork():
+    pkgman = PackageManager()
+    pkgman.clear()
+    pkgman.load_directory(test_dir())
+    name = sorted(pkg.name for pkg in pkgman.get_packages())[0]
+
+    snapshot = pkgman.snapshot()
+    pkgman.prepare_fork()
+    try:
+        ctx = multiprocessing.get_context('fork')
+        with ctx.Pool(1, initializer=init_worker,
+                      initargs=(snapshot,)) as pool:
+            pkgs_id, keys = pool.apply(worker, (name,))
+
+        # the worker uses the packages inherited from the parent process
+        assert pkgs_id == id(pkgman.pkgs)
+        assert keys == sorted(pkgman[name].keys())
+    finally:
+        gc.unfreeze()
+        pkgman.clear()
+        pkgman.init()
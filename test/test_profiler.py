@@ -0,0 +1,108 @@
+"""Test the profiler of the node evaluations"""
+from __future__ import absolute_import
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import csv
+import time
+
+from openalea.core.compositenode import CompositeNode
+from openalea.core.algo import dataflow_evaluation
+from openalea.core.algo.dataflow_evaluation import ParallelEvaluation
+from openalea.core.algo.profiler import Profiler, CALLS, UPSTREAM, WALL
+
+from .small_tools import unary
+
+DELAY = 0.02
+
+
+def slow(a):
+    time.sleep(DELAY)
+    return a
+
+
+def incr(a):
+    return a + 1
+
+
+def workflow():
+    """ slow -> inner(incr) -> incr """
+    inner = CompositeNode(inputs=[dict(name='a')], outputs=[dict(name='out')])
+    vid = inner.add_node(unary(incr))
+    inner.connect(inner.id_in, 0, vid, 0)
+    inner.connect(vid, 0, inner.id_out, 0)
+
+    cn = CompositeNode()
+    s = cn.add_node(unary(slow))
+    i = cn.add_node(inner)
+    e = cn.add_node(unary(incr))
+    cn.node(s).set_input(0, 1)
+    cn.connect(s, 0, i, 0)
+    cn.connect(i, 0, e, 0)
+    return cn, s, i, e, vid
+
+
+def test_profiler(tmp_path):
+    cn, s, i, e, vid = workflow()
+    with Profiler() as profiler:
+        cn.eval_as_expression()
+    assert dataflow_evaluation.PROFILER is None
+    assert cn.node(e).get_output(0) == 3
+
+    stats = profiler.stats
+    root = 'CompositeNode'
+    slow_path = (root, '%s:FuncNode' % s)
+    inner_path = (root, '%s:CompositeNode' % i)
+    incr_path = inner_path + ('%s:FuncNode' % vid,)
+    end_path = (root, '%s:FuncNode' % e)
+    assert stats[slow_path][CALLS] == 1
+    assert stats[slow_path][WALL] >= DELAY
+    assert stats[incr_path][CALLS] == 1
+    assert stats[inner_path][WALL] >= stats[incr_path][WALL]
+    # the last node waits for slow and the composite node
+    assert stats[end_path][UPSTREAM] >= DELAY
+    assert stats[slow_path][UPSTREAM] == 0
+
+    assert profiler.node_time() >= DELAY
+    assert profiler.get_total() >= profiler.node_time()
+    summary = profiler.summary()
+    assert summary.startswith('Total')
+    assert summary.splitlines()[2].endswith('/'.join(slow_path))
+
+    profiler.write_collapsed(str(tmp_path / 'profile.folded'))
+    with open(str(tmp_path / 'profile.folded')) as f:
+        lines = f.read().splitlines()
+    assert ';'.join(slow_path) in [line.rsplit(' ', 1)[0] for line in lines]
+    assert all(int(line.rsplit(' ', 1)[1]) > 0 for line in lines)
+
+    profiler.write_csv(str(tmp_path / 'profile.csv'))
+    with open(str(tmp_path / 'profile.csv')) as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == len(stats)
+    assert rows[0]['path'] == '/'.join(slow_path)
+
+    # profile of several evaluations
+    with profiler:
+        cn.node(s).set_input(0, 2)
+        cn.eval_as_expression()
+    assert stats[slow_path][CALLS] == 2
+    assert stats[end_path][UPSTREAM] >= 2 * DELAY
+
+
+def test_process_backend():
+    """ the nodes evaluated in a worker process are timed in the worker """
+    cn = CompositeNode()
+    s = cn.add_node(unary(slow))
+    e = cn.add_node(unary(incr))
+    cn.node(s).set_input(0, 1)
+    cn.connect(s, 0, e, 0)
+    with Profiler() as profiler:
+        ParallelEvaluation(cn, backend='process', max_workers=1).eval(e)
+    assert cn.node(e).get_output(0) == 2
+
+    stats = profiler.stats
+    slow_path = ('CompositeNode', '%s:FuncNode' % s)
+    end_path = ('CompositeNode', '%s:FuncNode' % e)
+    assert stats[slow_path][CALLS] == 1
+    assert stats[slow_path][WALL] >= DELAY
+    assert stats[end_path][UPSTREAM] >= DELAY
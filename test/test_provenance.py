@@ -0,0 +1,138 @@
+"""Test the provenance of the node executions"""
+from __future__ import absolute_import
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import json
+import operator
+import sqlite3
+
+from openalea.core.compositenode import CompositeNode
+from openalea.core.node import FuncNode
+from openalea.core.algo import dataflow_evaluation
+from openalea.core.algo.dataflow_evaluation import ParallelEvaluation
+from openalea.core.algo.provenance import (AsyncProvenance, JSONLinesWriter,
+                                           SQLiteWriter, value_fingerprint)
+
+
+def chain(n):
+    cn = CompositeNode()
+    prev = None
+    for i in range(n):
+        vid = cn.add_node(FuncNode([dict(name='a'), dict(name='b')],
+                                   [dict(name='out')], operator.add))
+        cn.node(vid).set_input(1, 1)
+        if prev is None:
+            cn.node(vid).set_input(0, 0)
+        else:
+            cn.connect(prev, 0, vid, 0)
+        prev = vid
+    return cn, prev
+
+
+def evaluate(cn, provenance):
+    algo = cn.get_eval_algo()
+    algo.set_provenance(provenance)
+    try:
+        cn.eval_as_expression()
+    finally:
+        algo.set_provenance(None)
+        provenance.close()
+
+
+def test_sqlite(tmp_path):
+    cn, last = chain(10)
+    db = tmp_path / 'provenance.sq3'
+    provenance = AsyncProvenance(cn, SQLiteWriter(db), batch_size=3)
+    evaluate(cn, provenance)
+    assert cn.node(last).get_output(0) == 10
+
+    stats = provenance.stats()
+    assert stats['written'] == stats['recorded'] >= 10
+    assert stats['dropped'] == stats['errors'] == stats['pending'] == 0
+    assert stats['batches'] >= 4
+
+    conn = sqlite3.connect(str(db))
+    try:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        rows = conn.execute("SELECT vid, factory, outputs FROM NodeEvent "
+                            "WHERE vid = ?", (str(last),)).fetchall()
+    finally:
+        conn.close()
+    assert rows == [(str(last), 'FuncNode',
+                     json.dumps([value_fingerprint(10)]))]
+
+
+def test_fingerprint():
+    # the content is fingerprinted, not the identity of the values
+    assert value_fingerprint([1, 'a']) == value_fingerprint([1, 'a'])
+    assert value_fingerprint({'a': 1}) != value_fingerprint({'a': 2})
+    assert value_fingerprint('a') == value_fingerprint('a'[:])
+    assert value_fingerprint(lambda: None) == 'function'
+
+
+def test_json_lines(tmp_path):
+    cn, last = chain(5)
+    filename = tmp_path / 'provenance.jsonl'
+    provenance = AsyncProvenance(cn, JSONLinesWriter(str(filename)))
+    algo = cn.get_eval_algo()
+    algo.set_provenance(provenance)
+    cn.eval_as_expression()
+    assert provenance.flush(timeout=10)
+    algo.set_provenance(None)
+    provenance.close()
+
+    with open(str(filename)) as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == provenance.recorded
+    assert set(r['vid'] for r in records) >= set(range(5))
+    assert all(r['end'] >= r['start'] for r in records)
+
+
+def test_bounded(tmp_path):
+    cn, last = chain(10)
+    filename = tmp_path / 'provenance.jsonl'
+    # the writer waits for the end of the evaluation
+    provenance = AsyncProvenance(cn, JSONLinesWriter(str(filename)),
+                                 capacity=4, batch_size=100, interval=60,
+                                 fingerprints=False)
+    evaluate(cn, provenance)
+    stats = provenance.stats()
+    assert stats['written'] == 4
+    assert stats['dropped'] == stats['recorded'] - 4
+    assert stats['overhead'] > 0
+
+
+def test_thread_backend(tmp_path):
+    """ the counters are consistent when the workers record concurrently """
+    cn = CompositeNode()
+    for i in range(200):
+        vid = cn.add_node(FuncNode([dict(name='a'), dict(name='b')],
+                                   [dict(name='out')], operator.add))
+        cn.node(vid).set_input(0, i)
+        cn.node(vid).set_input(1, 1)
+    provenance = AsyncProvenance(cn, JSONLinesWriter(str(tmp_path / 'p.jsonl')),
+                                 capacity=50, batch_size=100, interval=60,
+                                 fingerprints=False)
+    algo = ParallelEvaluation(cn, backend='thread', max_workers=8)
+    algo.set_provenance(provenance)
+    algo.eval()
+    provenance.close()
+    stats = provenance.stats()
+    # the io nodes are evaluated too
+    assert stats['recorded'] == cn.nb_vertices()
+    assert stats['written'] == 50
+    assert stats['dropped'] == stats['recorded'] - 50
+
+
+def test_db_connexion(tmp_path):
+    db = tmp_path / 'provenance.sq3'
+    for i in range(2):
+        dataflow_evaluation.db_conn = None
+        try:
+            cur = dataflow_evaluation.db_connexion(db)
+            assert cur is not None
+            cur.execute("SELECT COUNT(*) FROM NodeEvent")
+        finally:
+            dataflow_evaluation.db_conn.close()
+            dataflow_evaluation.db_conn = None